@@ -0,0 +1,186 @@
+"""Offline end-to-end benchmark: fetch cycles, historical backfill and CSV storage.
+
+Usage:
+    python benchmarks/bench_e2e.py [--tickers 10,100,1000] [--cycles 3] [--out result.json]
+
+Nothing leaves the machine: yfinance is replaced by the synthetic generator
+in fake_yahoo.py and InfluxDB by fake_influx_server.py. For every watchlist
+size N a fresh worker process (own DATA_DIR, so peak RSS is per run) runs
+
+  * `main.main()` for `--cycles` fetch cycles over N always-open synthetic
+    symbols, writing through the batched InfluxDB pipeline;
+  * `fetch_and_write_historical` for the first `--history-tickers` symbols;
+  * `CSVStorage.store` of one day of 1m bars for every symbol, twice
+    (create, then merge into the existing file).
+
+The report (stdout, or `--out`) is JSON with wall time, throughput, the
+per-stage latency histograms from src.metrics and peak RSS, so two commits
+can be compared by running the same command on each.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+
+
+def _influx_stats(url):
+    with urllib.request.urlopen(f"{url}/stats") as response:
+        return json.load(response)
+
+
+def _delta(after, before):
+    return {
+        key: (_delta(value, before.get(key, {})) if isinstance(value, dict) else value - before.get(key, 0))
+        for key, value in after.items()
+    }
+
+
+def _stage_latencies():
+    from src import metrics
+    stages = {
+        "download_per_ticker": metrics.DOWNLOAD_SECONDS,
+        "encode": metrics.ENCODE_SECONDS,
+        "store": metrics.STORE_SECONDS,
+        "cycle": metrics.CYCLE_SECONDS,
+    }
+    result = {}
+    for stage, histogram in stages.items():
+        for labels, (count, total) in histogram.totals().items():
+            result[f"{stage}{labels if labels != '{}' else ''}"] = {
+                "count": count,
+                "total_s": round(total, 6),
+                "mean_ms": round(total / count * 1000, 3) if count else None,
+            }
+    return result
+
+
+def run_worker(args):
+    """One benchmark run in this process; config is read from the environment set by `run`."""
+    sys.path.insert(0, APP_DIR)
+    report = {"tickers": args.worker}
+
+    started = time.perf_counter()
+    import main
+    from config import config
+    from fake_yahoo import SyntheticYahoo
+    report["import_s"] = round(time.perf_counter() - started, 3)
+    yahoo = SyntheticYahoo(latency=args.yahoo_latency).install()
+
+    before = _influx_stats(config.INFLUXDB_URL)
+    started = time.perf_counter()
+    main.main(max_cycles=args.cycles, serve=False)
+    elapsed = time.perf_counter() - started
+    written = _delta(_influx_stats(config.INFLUXDB_URL), before)
+    report["cycles"] = {
+        "count": args.cycles,
+        "wall_s": round(elapsed, 3),
+        "influx": written,
+        "points_per_s": round(written["points"] / elapsed, 1),
+        "yahoo": yahoo.stats(),
+    }
+
+    from src.fetcher import fetch_and_write_historical
+    symbols = config.DEFAULT_STOCK_TICKERS[:args.history_tickers]
+    before = _influx_stats(config.INFLUXDB_URL)
+    started = time.perf_counter()
+    for symbol in symbols:
+        fetch_and_write_historical(symbol, years=args.history_years)
+    elapsed = time.perf_counter() - started
+    written = _delta(_influx_stats(config.INFLUXDB_URL), before)
+    report["historical"] = {
+        "symbols": len(symbols),
+        "years": args.history_years,
+        "wall_s": round(elapsed, 3),
+        "influx": written,
+        "points_per_s": round(written["points"] / elapsed, 1) if elapsed else None,
+    }
+
+    from src.storage import CSVStorage
+    storage = CSVStorage(os.path.join(config.DATA_DIR, "csv"))
+    index = SyntheticYahoo._index(None, None, "1d", "1m")
+    frames = {s: SyntheticYahoo.bars(s, index) for s in config.DEFAULT_STOCK_TICKERS}
+    report["csv"] = {}
+    for phase in ("create", "merge"):
+        started = time.perf_counter()
+        for symbol, frame in frames.items():
+            storage.store(symbol, frame)
+        elapsed = time.perf_counter() - started
+        rows = sum(len(f) for f in frames.values())
+        report["csv"][phase] = {"rows": rows, "wall_s": round(elapsed, 3), "rows_per_s": round(rows / elapsed, 1)}
+
+    report["stages"] = _stage_latencies()
+    # ru_maxrss is in KiB on Linux
+    report["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    with open(args.report, "w") as f:
+        json.dump(report, f)
+
+
+def run(args):
+    from fake_influx_server import serve
+    server = serve(port=args.influx_port, delay=args.influx_delay)
+    influx_url = f"http://127.0.0.1:{server.server_address[1]}"
+    results = []
+    try:
+        for n in args.tickers:
+            with tempfile.TemporaryDirectory(prefix=f"bench-e2e-{n}-") as data_dir:
+                report_path = os.path.join(data_dir, "report.json")
+                env = dict(
+                    os.environ,
+                    STORAGE_MODE="influxdb",
+                    INFLUXDB_URL=influx_url,
+                    INFLUX_WRITE_MODE="batch",
+                    INFLUX_SPOOL_MAX_BYTES="0",
+                    DATA_DIR=data_dir,
+                    FETCH_INTERVAL="0",
+                    YAHOO_RATE="0",  # measure the pipeline, not the request budget
+                    STOCK_TICKERS=",".join(f"SYN{i:04d}-USD" for i in range(n)),
+                )
+                cmd = [
+                    sys.executable, "-W", "ignore", os.path.abspath(__file__),
+                    "--worker", str(n), "--report", report_path,
+                    "--cycles", str(args.cycles),
+                    "--history-tickers", str(args.history_tickers),
+                    "--history-years", str(args.history_years),
+                    "--yahoo-latency", str(args.yahoo_latency),
+                ]
+                print(f"Running N={n} ...", file=sys.stderr)
+                log = None if args.verbose else subprocess.DEVNULL
+                subprocess.run(cmd, env=env, cwd=APP_DIR, stdout=log, check=True)
+                with open(report_path) as f:
+                    results.append(json.load(f))
+    finally:
+        server.shutdown()
+
+    output = json.dumps({"python": sys.version.split()[0], "results": results}, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=lambda s: [int(n) for n in s.split(",")], default=[10, 100, 1000])
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--history-tickers", type=int, default=5, help="symbols to run fetch_and_write_historical for")
+    parser.add_argument("--history-years", type=int, default=5)
+    parser.add_argument("--yahoo-latency", type=float, default=0.0, help="seconds added to every fake download")
+    parser.add_argument("--influx-port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--influx-delay", type=float, default=0.0, help="seconds before each write is acknowledged")
+    parser.add_argument("--out", help="also write the JSON report here")
+    parser.add_argument("--verbose", action="store_true", help="show the fetcher's own output")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--report", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker is not None:
+        run_worker(args)
+    else:
+        run(args)
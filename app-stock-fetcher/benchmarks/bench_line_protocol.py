@@ -0,0 +1,88 @@
+"""Compare the vectorized line-protocol encoder with the old per-row Point loop.
+
+Usage: python benchmarks/bench_line_protocol.py [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from influxdb_client import Point, WritePrecision
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.storage.line_protocol import encode_ohlcv  # noqa: E402
+
+
+def synthetic_ohlcv(index, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.standard_normal(len(index)).cumsum()
+    spread = rng.random(len(index))
+    df = pd.DataFrame(
+        {
+            "Open": close + rng.standard_normal(len(index)) * 0.1,
+            "High": close + spread,
+            "Low": close - spread,
+            "Close": close,
+            "Volume": rng.integers(0, 1_000_000, len(index)).astype(float),
+        },
+        index=index,
+    )
+    # Sprinkle the NaNs yfinance tends to return
+    df.iloc[::97, df.columns.get_loc("Close")] = np.nan
+    df.iloc[::53, df.columns.get_loc("Volume")] = np.nan
+    return df
+
+
+def point_loop(df, ticker):
+    """The encoding previously done in InfluxDBStorage.store / fetch_and_write_historical."""
+    df = df.dropna(subset=["Open", "High", "Low", "Close"]).copy()
+    df["Volume"] = df["Volume"].fillna(0)
+    points = []
+    for ts, row in df.iterrows():
+        point = (
+            Point("stock_price")
+            .tag("ticker", ticker)
+            .field("open", float(row["Open"]))
+            .field("high", float(row["High"]))
+            .field("low", float(row["Low"]))
+            .field("close", float(row["Close"]))
+            .field("volume", int(row["Volume"]))
+            .time(ts, WritePrecision.NS)
+        )
+        points.append(point.to_line_protocol())
+    return "\n".join(points).encode("utf-8")
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    frames = {
+        "1m x 1d": pd.date_range("2024-03-04 09:30", periods=390, freq="1min", tz="America/New_York"),
+        "1m x 7d": pd.date_range("2024-03-04 09:30", periods=390 * 7, freq="1min", tz="America/New_York"),
+        "1d x 5y": pd.bdate_range("2019-03-01", periods=252 * 5),
+    }
+    print(f"{'frame':<10} {'rows':>6} {'Point loop':>12} {'vectorized':>12} {'speedup':>8}")
+    for name, index in frames.items():
+        df = synthetic_ohlcv(index)
+        assert point_loop(df, "005930.KS").count(b"\n") == encode_ohlcv(df, "005930.KS").count(b"\n")
+        old = best_of(lambda: point_loop(df, "005930.KS"), args.repeat)
+        new = best_of(lambda: encode_ohlcv(df, "005930.KS"), args.repeat)
+        print(f"{name:<10} {len(df):>6} {old * 1000:>10.2f}ms {new * 1000:>10.2f}ms {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
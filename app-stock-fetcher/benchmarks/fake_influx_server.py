@@ -0,0 +1,121 @@
+"""Local stand-in for the InfluxDB v2 HTTP API, for offline benchmarks.
+
+Usage:
+    python benchmarks/fake_influx_server.py --port 18086 [--delay 0.01]
+    INFLUXDB_URL=http://127.0.0.1:18086 STORAGE_MODE=influxdb python main.py
+
+POST /api/v2/write accepts (optionally gzipped) line protocol and counts
+points, requests and bytes; queries return an empty result, so every
+ticker looks like it has no stored history. GET /stats reports the
+counters and POST /reset clears them.
+"""
+import argparse
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+class FakeInfluxHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+    lock = threading.Lock()
+    counters = {}
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            cls.counters = {
+                "write_requests": 0,
+                "points": 0,
+                "bytes_received": 0,
+                "bytes_decoded": 0,
+                "queries": 0,
+                "measurements": {},
+            }
+
+    def _send(self, status, body=b"", content_type="application/json"):
+        self.send_response(status)
+        if status != 204:
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 204:
+            self.wfile.write(body)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/ping":
+            self._send(204)
+        elif path == "/health":
+            self._send(200, json.dumps({"status": "pass"}).encode())
+        elif path == "/stats":
+            with self.lock:
+                self._send(200, json.dumps(self.counters).encode())
+        else:
+            self._send(404, b'{"code":"not found"}')
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self._body()
+        if path == "/api/v2/write":
+            decoded = gzip.decompress(body) if self.headers.get("Content-Encoding") == "gzip" else body
+            lines = [line for line in decoded.split(b"\n") if line]
+            measurements = {}
+            for line in lines:
+                name = line.split(b",", 1)[0].decode()
+                measurements[name] = measurements.get(name, 0) + 1
+            if self.delay:
+                time.sleep(self.delay)
+            with self.lock:
+                c = self.counters
+                c["write_requests"] += 1
+                c["points"] += len(lines)
+                c["bytes_received"] += len(body)
+                c["bytes_decoded"] += len(decoded)
+                for name, n in measurements.items():
+                    c["measurements"][name] = c["measurements"].get(name, 0) + n
+            self._send(204)
+        elif path == "/api/v2/query":
+            with self.lock:
+                self.counters["queries"] += 1
+            self._send(200, b"", content_type="text/csv; charset=utf-8")
+        elif path == "/reset":
+            self.reset()
+            self._send(204)
+        else:
+            self._send(404, b'{"code":"not found"}')
+
+    def log_message(self, format, *args):
+        pass
+
+
+FakeInfluxHandler.reset()
+
+
+def serve(port=18086, delay=0.0):
+    """Start the server in a daemon thread and return it (call .shutdown() to stop)."""
+    FakeInfluxHandler.delay = delay
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeInfluxHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=18086)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before acknowledging each write")
+    args = parser.parse_args()
+    server = serve(args.port, args.delay)
+    print(f"Fake InfluxDB listening on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,80 @@
+"""Local stand-in for the Yahoo Finance search API, for testing GET /search offline.
+
+Usage:
+    python benchmarks/fake_search_server.py --port 18002 --delay 0.2
+    YAHOO_SEARCH_URL=http://127.0.0.1:18002/v1/finance/search python main.py
+
+Every query returns a few deterministic quotes derived from the query
+text. GET /stats reports how many search requests reached the server, which
+together with GET /search/stats on the fetcher shows cache and coalescing
+behaviour.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeSearchHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    requests_served = 0
+    queries = {}
+    lock = threading.Lock()
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            with self.lock:
+                self._send_json({"requests": FakeSearchHandler.requests_served, "queries": dict(self.queries)})
+            return
+        if url.path != "/v1/finance/search":
+            self._send_json({"error": "not found"}, status=404)
+            return
+
+        query = parse_qs(url.query).get("q", [""])[0]
+        with self.lock:
+            FakeSearchHandler.requests_served += 1
+            self.queries[query] = self.queries.get(query, 0) + 1
+        if self.delay:
+            time.sleep(self.delay)
+        base = "".join(c for c in query.upper() if c.isalnum())[:4] or "X"
+        quotes = [
+            {"symbol": f"{base}{i}", "shortname": f"{query.title()} Corp {i}", "exchDisp": "NASDAQ"}
+            for i in range(3)
+        ]
+        self._send_json({"quotes": quotes})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, delay=0.0):
+    """Start the fake server in a background thread and return it."""
+    FakeSearchHandler.delay = delay
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeSearchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Yahoo Finance search server")
+    parser.add_argument("--port", type=int, default=18002)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before answering")
+    args = parser.parse_args()
+    FakeSearchHandler.delay = args.delay
+    print(f"Fake search API on http://127.0.0.1:{args.port}/v1/finance/search")
+    ThreadingHTTPServer(("127.0.0.1", args.port), FakeSearchHandler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
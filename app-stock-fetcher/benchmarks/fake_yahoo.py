@@ -0,0 +1,82 @@
+"""Synthetic stand-in for `yfinance.download`, for offline benchmarks.
+
+    from fake_yahoo import SyntheticYahoo  # with benchmarks/ on sys.path
+    SyntheticYahoo(latency=0.05).install()
+
+After `install()` every download made through `src.fetcher` (`_download_data`
+and `_download_many`) returns generated OHLCV bars instead of calling Yahoo.
+Prices are a deterministic function of symbol and timestamp, so overlapping
+windows agree with each other the way real re-sent bars do. Intraday bars
+cover every minute (like the always-open `-USD` symbols); daily bars are
+stamped with the naive date, like yfinance's.
+"""
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+
+class SyntheticYahoo:
+    def __init__(self, latency=0.0, per_symbol_latency=0.0):
+        self.latency = latency
+        self.per_symbol_latency = per_symbol_latency
+        self.requests = 0
+        self.symbols_requested = 0
+        self._lock = threading.Lock()
+
+    def install(self):
+        import src.fetcher
+        src.fetcher.yf.download = self.download
+        return self
+
+    @staticmethod
+    def _index(start, end, period, interval):
+        now = pd.Timestamp.now(tz="UTC").floor("min")
+        if interval == "1d":
+            end = pd.Timestamp(end) if end is not None else now.tz_localize(None).normalize() + pd.Timedelta(days=1)
+            if period:
+                start = end - pd.Timedelta(days=int(period.rstrip("d")))
+            index = pd.date_range(pd.Timestamp(start).tz_localize(None), end.tz_localize(None), freq="1D", inclusive="left")
+            return index[index.dayofweek < 5].rename("Date")
+
+        end = now + pd.Timedelta(minutes=1) if end is None else pd.Timestamp(end)
+        end = end.tz_localize("UTC") if end.tzinfo is None else end.tz_convert("UTC")
+        if period:
+            start = end - pd.Timedelta(days=int(period.rstrip("d")))
+        start = pd.Timestamp(start)
+        start = start.tz_localize("UTC") if start.tzinfo is None else start.tz_convert("UTC")
+        return pd.date_range(start.ceil("min"), end, freq="1min", inclusive="left", name="Datetime")
+
+    @staticmethod
+    def bars(symbol, index):
+        phase = zlib.crc32(symbol.encode()) % 1000
+        t = index.asi8 / 60e9 + phase
+        close = 100 + phase / 10 + 5 * np.sin(t / 390) + np.sin(t / 7)
+        spread = 0.2 + 0.1 * np.abs(np.sin(t / 3))
+        return pd.DataFrame(
+            {
+                "Open": close - 0.05 * np.cos(t),
+                "High": close + spread,
+                "Low": close - spread,
+                "Close": close,
+                "Volume": (1000 + (t * 37 % 500)).astype(np.int64),
+            },
+            index=index,
+        )
+
+    def download(self, tickers, start=None, end=None, period=None, interval="1d", group_by=None, progress=False, **kwargs):
+        symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+        with self._lock:
+            self.requests += 1
+            self.symbols_requested += len(symbols)
+        if self.latency or self.per_symbol_latency:
+            time.sleep(self.latency + self.per_symbol_latency * len(symbols))
+        index = self._index(start, end, period, interval)
+        if isinstance(tickers, str):
+            return self.bars(tickers, index)
+        return pd.concat({s: self.bars(s, index) for s in symbols}, axis=1)
+
+    def stats(self):
+        return {"requests": self.requests, "symbols_requested": self.symbols_requested}
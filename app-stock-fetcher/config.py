@@ -11,11 +11,68 @@ class Config:
     INFLUXDB_BUCKET = os.getenv("INFLUXDB_BUCKET", "stock_data")
 
     # Storage settings
-    STORAGE_MODE = os.getenv("STORAGE_MODE", "auto")  # 'influxdb', 'csv', 'auto'
+    STORAGE_MODE = os.getenv("STORAGE_MODE", "auto")  # 'influxdb', 'csv', 'parquet', 'auto'
+    LOCAL_BACKEND = os.getenv("LOCAL_BACKEND", "csv")  # fallback used in 'auto' mode: 'csv', 'parquet'
     DATA_DIR = os.getenv("DATA_DIR", "./data")
+    PARQUET_COMPACT_INTERVAL = int(os.getenv("PARQUET_COMPACT_INTERVAL", "300"))  # seconds, 0 disables
+    PARQUET_COMPACT_MIN_SEGMENTS = int(os.getenv("PARQUET_COMPACT_MIN_SEGMENTS", "8"))
+
+    # InfluxDB write pipeline
+    INFLUX_WRITE_MODE = os.getenv("INFLUX_WRITE_MODE", "batch")  # 'batch', 'sync'
+    INFLUX_BATCH_SIZE = int(os.getenv("INFLUX_BATCH_SIZE", "5000"))  # points per write request
+    INFLUX_FLUSH_INTERVAL = float(os.getenv("INFLUX_FLUSH_INTERVAL", "1.0"))  # seconds
+    INFLUX_QUEUE_SIZE = int(os.getenv("INFLUX_QUEUE_SIZE", "1000"))  # frames buffered before store() blocks
+    INFLUX_MAX_RETRIES = int(os.getenv("INFLUX_MAX_RETRIES", "5"))
+    INFLUX_RECHECK_INTERVAL = int(os.getenv("INFLUX_RECHECK_INTERVAL", "30"))  # seconds between availability checks
+    SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "10"))  # seconds to wait for queued writes on shutdown before spooling/dropping them
+
+    # On-disk spool for writes made while InfluxDB is unreachable
+    INFLUX_SPOOL_DIR = os.getenv("INFLUX_SPOOL_DIR", os.path.join(DATA_DIR, "spool"))
+    INFLUX_SPOOL_MAX_BYTES = int(os.getenv("INFLUX_SPOOL_MAX_BYTES", str(512 * 1024 * 1024)))  # 0 disables the spool
+    INFLUX_SPOOL_SEGMENT_BYTES = int(os.getenv("INFLUX_SPOOL_SEGMENT_BYTES", str(8 * 1024 * 1024)))
 
     # Stock settings
     DEFAULT_STOCK_TICKERS = os.getenv("STOCK_TICKERS", "005930.KS").split(",")
     FETCH_INTERVAL = int(os.getenv("FETCH_INTERVAL", "60"))
+    CLOSED_MARKET_INTERVAL = int(os.getenv("CLOSED_MARKET_INTERVAL", "0"))  # seconds between polls of a closed market, 0 = never
+    POST_CLOSE_FETCH_DELAY = int(os.getenv("POST_CLOSE_FETCH_DELAY", "120"))  # final fetch this long after the close
+    FETCH_BATCH_SIZE = int(os.getenv("FETCH_BATCH_SIZE", "50"))  # symbols per yf.download call
+    ROLLUP_RESOLUTIONS = [r for r in os.getenv("ROLLUP_RESOLUTIONS", "5m,1h,1d").split(",") if r]  # written to stock_price_<res>
+    INDICATORS = [i for i in os.getenv("INDICATORS", "sma_20,ema_20,rsi_14,vwap,volatility_20").split(",") if i]  # written to stock_indicators, empty disables
+    INDICATOR_LOOKBACK_DAYS = float(os.getenv("INDICATOR_LOOKBACK_DAYS", "3"))  # stored 1m history used to seed indicator state
+    DEDUP_WINDOW_MINUTES = int(os.getenv("DEDUP_WINDOW_MINUTES", "30"))  # recent bars re-requested and hash-compared each cycle so late corrections are written
+    BAR_BUFFER_SIZE = int(os.getenv("BAR_BUFFER_SIZE", "1440"))  # recent 1m bars kept per ticker for GET /bars (48 bytes each), 0 disables
+    BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "4"))  # chunk downloads in flight across all backfills
+    BACKFILL_HOLIDAY_TOLERANCE = int(os.getenv("BACKFILL_HOLIDAY_TOLERANCE", "3"))  # missing weekdays treated as a holiday
+    BACKFILL_GAP_MERGE_DAYS = int(os.getenv("BACKFILL_GAP_MERGE_DAYS", "5"))  # merge gaps closer than this many weekdays
+    BACKFILL_FLUSH_TIMEOUT = float(os.getenv("BACKFILL_FLUSH_TIMEOUT", "120"))  # seconds to wait for a chunk's write before failing it
+
+    # Grafana dashboard generated from the watchlist (see src/dashboard.py)
+    GRAFANA_DASHBOARD_PATH = os.getenv("GRAFANA_DASHBOARD_PATH", "")  # rewritten on ticker changes; empty = GET /grafana/dashboard only
+    GRAFANA_DATASOURCE_UID = os.getenv("GRAFANA_DATASOURCE_UID", "InfluxDB_Stock_UID")
+    GRAFANA_MAX_POINTS = int(os.getenv("GRAFANA_MAX_POINTS", "1500"))  # bars per panel before switching to a coarser rollup
+
+    # Process layout: 'all' runs everything in one process; 'supervisor' runs the
+    # api, pipeline and backfill roles as separate child processes and restarts them
+    PROCESS_ROLE = os.getenv("PROCESS_ROLE", "all")  # 'all', 'supervisor', 'api', 'pipeline', 'backfill'
+    API_WORKERS = int(os.getenv("API_WORKERS", "1"))  # uvicorn worker processes for the api role
+    RUN_DIR = os.getenv("RUN_DIR", os.path.join(DATA_DIR, "run"))  # backfill queue and exported metrics
+    LIVENESS_STALE_SECONDS = int(os.getenv("LIVENESS_STALE_SECONDS", "600"))  # /healthz fails once the fetch loop is this late
+
+    # Sharding across replicas: each instance fetches only the tickers that hash to it
+    SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+    SHARD_INDEX = os.getenv("SHARD_INDEX", "")  # empty = StatefulSet ordinal from the hostname
+    SHARD_PRIMARY_URL = os.getenv("SHARD_PRIMARY_URL", "http://localhost:28001")  # shard 0, which owns /tickers writes
+    SHARD_SYNC_INTERVAL = int(os.getenv("SHARD_SYNC_INTERVAL", "30"))  # seconds between ticker list syncs from shard 0
+
+    # Shared budget for all Yahoo calls in a process (live polling > search > backfill)
+    YAHOO_RATE = float(os.getenv("YAHOO_RATE", "2"))  # requests per second, 0 disables limiting
+    YAHOO_BURST = int(os.getenv("YAHOO_BURST", "5"))  # requests allowed back to back after an idle period
+    YAHOO_MAX_BACKOFF = float(os.getenv("YAHOO_MAX_BACKOFF", "300"))  # longest pause after repeated 429s, seconds
+
+    # Ticker search (GET /search)
+    YAHOO_SEARCH_URL = os.getenv("YAHOO_SEARCH_URL", "https://query2.finance.yahoo.com/v1/finance/search")
+    SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))  # distinct queries kept
+    SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "300"))  # seconds
 
 config = Config()
@@ -1,19 +1,84 @@
 import time
+_import_started = time.perf_counter()
+
+import os
+import signal
+import sys
 import threading
-from datetime import datetime
-import requests
+from datetime import datetime, timedelta
 
-from fastapi import FastAPI, Request, BackgroundTasks
-from fastapi.responses import HTMLResponse
-import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 
 from config import config
-from src.fetcher import StockFetcher, fetch_and_write_historical
-from src.storage import get_storage_backend
+from src.dashboard import DashboardPublisher, build_dashboard
+from src.health import HealthState, liveness, readiness
+from src.jobqueue import JobQueue
+from src.lazy import Lazy
+from src.market_calendar import FetchScheduler
+from src import metrics
+from src.sharding import ShardAssignment, TickerSync
+from src.supervisor import Supervisor, child_command
 from src.ticker_manager import TickerManager
 
+# pandas, yfinance, numpy, influxdb_client, httpx and uvicorn are imported where
+# they are first needed (see main() and the Lazy objects below), so the API
+# comes up and answers probes before the fetch pipeline has loaded.
+
 app = FastAPI()
+shard = ShardAssignment.from_config(config)
 ticker_manager = TickerManager()
+# Secondary shards mirror shard 0's watchlist and forward /tickers writes to it
+ticker_sync = None if shard.is_primary else TickerSync(
+    ticker_manager, config.SHARD_PRIMARY_URL, interval=config.SHARD_SYNC_INTERVAL
+)
+def _make_backfill_scheduler():
+    from src.backfill import BackfillScheduler
+    return BackfillScheduler()
+
+backfill_scheduler = Lazy(_make_backfill_scheduler)
+# With separate processes, backfills are requested through a queue directory
+backfill_queue = None if config.PROCESS_ROLE == "all" else JobQueue(os.path.join(config.RUN_DIR, "backfill-queue"))
+def _backfill_on_add(event, ticker, **context):
+    symbol = ticker["symbol"]
+    if event != "add" or not shard.owns(symbol):
+        return
+    years = ticker.get("years") or 5
+    if backfill_queue is None:
+        backfill_scheduler.submit(symbol, years)
+    elif config.PROCESS_ROLE == "pipeline":
+        # The one role that enqueues: it sees every add, whether made through the
+        # api process or by editing tickers.json, exactly once
+        backfill_queue.put(symbol, years)
+
+ticker_manager.subscribe(_backfill_on_add)
+
+# Recent 1m bars from the live loop; memory-mapped files when the API runs in another process
+def _make_bar_buffer():
+    from src.bar_buffer import BarBuffer
+    return BarBuffer(
+        config.BAR_BUFFER_SIZE,
+        directory=None if config.PROCESS_ROLE == "all" else os.path.join(config.RUN_DIR, "bars"),
+        readonly=config.PROCESS_ROLE == "api",
+    )
+
+bar_buffer = Lazy(_make_bar_buffer)
+
+def _make_ticker_search():
+    from src.ratelimit import yahoo_limiter
+    from src.search import TickerSearch
+    return TickerSearch(
+        config.YAHOO_SEARCH_URL,
+        cache_size=config.SEARCH_CACHE_SIZE,
+        ttl=config.SEARCH_CACHE_TTL,
+        limiter=yahoo_limiter,
+    )
+
+ticker_search = Lazy(_make_ticker_search)
+
+# Fed by the fetch loop; with separate processes the pipeline publishes it for the API to serve
+HEALTH_PATH = os.path.join(config.RUN_DIR, "pipeline.health.json")
+health = HealthState(publish_path=HEALTH_PATH if config.PROCESS_ROLE == "pipeline" else None)
 
 html_content = """
 <!DOCTYPE html>
@@ -156,90 +221,393 @@ html_content = """
 def get_ui():
     return HTMLResponse(content=html_content)
 
+async def _forward_to_primary(method, path, json=None):
+    import httpx
+
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        response = await client.request(method, f"{config.SHARD_PRIMARY_URL.rstrip('/')}{path}", json=json)
+    ticker_sync.wake()
+    return response.json()
+
 @app.get("/tickers")
 def get_tickers():
     return ticker_manager.get_tickers()
 
+@app.get("/shard")
+def get_shard():
+    symbols = ticker_manager.get_ticker_symbols()
+    return {
+        "index": shard.index,
+        "count": shard.count,
+        "primary": shard.is_primary,
+        "tickers": shard.filter(symbols),
+        "tickers_total": len(symbols),
+    }
+
 @app.post("/tickers")
-async def add_ticker(request: Request, background_tasks: BackgroundTasks):
+async def add_ticker(request: Request):
     data = await request.json()
+    if not shard.is_primary:
+        try:
+            return await _forward_to_primary("POST", "/tickers", json=data)
+        except Exception as e:
+            return {"status": "error", "message": f"Could not reach primary shard: {e}"}
     ticker = data.get("ticker")
     name = data.get("name", "")
-    years = data.get("years", 5)
+    try:
+        years = int(data.get("years", 5))
+    except (TypeError, ValueError):
+        return {"status": "error", "message": f"Invalid years: {data.get('years')!r}"}
+    if years < 1:
+        return {"status": "error", "message": "years must be at least 1"}
     if ticker:
-        ticker_manager.add_ticker(ticker, name)
-        background_tasks.add_task(fetch_and_write_historical, ticker, years)
+        # The backfill is started by the ticker_manager subscription below
+        ticker_manager.add_ticker(ticker, name, years=years)
         return {"status": "success", "ticker": ticker, "name": name, "years": years}
     return {"status": "error"}
 
 @app.delete("/tickers/{ticker}")
-def delete_ticker(ticker: str):
+async def delete_ticker(ticker: str):
+    if not shard.is_primary:
+        try:
+            return await _forward_to_primary("DELETE", f"/tickers/{ticker}")
+        except Exception as e:
+            return {"status": "error", "message": f"Could not reach primary shard: {e}"}
     ticker_manager.remove_ticker(ticker)
     return {"status": "success", "ticker": ticker}
 
+@app.get("/backfill")
+def get_backfill_jobs():
+    if backfill_queue is not None:
+        return [
+            {key: value for key, value in job.items() if key != "chunks"}
+            for job in backfill_queue.read_status().values()
+        ]
+    return backfill_scheduler.status()
+
+@app.get("/backfill/{ticker}")
+def get_backfill_job(ticker: str):
+    if backfill_queue is not None:
+        job = backfill_queue.read_status().get(ticker.strip().upper())
+    else:
+        job = backfill_scheduler.status(ticker.strip().upper())
+    if job is None:
+        return {"status": "error", "message": f"No backfill for {ticker}"}
+    return job
+
+@app.get("/bars/{ticker}")
+def get_bars(ticker: str, since: str = None, interval: str = "1m"):
+    from src.rollup import RESOLUTIONS, resample_ohlcv
+
+    if interval != "1m" and interval not in RESOLUTIONS:
+        return {"status": "error", "message": f"Unsupported interval {interval}; use 1m or one of {list(RESOLUTIONS)}"}
+    try:
+        bars = bar_buffer.read(ticker.strip().upper(), since)
+    except ValueError as e:
+        return {"status": "error", "message": f"Invalid since: {e}"}
+    if bars is None:
+        return {"status": "error", "message": f"No recent bars for {ticker}"}
+    if interval != "1m":
+        bars = resample_ohlcv(bars, interval)
+    return {
+        "status": "success",
+        "ticker": ticker.strip().upper(),
+        "interval": interval,
+        "bars": [
+            {"time": ts.isoformat(), "open": o, "high": h, "low": l, "close": c, "volume": v}
+            for ts, o, h, l, c, v in zip(
+                bars.index, bars["Open"], bars["High"], bars["Low"], bars["Close"], bars["Volume"]
+            )
+        ],
+    }
+
+@app.get("/grafana/dashboard")
+def get_grafana_dashboard():
+    return build_dashboard(ticker_manager.get_tickers())
+
 @app.get("/search")
-def search_ticker(q: str):
+async def search_ticker(q: str):
     try:
-        url = f"https://query2.finance.yahoo.com/v1/finance/search?q={q}"
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(url, headers=headers, timeout=5)
-        data = response.json()
-        results = []
-        for quote in data.get('quotes', []):
-            if 'symbol' in quote and 'shortname' in quote:
-                results.append({
-                    'symbol': quote['symbol'],
-                    'name': quote['shortname'],
-                    'exchDisp': quote.get('exchDisp', 'Unknown')
-                })
+        results = await ticker_search.search(q)
         return {"status": "success", "results": results}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+@app.get("/search/stats")
+def get_search_stats():
+    return ticker_search.stats()
+
+def _pipeline_health():
+    if config.PROCESS_ROLE == "api":
+        return HealthState.load(HEALTH_PATH)
+    return health.snapshot()
+
+@app.get("/healthz")
+def get_healthz():
+    ok, reason = liveness(_pipeline_health(), config.LIVENESS_STALE_SECONDS)
+    return JSONResponse({"status": "ok" if ok else "error", "message": reason}, status_code=200 if ok else 503)
+
+@app.get("/readyz")
+def get_readyz():
+    snapshot = _pipeline_health()
+    ok, reason = readiness(snapshot)
+    return JSONResponse(
+        {"status": "ok" if ok else "error", "message": reason, "pipeline": snapshot},
+        status_code=200 if ok else 503,
+    )
+
+@app.get("/metrics")
+def get_metrics():
+    # In supervisor mode the pipeline and backfill processes export theirs to RUN_DIR
+    export_dir = None if config.PROCESS_ROLE == "all" else config.RUN_DIR
+    return PlainTextResponse(metrics.render(export_dir), media_type="text/plain; version=0.0.4")
+
+@app.on_event("startup")
+def record_api_start():
+    health.record_timing("api_start", time.perf_counter() - _import_started)
+
+@app.on_event("shutdown")
+async def close_search_client():
+    if ticker_search.loaded:
+        await ticker_search.aclose()
+
 def run_server():
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=28001, log_level="warning")
 
-def main():
+def run_api():
+    """The api role: the web app on its own, with API_WORKERS uvicorn processes."""
+    import uvicorn
+
+    print(f"[{datetime.now()}] Starting API with {config.API_WORKERS} worker(s) on port 28001")
+    target = app if config.API_WORKERS <= 1 else "main:app"
+    uvicorn.run(target, host="0.0.0.0", port=28001, log_level="warning", workers=config.API_WORKERS)
+
+def run_backfill_worker():
+    """The backfill role: runs queued backfill requests and publishes their status."""
+    print(f"[{datetime.now()}] Starting backfill worker ({backfill_scheduler.max_workers} concurrent chunks)")
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    metrics.register_collector(
+        lambda: metrics.QUEUE_DEPTH.set(backfill_scheduler.queued_chunks(), queue="backfill_chunks")
+    )
+    metrics.start_exporter(config.RUN_DIR, "backfill")
+    try:
+        while True:
+            request = backfill_queue.claim()
+            if request is not None:
+                backfill_scheduler.submit(request["symbol"], request.get("years", 5))
+            backfill_queue.write_status(backfill_scheduler.snapshot())
+            if request is None:
+                time.sleep(1)
+    finally:
+        backfill_scheduler.shutdown(wait=False, timeout=config.SHUTDOWN_TIMEOUT)
+
+def run_supervisor():
+    """Run the api, pipeline and backfill roles as child processes, restarting any that exit."""
+    print(f"[{datetime.now()}] Starting supervisor")
+    os.makedirs(config.RUN_DIR, exist_ok=True)
+    for name in os.listdir(config.RUN_DIR):
+        if name.endswith(".metrics.json") or name == os.path.basename(HEALTH_PATH):
+            os.unlink(os.path.join(config.RUN_DIR, name))  # from a previous run
+    Supervisor({role: child_command() for role in ("api", "pipeline", "backfill")}).run()
+
+def main(max_cycles=None, serve=True):
+    """Run the fetch loop. `max_cycles` stops after that many fetch cycles and
+    `serve=False` skips the web server (both used by benchmarks/bench_e2e.py)."""
     print(f"[{datetime.now()}] Starting stock data collection...")
     print(f"Storage Mode: {config.STORAGE_MODE}")
+    print(f"Shard: {shard.index + 1} of {shard.count}" + (" (primary)" if shard.is_primary else ""))
     
-    # Start web server in background
-    server_thread = threading.Thread(target=run_server, daemon=True)
-    server_thread.start()
-    print("Web UI available at http://localhost:28001")
+    if serve:
+        # Start web server in background
+        server_thread = threading.Thread(target=run_server, daemon=True)
+        server_thread.start()
+        print("Web UI available at http://localhost:28001")
+    if config.PROCESS_ROLE == "pipeline":
+        metrics.start_exporter(config.RUN_DIR, "pipeline")
 
-    storage_backends = get_storage_backend(config)
+    # Backend checks can wait seconds on an unreachable InfluxDB; let them run
+    # while the rest of the pipeline is imported instead of before it
+    init_started = time.perf_counter()
+    from src.storage import InfluxDBStorage, get_storage_backend, read_recent, store_indicators, store_rollups, store_timed
+    storage_init = {"backends": []}
+
+    def init_storage():
+        try:
+            storage_init["backends"] = get_storage_backend(config)
+        except Exception as e:
+            print(f"Error initializing storage backends: {e}")
+        health.record_timing("storage_init", time.perf_counter() - init_started)
+
+    storage_thread = threading.Thread(target=init_storage, name="storage-init", daemon=True)
+    storage_thread.start()
+
+    from src.fetcher import StockFetcher
+    from src.indicators import IndicatorEngine
+    from src.rollup import RollupEngine
+    from src.watermark import BarHashIndex, WatermarkTracker
+    health.record_timing("pipeline_import", time.perf_counter() - init_started)
+
+    storage_thread.join()
+    storage_backends = storage_init["backends"]
+    health.storage_ready(storage_backends)
 
     if not storage_backends:
         print("Error: No storage backends available. Exiting.")
         return
 
-    while True:
-        try:
-            current_tickers = ticker_manager.get_ticker_symbols()
-            print(f"\n[{datetime.now()}] Fetching for tickers: {current_tickers}")
-            fetcher = StockFetcher(current_tickers)
-            
-            for ticker in fetcher.tickers:
-                data = fetcher.fetch_data(ticker)
-                
-                if data is not None:
+    for backend in storage_backends:
+        if isinstance(backend, InfluxDBStorage):
+            backfill_scheduler.attach_storage(backend)
+
+    watermarks = WatermarkTracker(storage_backends)
+    # Unchanged bars are skipped by content, so the download window can reach back for corrections
+    bar_hashes = BarHashIndex(max_age=timedelta(minutes=config.DEDUP_WINDOW_MINUTES))
+    schedule = FetchScheduler(
+        config.FETCH_INTERVAL,
+        closed_interval=config.CLOSED_MARKET_INTERVAL,
+        post_close_delay=config.POST_CLOSE_FETCH_DELAY,
+    )
+    rollups = RollupEngine(
+        config.ROLLUP_RESOLUTIONS,
+        loader=lambda ticker, start: read_recent(storage_backends, ticker, start),
+    )
+    indicators = IndicatorEngine(
+        config.INDICATORS,
+        loader=lambda ticker, start: read_recent(storage_backends, ticker, start),
+        lookback_days=config.INDICATOR_LOOKBACK_DAYS,
+    )
+
+    # The loop keeps its own copy of this shard's part of the watchlist, updated by notifications
+    watchlist = dict.fromkeys(shard.filter(ticker_manager.get_ticker_symbols()))
+    watchlist_lock = threading.Lock()
+
+    def on_ticker_change(event, ticker, **context):
+        symbol = ticker["symbol"]
+        if not shard.owns(symbol):
+            return
+        with watchlist_lock:
+            if event == "add":
+                watchlist[symbol] = None
+            else:
+                watchlist.pop(symbol, None)
+        if event == "remove":
+            schedule.forget(symbol)
+            watermarks.forget(symbol)
+            bar_hashes.forget(symbol)
+            rollups.forget(symbol)
+            indicators.forget(symbol)
+            bar_buffer.forget(symbol)
+
+    ticker_manager.subscribe(on_ticker_change)
+    if config.GRAFANA_DASHBOARD_PATH and shard.is_primary:
+        DashboardPublisher(ticker_manager, config.GRAFANA_DASHBOARD_PATH).start()
+    if ticker_sync is not None:
+        ticker_sync.start()
+
+    @metrics.register_collector
+    def collect_backend_metrics():
+        for backend in storage_backends:
+            name = type(backend).__name__
+            metrics.BACKEND_AVAILABLE.set(1 if backend.is_available() else 0, backend=name)
+            if isinstance(backend, InfluxDBStorage):
+                stats = backend.stats()
+                if "writer" in stats:
+                    metrics.QUEUE_DEPTH.set(stats["writer"]["queue_depth"], queue="influx_writer")
+                if "spool" in stats:
+                    metrics.QUEUE_DEPTH.set(stats["spool"]["segments"], queue="influx_spool_segments")
+        if backfill_queue is None and backfill_scheduler.loaded:
+            # With separate processes the backfill role reports this itself
+            metrics.QUEUE_DEPTH.set(backfill_scheduler.queued_chunks(), queue="backfill_chunks")
+
+    # docker stop / k8s send SIGTERM; turn it into SystemExit so queued writes are drained
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    cycles = 0
+    try:
+        while max_cycles is None or cycles < max_cycles:
+            try:
+                # Picks up edits made to tickers.json outside the API (stat only unless changed)
+                health.heartbeat()
+                ticker_manager.refresh()
+                with watchlist_lock:
+                    current_tickers = list(watchlist)
+                due_tickers = schedule.due(current_tickers)
+                if not due_tickers:
+                    wait = schedule.seconds_until_next(current_tickers, cap=config.FETCH_INTERVAL)
+                    print(f"[{datetime.now()}] All markets closed or polled; next fetch in {wait:.0f} seconds")
+                    health.heartbeat("idle", sleep=wait)
+                    time.sleep(wait)
+                    continue
+
+                print(f"\n[{datetime.now()}] Fetching for tickers: {due_tickers}")
+                cycle_started = time.perf_counter()
+                health.heartbeat("fetching")
+                fetcher = StockFetcher(due_tickers)
+                watermarks.seed(fetcher.tickers)
+
+                for ticker, data in fetcher.fetch_many(since=watermarks.marks(), lookback=bar_hashes.max_age):
+                    health.heartbeat()
+                    data = bar_hashes.changed(ticker, data, since=watermarks.get(ticker))
+                    if data.empty:
+                        continue
+                    bar_buffer.append(ticker, data)
+
                     stored = False
                     for backend in storage_backends:
-                        if backend.store(ticker, data):
+                        if store_timed(backend, ticker, data):
                             stored = True
                             break
-                    
-                    if not stored:
+
+                    if stored:
+                        watermarks.advance(ticker, data)
+                        bar_hashes.remember(ticker, data)
+                        store_rollups(storage_backends, ticker, rollups.update(ticker, data))
+                        store_indicators(storage_backends, ticker, indicators.update(ticker, data))
+                    else:
                         print(f"Failed to store data for {ticker} in any backend")
 
-            print(f"Waiting {config.FETCH_INTERVAL} seconds until next fetch...")
-            time.sleep(config.FETCH_INTERVAL)
+                cycle_seconds = time.perf_counter() - cycle_started
+                metrics.CYCLE_SECONDS.observe(cycle_seconds)
+                metrics.CYCLE_LAG_SECONDS.set(max(0.0, cycle_seconds - config.FETCH_INTERVAL))
+                if health.cycles == 0:
+                    health.record_timing("first_cycle", cycle_seconds)
+                    health.record_timing("time_to_first_cycle", time.perf_counter() - _import_started)
+                health.cycle_finished()
+                cycles += 1
+                if max_cycles is not None and cycles >= max_cycles:
+                    break
 
-        except Exception as e:
-            print(f"Error in main loop: {e}")
-            print(f"Retrying in {config.FETCH_INTERVAL} seconds...")
-            time.sleep(config.FETCH_INTERVAL)
+                wait = schedule.seconds_until_next(current_tickers, cap=config.FETCH_INTERVAL)
+                print(f"Waiting {wait:.0f} seconds until next fetch...")
+                health.heartbeat("idle", sleep=wait)
+                time.sleep(wait)
+
+            except Exception as e:
+                print(f"Error in main loop: {e}")
+                health.cycle_finished(error=e)
+                cycles += 1
+                print(f"Retrying in {config.FETCH_INTERVAL} seconds...")
+                health.heartbeat("failing", sleep=config.FETCH_INTERVAL)
+                time.sleep(config.FETCH_INTERVAL)
+    finally:
+        print(f"[{datetime.now()}] Shutting down, flushing storage backends...")
+        if backfill_scheduler.loaded:
+            backfill_scheduler.shutdown(wait=False, timeout=config.SHUTDOWN_TIMEOUT)
+        for backend in storage_backends:
+            backend.close(config.SHUTDOWN_TIMEOUT)
+
+health.record_timing("import", time.perf_counter() - _import_started)
 
 if __name__ == "__main__":
-    main()
+    if config.PROCESS_ROLE == "supervisor":
+        run_supervisor()
+    elif config.PROCESS_ROLE == "api":
+        run_api()
+    elif config.PROCESS_ROLE == "pipeline":
+        main(serve=False)
+    elif config.PROCESS_ROLE == "backfill":
+        run_backfill_worker()
+    else:
+        main()
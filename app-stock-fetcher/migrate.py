@@ -0,0 +1,543 @@
+"""Bulk copy of stored bars between storage backends.
+
+    # Load the *_history.csv files written during InfluxDB outages into InfluxDB
+    python migrate.py --from csv --to influx
+    # Export two tickers' InfluxDB history to Parquet for offline analysis
+    python migrate.py --from influx --to parquet --dest-dir /tmp/export --tickers AAPL,MSFT
+
+Data is streamed in chunks of --chunk-rows bars, so memory use doesn't
+depend on how much history a ticker has. Each chunk goes to InfluxDB as
+one gzip-compressed line protocol write; exports read InfluxDB through
+streamed Flux CSV, --window-days at a time. Tickers are copied
+--workers at a time. After every chunk the last copied timestamp is
+saved to a checkpoint file, so an interrupted run continues where it
+stopped when started again with the same arguments (--restart ignores it).
+The checkpoint is removed once every ticker has been copied.
+
+CSV exports are staged next to the destination file and merged into an
+existing `<ticker>_history.csv` (newer copies of a bar win) only with
+--overwrite; without it the run refuses to touch existing files. The
+merge streams both files chunk by chunk too.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+from influxdb_client import Dialect, InfluxDBClient, WritePrecision
+from influxdb_client.client.write_api import SYNCHRONOUS
+
+from config import config
+from src.storage import ParquetStorage
+from src.storage.line_protocol import encode_ohlcv
+from src.timeutil import to_utc
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def _flux_time(ts):
+    # Nanosecond precision: ranges are bounded at "one nanosecond after the last bar"
+    return to_utc(ts).tz_localize(None).isoformat() + "Z"
+
+
+def _rechunk(frames, rows):
+    """Regroup a stream of small frames into frames of about `rows` rows."""
+    pending, count = [], 0
+    for frame in frames:
+        if frame is None or frame.empty:
+            continue
+        pending.append(frame)
+        count += len(frame)
+        if count >= rows:
+            yield pd.concat(pending)
+            pending, count = [], 0
+    if pending:
+        yield pd.concat(pending)
+
+
+# ---------------------------------------------------------------------------
+# Sources: `chunks(ticker, after)` yields OHLCV frames (UTC index) in time
+# order, holding only bars newer than `after`
+# ---------------------------------------------------------------------------
+class CSVSource:
+    """The `<ticker>_history.csv` files written by CSVStorage."""
+
+    def __init__(self, directory, chunk_rows):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+
+    def tickers(self):
+        suffix = "_history.csv"
+        return sorted(os.path.basename(p)[:-len(suffix)] for p in glob.glob(os.path.join(self.directory, f"*{suffix}")))
+
+    def chunks(self, ticker, after=None, start=None, end=None):
+        path = os.path.join(self.directory, f"{ticker}_history.csv")
+        for chunk in pd.read_csv(path, index_col=0, chunksize=self.chunk_rows):
+            # Intraday rows carry their exchange's UTC offset, daily rows are plain dates
+            chunk.index = pd.to_datetime(chunk.index, utc=True, format="ISO8601").rename("Datetime")
+            chunk = chunk[[c for c in COLUMNS if c in chunk.columns]]
+            yield _select(chunk, after, start, end)
+
+
+class ParquetSource:
+    """The partitioned store written by ParquetStorage."""
+
+    def __init__(self, directory, chunk_rows):
+        self.storage = ParquetStorage(directory, compact_interval=0)
+        self.chunk_rows = chunk_rows
+
+    def tickers(self):
+        return sorted(n[7:] for n in os.listdir(self.storage.root) if n.startswith("ticker="))
+
+    def chunks(self, ticker, after=None, start=None, end=None):
+        def partitions():
+            # One partition is one UTC day, so reading them one by one bounds memory
+            for day, partition_dir in self.storage._partitions(ticker):
+                if after is not None and day < after.date():
+                    continue
+                frame = self.storage._read_partition(partition_dir)
+                if frame is not None:
+                    frame.index = pd.DatetimeIndex(frame.index).tz_convert("UTC")
+                    yield _select(frame, after, start, end)
+        return _rechunk(partitions(), self.chunk_rows)
+
+
+class InfluxSource:
+    """A measurement in InfluxDB, read with streamed Flux CSV one time window at a time."""
+
+    def __init__(self, client, bucket, measurement, chunk_rows, window_days=30):
+        self.client = client
+        self.bucket = bucket
+        self.measurement = measurement
+        self.chunk_rows = chunk_rows
+        self.window = pd.Timedelta(days=window_days)
+
+    def tickers(self):
+        query = f'''
+import "influxdata/influxdb/schema"
+schema.tagValues(bucket: "{self.bucket}", tag: "ticker", start: 0,
+  predicate: (r) => r["_measurement"] == "{self.measurement}")
+'''
+        tables = self.client.query_api().query(query)
+        return sorted(record.get_value() for table in tables for record in table.records)
+
+    def _bound(self, ticker, selector):
+        query = f'''
+from(bucket: "{self.bucket}")
+  |> range(start: 0)
+  |> filter(fn: (r) => r["_measurement"] == "{self.measurement}" and r["ticker"] == "{ticker}" and r["_field"] == "close")
+  |> {selector}()
+'''
+        for table in self.client.query_api().query(query):
+            for record in table.records:
+                return to_utc(record.get_time())
+        return None
+
+    def _window_rows(self, ticker, start, stop):
+        query = f'''
+from(bucket: "{self.bucket}")
+  |> range(start: {_flux_time(start)}, stop: {_flux_time(stop)})
+  |> filter(fn: (r) => r["_measurement"] == "{self.measurement}" and r["ticker"] == "{ticker}")
+  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> keep(columns: ["_time", "open", "high", "low", "close", "volume"])
+'''
+        dialect = Dialect(header=True, annotations=[], date_time_format="RFC3339Nano")
+        header = None
+        for row in self.client.query_api().query_csv(query, dialect=dialect):
+            if not row or not any(row):
+                header = None  # a blank line ends a table; the next one repeats the header
+                continue
+            if header is None:
+                header = {name: i for i, name in enumerate(row)}
+                continue
+            yield [row[header["_time"]]] + [row[header[c.lower()]] if c.lower() in header else "" for c in COLUMNS]
+
+    def _frames(self, ticker, start, stop):
+        rows = []
+        while start < stop:
+            window_stop = min(start + self.window, stop)
+            for row in self._window_rows(ticker, start, window_stop):
+                rows.append(row)
+                if len(rows) >= self.chunk_rows:
+                    yield self._to_frame(rows)
+                    rows = []
+            start = window_stop
+        if rows:
+            yield self._to_frame(rows)
+
+    @staticmethod
+    def _to_frame(rows):
+        frame = pd.DataFrame(rows, columns=["Datetime"] + COLUMNS)
+        frame.index = pd.to_datetime(frame.pop("Datetime"), utc=True, format="ISO8601")
+        return frame.apply(pd.to_numeric, errors="coerce")
+
+    def chunks(self, ticker, after=None, start=None, end=None):
+        first = self._bound(ticker, "first")
+        if first is None:
+            return
+        begin = first
+        if start is not None:
+            begin = max(begin, start)
+        if after is not None:
+            begin = max(begin, after + pd.Timedelta(1, "ns"))
+        stop = end if end is not None else self._bound(ticker, "last") + pd.Timedelta(1, "ns")
+        yield from self._frames(ticker, begin, stop)
+
+
+def _select(frame, after=None, start=None, end=None):
+    if after is not None:
+        frame = frame[frame.index > after]
+    if start is not None:
+        frame = frame[frame.index >= start]
+    if end is not None:
+        frame = frame[frame.index < end]
+    return frame
+
+
+def _merge_sorted(old, new):
+    """Merge two streams of time-ordered frames into one time-ordered stream;
+    a bar in `new` replaces the same bar in `old`. Holds about one frame of each."""
+    streams = [iter(old), iter(new)]
+    buffers = [None, None]
+    done = [False, False]
+    while True:
+        for i in (0, 1):
+            while not done[i] and (buffers[i] is None or buffers[i].empty):
+                buffers[i] = next(streams[i], None)
+                done[i] = buffers[i] is None
+        # Everything up to the earliest last bar of a pending stream can be written
+        pending = [buffers[i].index[-1] for i in (0, 1) if not done[i]]
+        cutoff = min(pending) if pending else None
+        parts = []
+        for i in (0, 1):
+            if buffers[i] is None or buffers[i].empty:
+                continue
+            n = len(buffers[i]) if cutoff is None else buffers[i].index.searchsorted(cutoff, side="right")
+            parts.append(buffers[i].iloc[:n])
+            buffers[i] = buffers[i].iloc[n:]
+        if parts:
+            merged = pd.concat(parts).sort_index(kind="stable")
+            yield merged[~merged.index.duplicated(keep="last")]
+        if cutoff is None:
+            return
+
+
+# ---------------------------------------------------------------------------
+# Destinations: `write(ticker, frame, first)`, which returns a position to
+# checkpoint (or None); `first` is True for the first chunk of a ticker that
+# isn't being resumed. `resume(ticker, position)` runs before a resumed
+# ticker's first chunk
+# ---------------------------------------------------------------------------
+class InfluxSink:
+    """One gzip-compressed line protocol write per chunk, retried with backoff."""
+
+    def __init__(self, client, bucket, measurement, retries=3):
+        self.write_api = client.write_api(write_options=SYNCHRONOUS)
+        self.bucket = bucket
+        self.measurement = measurement
+        self.retries = retries
+
+    def write(self, ticker, frame, first):
+        payload = encode_ohlcv(frame, ticker, measurement=self.measurement)
+        if not payload:
+            return
+        for attempt in range(self.retries + 1):
+            try:
+                self.write_api.write(bucket=self.bucket, record=payload, write_precision=WritePrecision.NS)
+                return
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = 2 ** attempt
+                print(f"[{datetime.now()}] InfluxDB write for {ticker} failed ({e}); retrying in {delay}s")
+                time.sleep(delay)
+
+    def resume(self, ticker, position):
+        pass  # rewriting a bar is harmless
+
+    def finish(self, ticker):
+        pass
+
+
+class CSVSink:
+    """`<ticker>_history.csv` files in CSVStorage's layout.
+
+    Chunks are appended to `<ticker>_history.csv.migrate`; `finish` renames
+    it into place, or merges it with the existing file like CSVStorage.store
+    does, so live data is never truncated. The checkpointed position is the
+    staging file's size, so a resumed run first cuts off rows appended after
+    the last checkpoint.
+    """
+
+    def __init__(self, directory, chunk_rows=50000):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, ticker):
+        return os.path.join(self.directory, f"{ticker}_history.csv")
+
+    def write(self, ticker, frame, first):
+        staging = f"{self.path(ticker)}.migrate"
+        header = first or not os.path.exists(staging)
+        frame.rename_axis("Datetime").to_csv(staging, mode="w" if header else "a", header=header)
+        return os.path.getsize(staging)
+
+    def resume(self, ticker, position):
+        staging = f"{self.path(ticker)}.migrate"
+        if position is not None and os.path.exists(staging):
+            os.truncate(staging, position)
+
+    def _chunks(self, path):
+        for chunk in pd.read_csv(path, index_col=0, chunksize=self.chunk_rows):
+            chunk.index = pd.to_datetime(chunk.index, utc=True, format="ISO8601").rename("Datetime")
+            yield chunk
+
+    def finish(self, ticker):
+        path = self.path(ticker)
+        staging = f"{path}.migrate"
+        if not os.path.exists(staging):
+            return
+        if not os.path.exists(path):
+            os.replace(staging, path)
+            return
+        columns = list(dict.fromkeys(
+            list(pd.read_csv(path, index_col=0, nrows=0).columns) + list(pd.read_csv(staging, index_col=0, nrows=0).columns)
+        ))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            header = True
+            for frame in _merge_sorted(self._chunks(path), self._chunks(staging)):
+                if frame.empty and not header:
+                    continue
+                frame.reindex(columns=columns).to_csv(f, header=header)
+                header = False
+        os.replace(tmp_path, path)
+        os.unlink(staging)
+
+
+class ParquetSink:
+    def __init__(self, directory):
+        self.storage = ParquetStorage(directory, compact_interval=0)
+
+    def write(self, ticker, frame, first):
+        if not self.storage.store(ticker, frame):
+            raise OSError(f"Parquet write failed for {ticker}")
+
+    def resume(self, ticker, position):
+        pass  # stored bars are de-duplicated by compaction
+
+    def finish(self, ticker):
+        self.storage.compact(ticker, min_segments=1)
+
+
+# ---------------------------------------------------------------------------
+# Checkpoint and progress
+# ---------------------------------------------------------------------------
+class Checkpoint:
+    """{ticker: {"rows", "last", "position"}} saved after every chunk (write-temp-then-rename)."""
+
+    def __init__(self, path, restart=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self.state = {}
+        if not restart and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def get(self, ticker):
+        with self._lock:
+            return dict(self.state.get(ticker, {}))
+
+    def update(self, ticker, **values):
+        with self._lock:
+            self.state.setdefault(ticker, {}).update(values)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.state, f, indent=1)
+            os.replace(tmp_path, self.path)
+
+    def remove(self):
+        with self._lock:
+            self.state = {}
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+def checkpoint_path(args, tickers):
+    """Default checkpoint file, keyed by everything that decides what a run copies,
+    so a run with other directories, tickers or time range starts fresh."""
+    key = {
+        "from": args.source,
+        "to": args.dest,
+        "source_dir": os.path.abspath(args.source_dir) if args.source != "influx" else None,
+        "dest_dir": os.path.abspath(args.dest_dir) if args.dest != "influx" else None,
+        "measurement": args.measurement,
+        "tickers": sorted(tickers) if args.tickers else None,
+        "start": args.start,
+        "end": args.end,
+    }
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()[:12]
+    return os.path.join(config.RUN_DIR, f"migrate-{args.source}-to-{args.dest}-{digest}.json")
+
+
+class Progress:
+    """Prints rows copied and rows/s (overall and over the last interval) every `interval` seconds."""
+
+    def __init__(self, total_tickers, interval=5.0):
+        self.total_tickers = total_tickers
+        self.interval = interval
+        self.rows = 0
+        self.tickers_done = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="migrate-progress", daemon=True)
+
+    def add(self, rows=0, ticker_done=False):
+        with self._lock:
+            self.rows += rows
+            self.tickers_done += int(ticker_done)
+
+    def report(self, recent_rate=None):
+        elapsed = time.monotonic() - self.started
+        line = (f"[{datetime.now()}] {self.rows:,} rows in {elapsed:.0f}s "
+                f"({self.rows / elapsed if elapsed else 0:,.0f} rows/s")
+        if recent_rate is not None:
+            line += f", {recent_rate:,.0f} rows/s over the last {self.interval:g}s"
+        print(line + f"), {self.tickers_done}/{self.total_tickers} tickers done")
+
+    def _loop(self):
+        last_rows = 0
+        while not self._stop.wait(self.interval):
+            rows = self.rows
+            self.report((rows - last_rows) / self.interval)
+            last_rows = rows
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.report()
+
+
+def copy_ticker(source, sink, ticker, checkpoint, progress, start=None, end=None):
+    """Copy one ticker chunk by chunk, resuming after its checkpointed timestamp."""
+    state = checkpoint.get(ticker)
+    rows = state.get("rows", 0)
+    after = to_utc(state["last"]) if state.get("last") else None
+    if after is not None:
+        print(f"[{datetime.now()}] Resuming {ticker} after {after} ({rows:,} rows already copied)")
+        sink.resume(ticker, state.get("position"))
+    copied = 0
+    for frame in source.chunks(ticker, after=after, start=start, end=end):
+        frame = frame.dropna(subset=["Open", "High", "Low", "Close"])
+        if frame.empty:
+            continue
+        position = sink.write(ticker, frame, first=rows == 0)
+        rows += len(frame)
+        copied += len(frame)
+        checkpoint.update(ticker, rows=rows, last=frame.index.max().isoformat(), position=position)
+        progress.add(len(frame))
+    sink.finish(ticker)
+    progress.add(ticker_done=True)
+    return copied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Copy stored bars between storage backends.")
+    parser.add_argument("--from", dest="source", choices=["csv", "parquet", "influx"], required=True)
+    parser.add_argument("--to", dest="dest", choices=["csv", "parquet", "influx"], required=True)
+    parser.add_argument("--source-dir", default=config.DATA_DIR, help="data directory of a csv/parquet source")
+    parser.add_argument("--dest-dir", help="data directory of a csv/parquet destination (required for those)")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="merge into existing <ticker>_history.csv files in --dest-dir instead of refusing")
+    parser.add_argument("--tickers", help="comma-separated tickers (default: every ticker in the source)")
+    parser.add_argument("--start", help="only bars at or after this time (UTC unless an offset is given)")
+    parser.add_argument("--end", help="only bars before this time")
+    parser.add_argument("--measurement", default="stock_price", help="InfluxDB measurement to read or write")
+    parser.add_argument("--workers", type=int, default=4, help="tickers copied in parallel")
+    parser.add_argument("--chunk-rows", type=int, default=50000, help="bars per chunk / InfluxDB write")
+    parser.add_argument("--window-days", type=float, default=30, help="time span of each Flux query when exporting")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: RUN_DIR/migrate-<from>-to-<to>-<hash of the arguments>.json)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    if args.dest != "influx" and not args.dest_dir:
+        # Defaulting to DATA_DIR would write into the live store
+        parser.error(f"--dest-dir is required with --to {args.dest}")
+    if args.source == args.dest and (args.source == "influx" or os.path.abspath(args.source_dir) == os.path.abspath(args.dest_dir)):
+        parser.error("source and destination are the same")
+
+    client = None
+    if "influx" in (args.source, args.dest):
+        client = InfluxDBClient(url=config.INFLUXDB_URL, token=config.INFLUXDB_TOKEN, org=config.INFLUXDB_ORG,
+                                timeout=120000, enable_gzip=True)
+        if not client.ping():
+            print(f"InfluxDB at {config.INFLUXDB_URL} is not reachable")
+            return 1
+
+    if args.source == "csv":
+        source = CSVSource(args.source_dir, args.chunk_rows)
+    elif args.source == "parquet":
+        source = ParquetSource(args.source_dir, args.chunk_rows)
+    else:
+        source = InfluxSource(client, config.INFLUXDB_BUCKET, args.measurement, args.chunk_rows, args.window_days)
+
+    if args.dest == "csv":
+        sink = CSVSink(args.dest_dir, args.chunk_rows)
+    elif args.dest == "parquet":
+        sink = ParquetSink(args.dest_dir)
+    else:
+        sink = InfluxSink(client, config.INFLUXDB_BUCKET, args.measurement)
+
+    tickers = [t.strip() for t in args.tickers.split(",") if t.strip()] if args.tickers else source.tickers()
+    checkpoint = Checkpoint(args.checkpoint or checkpoint_path(args, tickers), restart=args.restart)
+    if args.dest == "csv" and not args.overwrite:
+        # Files of tickers this run already started are its own output
+        existing = [t for t in tickers if os.path.exists(sink.path(t)) and not checkpoint.get(t)]
+        if existing:
+            print(f"{args.dest_dir} already holds history for {', '.join(existing)}; "
+                  f"use --overwrite to merge into it")
+            return 1
+    start = to_utc(args.start) if args.start else None
+    end = to_utc(args.end) if args.end else None
+
+    print(f"[{datetime.now()}] Copying {len(tickers)} tickers from {args.source} to {args.dest} "
+          f"with {args.workers} workers (checkpoint {checkpoint.path})")
+    progress = Progress(len(tickers), args.progress_interval)
+    progress.start()
+    failed = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = {pool.submit(copy_ticker, source, sink, t, checkpoint, progress, start, end): t for t in tickers}
+            for future in as_completed(futures):
+                ticker = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"[{datetime.now()}] Failed to copy {ticker}: {e}")
+                    failed.append(ticker)
+    finally:
+        progress.stop()
+        if client is not None:
+            client.close()
+    if failed:
+        print(f"Failed tickers (run again to resume): {', '.join(sorted(failed))}")
+        return 1
+    checkpoint.remove()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from config import config
+from src.coverage import CoverageIndex
+from src.rollup import resample_ohlcv
+from src.fetcher import chunk_dates, fetch_historical_chunk, plan_missing_chunks, store_historical_chunk
+from src.metrics import BACKFILL_CHUNKS
+from src.storage import create_influx_storage, store_timed
+
+
+def storage_rollups(storage, symbol, interval, df):
+    """Write backfilled 1m bars to the intraday rollup measurements; they cover
+    whole sessions, so those rollups are complete. Daily chunks already are
+    the 1d rollup (see `store_historical_chunk`)."""
+    if interval != "1m":
+        return
+    for resolution in config.ROLLUP_RESOLUTIONS:
+        if resolution != "1d":
+            store_timed(storage, symbol, resample_ohlcv(df, resolution), resolution)
+
+
+class BackfillJob:
+    """Progress of one symbol's historical backfill."""
+
+    def __init__(self, symbol, years, chunks):
+        self.symbol = symbol
+        self.years = years
+        self.submitted_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.planning = False
+        self.set_chunks(chunks)
+
+    def set_chunks(self, chunks):
+        self.chunks = [
+            {
+                "label": chunk["label"],
+                "spec": chunk,
+                "state": "queued",
+                "started_at": None,
+                "finished_at": None,
+                "duration": None,
+                "rows": 0,
+                "error": None,
+            }
+            for chunk in chunks
+        ]
+
+    @property
+    def state(self):
+        if self.planning:
+            return "queued"
+        states = {c["state"] for c in self.chunks}
+        if states <= {"done", "failed"}:
+            return "failed" if "failed" in states else "done"
+        if states == {"queued"}:
+            return "queued"
+        return "running"
+
+    def to_dict(self, include_chunks=True):
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        for chunk in self.chunks:
+            counts[chunk["state"]] += 1
+        result = {
+            "ticker": self.symbol,
+            "years": self.years,
+            "state": self.state,
+            "submitted_at": self.submitted_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "chunks_total": len(self.chunks),
+            **{f"chunks_{state}": n for state, n in counts.items()},
+        }
+        if include_chunks:
+            result["chunks"] = [
+                {
+                    key: (value.isoformat() if isinstance(value, datetime) else value)
+                    for key, value in chunk.items()
+                    if key != "spec"
+                }
+                for chunk in self.chunks
+            ]
+        return result
+
+
+class BackfillScheduler:
+    """Runs historical backfills on a dedicated worker pool.
+
+    Every chunk of every job is a separate task, so the chunks of one symbol
+    download in parallel while `max_workers` caps concurrency across all
+    symbols. All chunks write through one long-lived InfluxDBStorage (and its
+    batch writer). A symbol whose job is still queued or running is not
+    submitted again, and only the ranges `coverage` reports as missing are
+    downloaded.
+    """
+
+    def __init__(self, max_workers=None, storage=None, coverage=None):
+        self.max_workers = max_workers or config.BACKFILL_CONCURRENCY
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="backfill")
+        self._storage = storage
+        self._owns_storage = False
+        self.coverage = coverage or CoverageIndex()
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def attach_storage(self, storage):
+        """Share an already-connected InfluxDBStorage instead of creating one."""
+        with self._lock:
+            if self._storage is None:
+                self._storage = storage
+
+    def _get_storage(self):
+        with self._lock:
+            if self._storage is not None:
+                return self._storage
+        # Connecting pings InfluxDB (up to its timeout), so don't hold the lock
+        # that GET /backfill needs; the spool directory belongs to the live loop's storage
+        storage = create_influx_storage(config, spool=False)
+        with self._lock:
+            if self._storage is None:
+                self._storage = storage
+                self._owns_storage = True
+                return storage
+        storage.close()  # another chunk got there first
+        return self._storage
+
+    def submit(self, symbol, years=5, chunk_years=1):
+        """Queue a backfill for `symbol`. Returns the job, or None if one is already active."""
+        with self._lock:
+            current = self._jobs.get(symbol)
+            if current is not None and current.state in ("queued", "running"):
+                print(f"[{datetime.now()}] Historical fetch for {symbol} already in progress – skipping.")
+                return None
+            job = BackfillJob(symbol, years, [])
+            job.planning = True
+            self._jobs[symbol] = job
+        self._executor.submit(self._plan, job, chunk_years)
+        return job
+
+    def _plan(self, job, chunk_years):
+        """Ask the coverage index what's missing, then queue one task per chunk."""
+        try:
+            chunks = plan_missing_chunks(job.symbol, self._get_storage(), self.coverage, job.years, chunk_years)
+        except Exception as e:
+            print(f"Error planning backfill for {job.symbol}: {e}")
+            chunks = []
+        with self._lock:
+            job.set_chunks(chunks)
+            job.planning = False
+            if not chunks:
+                job.finished_at = datetime.now()
+        if not chunks:
+            print(f"[{datetime.now()}] {job.symbol} history already complete – nothing to backfill")
+            return
+        for chunk in job.chunks:
+            self._executor.submit(self._run_chunk, job, chunk)
+        print(f"[{datetime.now()}] Queued backfill for {job.symbol} ({len(job.chunks)} chunks)")
+
+    def _run_chunk(self, job, chunk):
+        with self._lock:
+            chunk["state"] = "running"
+            chunk["started_at"] = datetime.now()
+            if job.started_at is None:
+                job.started_at = chunk["started_at"]
+        start = time.monotonic()
+        state, error, rows = "done", None, 0
+        try:
+            df = fetch_historical_chunk(job.symbol, chunk["spec"])
+            if df is None:
+                state, error = "failed", "download failed"
+            elif not df.empty:
+                rows = len(df)
+                storage = self._get_storage()
+                if not store_historical_chunk(storage, job.symbol, chunk["spec"]["interval"], df):
+                    state, error = "failed", "storage write failed"
+                else:
+                    storage_rollups(storage, job.symbol, chunk["spec"]["interval"], df)
+            # Also an empty chunk: Yahoo has no bars there (before the listing, holidays)
+            if state == "done":
+                self.coverage.record_fetched(job.symbol, chunk["spec"]["interval"], *chunk_dates(chunk["spec"]))
+        except Exception as e:
+            print(f"Error in historical fetch for {job.symbol} ({chunk['label']}): {e}")
+            state, error = "failed", str(e)
+        BACKFILL_CHUNKS.inc(state=state, interval=chunk["spec"]["interval"])
+        with self._lock:
+            chunk["state"] = state
+            chunk["error"] = error
+            chunk["rows"] = rows
+            chunk["finished_at"] = datetime.now()
+            chunk["duration"] = round(time.monotonic() - start, 3)
+            if job.state in ("done", "failed"):
+                job.finished_at = chunk["finished_at"]
+                print(f"[{datetime.now()}] Backfill for {job.symbol} {job.state}")
+
+    def status(self, symbol=None):
+        """Snapshot of all jobs, or of one symbol's job (None if unknown)."""
+        with self._lock:
+            if symbol is not None:
+                job = self._jobs.get(symbol)
+                return job.to_dict() if job else None
+            return [job.to_dict(include_chunks=False) for job in self._jobs.values()]
+
+    def snapshot(self):
+        """{symbol: full job status} for every job, e.g. to publish to another process."""
+        with self._lock:
+            return {symbol: job.to_dict() for symbol, job in self._jobs.items()}
+
+    def queued_chunks(self):
+        """Chunks waiting for a worker, across all jobs."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() for c in job.chunks if c["state"] == "queued")
+
+    def shutdown(self, wait=True, timeout=None):
+        """Stop the workers; `timeout` bounds the wait for the storage's queued writes."""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        if self._owns_storage:
+            self._storage.close(timeout)
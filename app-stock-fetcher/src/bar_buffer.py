@@ -0,0 +1,191 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+# One 1m bar: 48 bytes, timestamps as UTC epoch nanoseconds
+BAR_DTYPE = np.dtype([
+    ("ts", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+FIELDS = {"Open": "open", "High": "high", "Low": "low", "Close": "close", "Volume": "volume"}
+
+# File layout of a shared ring: int64 header [seq, head, count, capacity], then the records
+_HEADER_WORDS = 4
+_HEADER_BYTES = 64
+
+
+def _to_records(data):
+    """OHLCV DataFrame -> BAR_DTYPE records sorted by time, without NaN-price rows."""
+    data = data.dropna(subset=["Open", "High", "Low", "Close"])
+    index = pd.DatetimeIndex(data.index)
+    index = index.tz_localize("UTC") if index.tz is None else index.tz_convert("UTC")
+    records = np.empty(len(data), dtype=BAR_DTYPE)
+    records["ts"] = index.asi8
+    for column, field in FIELDS.items():
+        records[field] = data[column].to_numpy(dtype="float64", na_value=0.0) if column in data.columns else 0.0
+    records.sort(order="ts")
+    return records
+
+
+class BarRing:
+    """Fixed-size ring of 1m bars for one ticker.
+
+    `header` holds [seq, head, count, capacity] and `records` the bars; both
+    are NumPy arrays, either in memory or memory-mapped from a file so that
+    another process can read them. `seq` is odd while a write is in
+    progress, so readers can detect and retry a torn read.
+    """
+
+    def __init__(self, header, records):
+        self.header = header
+        self.records = records
+        self.capacity = len(records)
+
+    @classmethod
+    def in_memory(cls, capacity):
+        header = np.zeros(_HEADER_WORDS, dtype="<i8")
+        header[3] = capacity
+        return cls(header, np.zeros(capacity, dtype=BAR_DTYPE))
+
+    @classmethod
+    def open_file(cls, path, capacity=None, readonly=False):
+        if not readonly and (not os.path.exists(path) or os.path.getsize(path) == 0):
+            with open(path, "wb") as f:
+                f.truncate(_HEADER_BYTES + capacity * BAR_DTYPE.itemsize)
+            mode = "r+"
+            header = np.memmap(path, dtype="<i8", mode=mode, shape=(_HEADER_WORDS,))
+            header[3] = capacity
+        else:
+            mode = "r" if readonly else "r+"
+            header = np.memmap(path, dtype="<i8", mode=mode, shape=(_HEADER_WORDS,))
+        records = np.memmap(path, dtype=BAR_DTYPE, mode=mode, offset=_HEADER_BYTES, shape=(int(header[3]),))
+        return cls(header, records)
+
+    def _ordered(self):
+        head, count = int(self.header[1]), int(self.header[2])
+        start = (head - count) % self.capacity
+        if start + count <= self.capacity:
+            return self.records[start:start + count].copy()
+        return np.concatenate([self.records[start:], self.records[:head]])
+
+    def read(self, since_ns=None, retries=5):
+        """Bars in time order, optionally only those at or after `since_ns`."""
+        for _ in range(retries):
+            seq = int(self.header[0])
+            bars = self._ordered()
+            if seq % 2 == 0 and int(self.header[0]) == seq:
+                break
+        if since_ns is not None:
+            bars = bars[bars["ts"] >= since_ns]
+        return bars
+
+    def append(self, new):
+        """Add sorted records. Bars newer than the last one are appended in place,
+        and a new version of the last bar (the forming bar, re-sent every cycle)
+        overwrites it in place; anything older goes through a merge of the whole ring."""
+        if not len(new):
+            return
+        self.header[0] += 1
+        try:
+            head, count = int(self.header[1]), int(self.header[2])
+            last = self.records[(head - 1) % self.capacity]["ts"] if count else None
+            if last is not None and new["ts"][0] == last:
+                self.records[(head - 1) % self.capacity] = new[0]
+                new = new[1:]
+                if not len(new):
+                    return
+            if last is not None and new["ts"][0] <= last:
+                merged = np.concatenate([self._ordered(), new])
+                # Stable sort keeps the later (new) copy last among equal timestamps
+                merged = merged[np.argsort(merged["ts"], kind="stable")]
+                keep = np.append(merged["ts"][1:] != merged["ts"][:-1], True)
+                new = merged[keep][-self.capacity:]
+                head, count = 0, 0
+            new = new[-self.capacity:]
+            n = len(new)
+            first = min(n, self.capacity - head)
+            self.records[head:head + first] = new[:first]
+            self.records[:n - first] = new[first:]
+            self.header[1] = (head + n) % self.capacity
+            self.header[2] = min(count + n, self.capacity)
+        finally:
+            self.header[0] += 1
+
+
+class BarBuffer:
+    """Recent 1m bars per ticker in fixed-size NumPy rings (48 bytes per bar).
+
+    With `directory` each ring is a memory-mapped file there, so the pipeline
+    process can fill it while API processes open it `readonly`.
+    """
+
+    def __init__(self, capacity=1440, directory=None, readonly=False):
+        self.capacity = capacity
+        self.directory = directory
+        self.readonly = readonly
+        self._rings = {}
+        self._inodes = {}
+        self._lock = threading.Lock()
+        if directory and not readonly:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, ticker):
+        return os.path.join(self.directory, f"{ticker.replace(os.sep, '_')}.bars")
+
+    def _ring(self, ticker, create=False):
+        with self._lock:
+            ring = self._rings.get(ticker)
+            if self.directory is None:
+                if ring is None and create:
+                    ring = self._rings[ticker] = BarRing.in_memory(self.capacity)
+                return ring
+            path = self._path(ticker)
+            try:
+                inode = os.stat(path).st_ino
+            except FileNotFoundError:
+                inode = None
+            # A reader re-opens the file if the writer removed and re-created it
+            if ring is not None and inode == self._inodes.get(ticker):
+                return ring
+            if inode is None and not create:
+                self._rings.pop(ticker, None)
+                return None
+            ring = self._rings[ticker] = BarRing.open_file(path, self.capacity, readonly=self.readonly)
+            self._inodes[ticker] = os.stat(path).st_ino
+            return ring
+
+    def append(self, ticker, data):
+        if self.capacity <= 0 or data is None or data.empty:
+            return
+        self._ring(ticker, create=True).append(_to_records(data))
+
+    def read(self, ticker, since=None):
+        """Buffered bars for `ticker` as an OHLCV DataFrame (UTC index), or None if unknown."""
+        ring = self._ring(ticker)
+        if ring is None:
+            return None
+        since_ns = None
+        if since is not None:
+            since = pd.Timestamp(since)
+            since_ns = (since.tz_localize("UTC") if since.tzinfo is None else since).value
+        bars = ring.read(since_ns)
+        return pd.DataFrame(
+            {column: bars[field] for column, field in FIELDS.items()},
+            index=pd.DatetimeIndex(bars["ts"].astype("datetime64[ns]"), name="Datetime").tz_localize("UTC"),
+        )
+
+    def forget(self, ticker):
+        with self._lock:
+            self._rings.pop(ticker, None)
+            self._inodes.pop(ticker, None)
+        if self.directory is not None and not self.readonly:
+            try:
+                os.unlink(self._path(ticker))
+            except FileNotFoundError:
+                pass
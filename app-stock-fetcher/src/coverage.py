@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from config import config
+
+
+def missing_ranges(covered, start, end, holiday_tolerance=3, merge_days=5):
+    """Turn the covered dates in [start, end) into a list of (start, end) date
+    ranges to download, end exclusive.
+
+    Weekends are never gaps. A run of at most `holiday_tolerance` missing
+    weekdays inside the window is assumed to be an exchange holiday; runs
+    touching the end of the window are always real gaps (the newest days
+    simply haven't been loaded yet). Gaps separated by fewer than
+    `merge_days` covered weekdays are merged into one download.
+    """
+    days = pd.bdate_range(start, end - timedelta(days=1)).date
+    runs = []
+    run_start = None
+    for i, day in enumerate(days):
+        if day not in covered:
+            if run_start is None:
+                run_start = i
+        elif run_start is not None:
+            runs.append([run_start, i - 1])
+            run_start = None
+    if run_start is not None:
+        runs.append([run_start, len(days) - 1])
+
+    last = len(days) - 1
+    runs = [r for r in runs if r[1] == last or r[1] - r[0] + 1 > holiday_tolerance]
+
+    merged = []
+    for run in runs:
+        if merged and run[0] - merged[-1][1] - 1 < merge_days:
+            merged[-1][1] = run[1]
+        else:
+            merged.append(run)
+    return [(days[a], days[b] + timedelta(days=1)) for a, b in merged]
+
+
+class CoverageIndex:
+    """Per ticker and interval, which days are already stored or were already requested.
+
+    Stored days come from the storage backend; requested ranges are kept in a
+    small JSON file under DATA_DIR so days Yahoo has no data for (pre-IPO
+    history, holidays) aren't downloaded again on every backfill.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(config.DATA_DIR, "coverage.json")
+        self._lock = threading.Lock()
+        self._fetched = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Error reading coverage metadata: {e}")
+            return {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._fetched, f)
+        os.replace(tmp_path, self.path)
+
+    def fetched_dates(self, ticker, interval, start, end):
+        with self._lock:
+            ranges = self._fetched.get(ticker, {}).get(interval, [])
+        dates = set()
+        for a, b in ranges:
+            a = max(pd.Timestamp(a).date(), start)
+            b = min(pd.Timestamp(b).date(), end)
+            if a < b:
+                dates.update(pd.date_range(a, b - timedelta(days=1)).date)
+        return dates
+
+    def record_fetched(self, ticker, interval, start, end):
+        """Remember that [start, end) was downloaded for `ticker` at `interval`.
+        Today is never recorded since its bars are still arriving."""
+        end = min(end, datetime.utcnow().date())
+        if start >= end:
+            return
+        with self._lock:
+            ranges = self._fetched.setdefault(ticker, {}).setdefault(interval, [])
+            ranges.append([start.isoformat(), end.isoformat()])
+            ranges.sort()
+            merged = []
+            for a, b in ranges:
+                if merged and a <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], b)
+                else:
+                    merged.append([a, b])
+            self._fetched[ticker][interval] = merged
+            try:
+                self._save()
+            except Exception as e:
+                print(f"Error writing coverage metadata: {e}")
+
+    def missing(self, storage, ticker, start, end, interval="1d"):
+        """Date ranges in [start, end) neither stored in `storage` nor already requested."""
+        covered = storage.covered_dates(ticker, start, end, interval)
+        covered |= self.fetched_dates(ticker, interval, start, end)
+        return missing_ranges(
+            covered,
+            start,
+            end,
+            holiday_tolerance=config.BACKFILL_HOLIDAY_TOLERANCE,
+            merge_days=config.BACKFILL_GAP_MERGE_DAYS,
+        )
@@ -0,0 +1,220 @@
+"""Grafana dashboard generated from the watchlist.
+
+One candlestick panel is repeated for every value of a `ticker` template
+variable, so adding a ticker never means editing panel JSON. Queries
+aggregate to Grafana's `v.windowPeriod` and read the finest measurement
+(`stock_price` or a `stock_price_<res>` rollup) that keeps the selected
+range within about `max_points` bars, so a wide range never pulls raw 1m rows.
+A range reaching back past the intraday history reads the 1d rollup, where
+backfilled daily bars are.
+
+    python -m src.dashboard --out ../infra-grafana/provisioning/dashboards/stock_dashboard.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+from config import config
+
+DASHBOARD_UID = "stock_dash_01"
+
+# Rollup resolution -> bar length in seconds
+RESOLUTION_SECONDS = {"5m": 300, "15m": 900, "1h": 3600, "1d": 86400}
+
+# Backfills get 1m bars (and so intraday rollups) only this far back, the most
+# yfinance serves; before that there are only daily bars, in stock_price_1d
+INTRADAY_HISTORY_SECONDS = 7 * 86400
+
+_AGGREGATES = (("open", "first"), ("high", "max"), ("low", "min"), ("close", "last"), ("volume", "sum"))
+
+
+def _flux_string(value):
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def measurement_expression(resolutions, max_points):
+    """Flux expression choosing the measurement for the dashboard's time range:
+    raw 1m bars while the range holds at most `max_points` of them, else the
+    finest rollup that does. A range starting before the intraday history
+    (`startAge`) uses the 1d rollup, as the finer ones would be empty there."""
+    coarsest_first = sorted(
+        (r for r in resolutions if r in RESOLUTION_SECONDS), key=RESOLUTION_SECONDS.get, reverse=True
+    )
+    if not coarsest_first:
+        return '"stock_price"'
+    branches = []
+    if "1d" in coarsest_first:
+        branches.append(f'if startAge > {INTRADAY_HISTORY_SECONDS} then "stock_price_1d"')
+    for index, resolution in enumerate(coarsest_first):
+        # Use this rollup when the range is too long for the next finer one
+        finer = coarsest_first[index + 1] if index + 1 < len(coarsest_first) else None
+        limit = max_points * (RESOLUTION_SECONDS[finer] if finer else 60)
+        branches.append(f'if rangeSeconds > {limit} then "stock_price_{resolution}"')
+    return " else ".join(branches) + ' else "stock_price"'
+
+
+def candlestick_query(bucket, resolutions, max_points):
+    aggregates = ",\n    ".join(f'ohlc(field: "{field}", agg: {agg})' for field, agg in _AGGREGATES)
+    return (
+        "rangeSeconds = (int(v: v.timeRangeStop) - int(v: v.timeRangeStart)) / 1000000000\n"
+        "startAge = (int(v: now()) - int(v: v.timeRangeStart)) / 1000000000\n"
+        f"measurement = {measurement_expression(resolutions, max_points)}\n"
+        f"data = from(bucket: {_flux_string(bucket)})\n"
+        "  |> range(start: v.timeRangeStart, stop: v.timeRangeStop)\n"
+        '  |> filter(fn: (r) => r["_measurement"] == measurement and r["ticker"] == "${ticker}")\n'
+        "ohlc = (field, agg) => data\n"
+        '  |> filter(fn: (r) => r["_field"] == field)\n'
+        '  |> aggregateWindow(every: v.windowPeriod, fn: agg, timeSrc: "_start", createEmpty: false)\n'
+        f"union(tables: [\n    {aggregates}\n])\n"
+        '  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")\n'
+        '  |> drop(columns: ["_start", "_stop", "_measurement"])\n'
+    )
+
+
+def ticker_variable(tickers):
+    """Custom `ticker` variable labelled with the ticker names; all selected by default."""
+    options = []
+    for ticker in tickers:
+        symbol = ticker["symbol"]
+        name = (ticker.get("name") or symbol).replace(",", "\\,")
+        options.append(f"{name} : {symbol}" if name != symbol else symbol)
+    return {
+        "name": "ticker",
+        "label": "Ticker",
+        "type": "custom",
+        "query": ",".join(options),
+        "multi": True,
+        "includeAll": True,
+        "current": {"selected": True, "text": ["All"], "value": ["$__all"]},
+        "options": [],
+    }
+
+
+def candlestick_panel(datasource, query):
+    return {
+        "datasource": datasource,
+        "fieldConfig": {"defaults": {"color": {"mode": "palette-classic"}}, "overrides": []},
+        "gridPos": {"h": 8, "w": 12, "x": 0, "y": 0},
+        "id": 1,
+        "maxPerRow": 2,
+        "options": {
+            "candleStyle": "candles",
+            "colorStrategy": "open-close",
+            "colors": {"down": "red", "up": "green"},
+            "includeAllFields": False,
+            "legend": {"calcs": [], "displayMode": "list", "placement": "bottom", "showLegend": True},
+            "mode": "candles+volume",
+            "tooltip": {"mode": "single", "sort": "none"},
+        },
+        "repeat": "ticker",
+        "repeatDirection": "h",
+        "targets": [{"datasource": datasource, "query": query, "refId": "A"}],
+        "title": "${ticker:text} (${ticker})",
+        "type": "candlestick",
+    }
+
+
+def build_dashboard(tickers, bucket=None, resolutions=None, datasource_uid=None, max_points=None):
+    """Dashboard JSON for `tickers` (TickerManager.get_tickers() items)."""
+    datasource = {"type": "influxdb", "uid": datasource_uid or config.GRAFANA_DATASOURCE_UID}
+    query = candlestick_query(
+        bucket or config.INFLUXDB_BUCKET,
+        config.ROLLUP_RESOLUTIONS if resolutions is None else resolutions,
+        max_points or config.GRAFANA_MAX_POINTS,
+    )
+    return {
+        "annotations": {"list": [{
+            "builtIn": 1,
+            "datasource": {"type": "grafana", "uid": "-- Grafana --"},
+            "enable": True,
+            "hide": True,
+            "iconColor": "rgba(0, 211, 255, 1)",
+            "name": "Annotations & Alerts",
+            "type": "dashboard",
+        }]},
+        "editable": True,
+        "graphTooltip": 0,
+        "links": [],
+        "panels": [candlestick_panel(datasource, query)],
+        "schemaVersion": 39,
+        "tags": ["generated"],
+        "templating": {"list": [ticker_variable(tickers)]},
+        "time": {"from": "now-3h", "to": "now"},
+        "timepicker": {},
+        "timezone": "browser",
+        "title": "Stock Dashboard",
+        "uid": DASHBOARD_UID,
+    }
+
+
+def write_dashboard(path, dashboard):
+    """Write `dashboard` to `path` (write-temp-then-rename); returns False if it was unchanged."""
+    content = json.dumps(dashboard, indent=2, ensure_ascii=False) + "\n"
+    try:
+        with open(path, encoding="utf-8") as f:
+            if f.read() == content:
+                return False
+    except OSError:
+        pass
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    # Not *.json, so Grafana's provisioning scan never picks up a half-written file
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".dashboard-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        # mkstemp creates the file 0600; Grafana usually runs as another user
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    return True
+
+
+class DashboardPublisher:
+    """Keeps the dashboard file at `path` in sync with a TickerManager.
+
+    `start()` writes it once and then again on every add or remove, which
+    Grafana's file provisioning picks up on its next scan.
+    """
+
+    def __init__(self, ticker_manager, path, **options):
+        self.ticker_manager = ticker_manager
+        self.path = path
+        self.options = options
+        self._lock = threading.Lock()
+
+    def publish(self):
+        with self._lock:
+            dashboard = build_dashboard(self.ticker_manager.get_tickers(), **self.options)
+            try:
+                if write_dashboard(self.path, dashboard):
+                    print(f"[{datetime.now()}] Wrote Grafana dashboard to {self.path}")
+            except OSError as e:
+                print(f"[{datetime.now()}] Could not write Grafana dashboard to {self.path}: {e}")
+
+    def _on_ticker_change(self, event, ticker, **context):
+        self.publish()
+
+    def start(self):
+        self.publish()
+        self.ticker_manager.subscribe(self._on_ticker_change)
+
+
+if __name__ == "__main__":
+    from src.ticker_manager import TickerManager
+
+    parser = argparse.ArgumentParser(description="Generate the Grafana stock dashboard from the watchlist.")
+    parser.add_argument("--out", default=config.GRAFANA_DASHBOARD_PATH or None,
+                        help="file to write (default GRAFANA_DASHBOARD_PATH; stdout if unset)")
+    args = parser.parse_args()
+    dashboard = build_dashboard(TickerManager().get_tickers())
+    if args.out:
+        changed = write_dashboard(args.out, dashboard)
+        print(f"{'Wrote' if changed else 'Unchanged'}: {args.out}")
+    else:
+        print(json.dumps(dashboard, indent=2, ensure_ascii=False))
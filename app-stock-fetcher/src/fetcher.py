@@ -1,133 +1,273 @@
+import logging
+import threading
+import time
 import yfinance as yf
 from datetime import datetime, timedelta
 import pandas as pd
 
+from config import config
+from src.metrics import DOWNLOAD_FAILURES, DOWNLOAD_SECONDS, timed
+from src.ratelimit import is_rate_limit_error, yahoo_limiter
+from src.watermark import window_start
+
 # Existing StockFetcher for real-time data
-import threading
 
-def _download_data(symbol: str, *, start: str = None, end: str = None, period: str = None, interval: str = "1d"):
+# What yfinance logs when Yahoo answered but has no bars for the range, e.g.
+# before a listing or over holidays; a status code means the request failed
+_NO_DATA_REASONS = ("no price data found", "Data doesn't exist")
+
+class _DownloadErrors(logging.Handler):
+    """Collects the per-symbol errors `yf.download` logs from the calling thread.
+    The download itself returns the same empty frame whether Yahoo had no bars
+    or the request failed, so this is the only way to tell them apart."""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.thread = threading.get_ident()
+        self.messages = []
+
+    def emit(self, record):
+        if record.thread == self.thread and "Failed download" not in record.getMessage():
+            self.messages.append(record.getMessage())
+
+    def no_data(self):
+        """True if Yahoo answered without bars rather than the request failing."""
+        return bool(self.messages) and all(
+            any(reason in m for reason in _NO_DATA_REASONS) and "status_code" not in m
+            for m in self.messages
+        )
+
+    def __enter__(self):
+        logging.getLogger("yfinance").addHandler(self)
+        return self
+
+    def __exit__(self, *exc):
+        logging.getLogger("yfinance").removeHandler(self)
+
+def _download_data(symbol: str, *, start: str = None, end: str = None, period: str = None, interval: str = "1d",
+                   priority: str = "live"):
     """Common helper to download data with yfinance.
     - If `period` is provided, `start`/`end` are ignored.
     - If `start`/`end` are provided, they must be YYYY-MM-DD strings.
-    Returns a pandas DataFrame or None.
+    - `priority` is the request's class in the shared Yahoo rate limiter.
+    Returns a pandas DataFrame, empty if Yahoo has no bars for the window
+    (e.g. before the listing date), or None if the download failed.
     """
     try:
+        yahoo_limiter.acquire(priority)
         print(f"[{datetime.now()}] Downloading data for {symbol} (period={period}, start={start}, end={end}, interval={interval})")
-        if period:
-            df = yf.download(symbol, period=period, interval=interval, progress=False)
-        else:
-            df = yf.download(symbol, start=start, end=end, interval=interval, progress=False)
+        with timed(DOWNLOAD_SECONDS, kind="single", interval=interval), _DownloadErrors() as errors:
+            if period:
+                df = yf.download(symbol, period=period, interval=interval, progress=False)
+            else:
+                df = yf.download(symbol, start=start, end=end, interval=interval, progress=False)
+        if df.empty and errors.no_data():
+            print(f"No data for {symbol} in this window")
+            yahoo_limiter.report("ok")
+            return df
         if df.empty:
             print(f"No data received for {symbol}")
+            DOWNLOAD_FAILURES.inc(kind="single", reason="empty")
+            # yf.download reports a 429 as an empty frame, so treat it as a throttling hint
+            yahoo_limiter.report("empty")
             return None
+        yahoo_limiter.report("ok")
         if isinstance(df.columns, pd.MultiIndex):
             df.columns = df.columns.get_level_values(0)
         return df
     except Exception as e:
         print(f"Error downloading data for {symbol}: {e}")
+        DOWNLOAD_FAILURES.inc(kind="single", reason="error")
+        if is_rate_limit_error(e):
+            yahoo_limiter.report("throttled")
         return None
+
+def _download_many(symbols, *, start=None, end=None, period: str = None, interval: str = "1d", priority: str = "live"):
+    """Download several symbols with a single grouped yfinance request.
+    Accepts the same window and priority arguments as `_download_data`;
+    `start`/`end` may also be datetimes for intraday windows shorter than a day.
+    Returns a dict mapping each symbol to its own DataFrame (flat OHLCV columns);
+    symbols without data are left out.
+    """
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    try:
+        yahoo_limiter.acquire(priority)
+        print(f"[{datetime.now()}] Downloading data for {len(symbols)} symbols (period={period}, start={start}, end={end}, interval={interval})")
+        started = time.perf_counter()
+        if period:
+            df = yf.download(symbols, period=period, interval=interval, group_by="ticker", progress=False)
+        else:
+            df = yf.download(symbols, start=start, end=end, interval=interval, group_by="ticker", progress=False)
+        # One request serves the whole batch; record its cost per ticker so the
+        # histogram stays comparable across batch sizes
+        elapsed = time.perf_counter() - started
+        DOWNLOAD_SECONDS.observe(elapsed / len(symbols), kind="batch_per_ticker", interval=interval)
+    except Exception as e:
+        print(f"Error downloading data for {symbols}: {e}")
+        DOWNLOAD_FAILURES.inc(len(symbols), kind="batch", reason="error")
+        if is_rate_limit_error(e):
+            yahoo_limiter.report("throttled")
+        return {}
+    if df is None or df.empty:
+        print(f"No data received for {symbols}")
+        DOWNLOAD_FAILURES.inc(len(symbols), kind="batch", reason="empty")
+        yahoo_limiter.report("empty")
+        return {}
+    # Some symbols of a batch missing data is normal (e.g. a closed exchange)
+    yahoo_limiter.report("ok")
+
+    results = {}
+    if isinstance(df.columns, pd.MultiIndex):
+        available = set(df.columns.get_level_values(0))
+        for symbol in symbols:
+            if symbol not in available:
+                continue
+            # The batch shares one index across exchanges, so each symbol carries
+            # all-NaN rows for the other symbols' timestamps.
+            frame = df[symbol].dropna(how="all")
+            if not frame.empty:
+                results[symbol] = frame
+    elif len(symbols) == 1:
+        results[symbols[0]] = df
+    missing = [s for s in symbols if s not in results]
+    if missing:
+        print(f"No data received for {missing}")
+        DOWNLOAD_FAILURES.inc(len(missing), kind="batch", reason="empty")
+    return results
+
 class StockFetcher:
-    def __init__(self, tickers):
+    def __init__(self, tickers, batch_size=None):
         self.tickers = [t.strip() for t in tickers]
+        self.batch_size = batch_size or config.FETCH_BATCH_SIZE
 
     def fetch_data(self, ticker, period="1d", interval="1m"):
         """Fetch recent real‑time data for a ticker using the shared helper."""
         return _download_data(ticker, period=period, interval=interval)
 
+    def fetch_many(self, tickers=None, period="1d", interval="1m", since=None, lookback=timedelta(0)):
+        """Fetch recent data for many tickers, `batch_size` symbols per request.
+        Yields `(ticker, DataFrame)` pairs as each batch completes so callers can
+        store one batch while the next is still being requested.
+        `since` optionally maps tickers to their last stored bar; a batch whose
+        tickers all have a recent mark is requested from the oldest mark
+        instead of the full `period`, reaching `lookback` further back.
+        """
+        tickers = self.tickers if tickers is None else [t.strip() for t in tickers]
+        for i in range(0, len(tickers), self.batch_size):
+            batch = tickers[i:i + self.batch_size]
+            start = window_start(since, batch, lookback=lookback) if since else None
+            if start is not None:
+                frames = _download_many(batch, start=start, interval=interval)
+            else:
+                frames = _download_many(batch, period=period, interval=interval)
+            for ticker in batch:
+                if ticker in frames:
+                    yield ticker, frames[ticker]
+
 # ---------------------------------------------------------------------------
 # Historical data fetch & write to InfluxDB
 # ---------------------------------------------------------------------------
-from influxdb_client import InfluxDBClient, Point, WritePrecision
-from config import config
+from src.storage import create_influx_storage, store_timed
 
-_historical_fetch_lock = threading.Lock()
-_historical_fetch_in_progress = set()
+def plan_historical_chunks(years: int = 5, chunk_years: int = 1, end_dt: datetime = None):
+    """Split a backfill into download chunks: `chunk_years`‑year ranges of daily
+    bars followed by the last 7 days of 1-minute bars (yfinance max for 1m is 7 days).
+    Each chunk is a dict of `_download_data` keyword arguments plus a `label`.
+    """
+    end_dt = end_dt or datetime.utcnow()
+    chunk_start = end_dt - timedelta(days=years * 365)
+    chunks = []
+    while chunk_start < end_dt:
+        chunk_end = min(chunk_start + timedelta(days=chunk_years * 365), end_dt)
+        start_str = chunk_start.strftime("%Y-%m-%d")
+        end_str = chunk_end.strftime("%Y-%m-%d")
+        chunks.append({"label": f"1d {start_str}..{end_str}", "start": start_str, "end": end_str, "interval": "1d"})
+        chunk_start = chunk_end
+    chunks.append({"label": "1m 7d", "period": "7d", "interval": "1m"})
+    return chunks
 
-def fetch_and_write_historical(symbol: str, years: int = 5, chunk_years: int = 1):
+def plan_missing_chunks(symbol: str, storage, coverage, years: int = 5, chunk_years: int = 1, end_dt: datetime = None):
+    """Like `plan_historical_chunks`, but only for the date ranges `coverage`
+    reports as missing from `storage`. Long gaps are still split into
+    `chunk_years`‑year requests; recent 1m gaps become one request.
+    """
+    end_date = (end_dt or datetime.utcnow()).date() + timedelta(days=1)
+    chunks = []
+    for gap_start, gap_end in coverage.missing(storage, symbol, end_date - timedelta(days=years * 365), end_date, "1d"):
+        while gap_start < gap_end:
+            piece_end = min(gap_start + timedelta(days=chunk_years * 365), gap_end)
+            start_str = gap_start.strftime("%Y-%m-%d")
+            end_str = piece_end.strftime("%Y-%m-%d")
+            chunks.append({"label": f"1d {start_str}..{end_str}", "start": start_str, "end": end_str, "interval": "1d"})
+            gap_start = piece_end
+
+    recent_start = end_date - timedelta(days=7)
+    gaps_1m = coverage.missing(storage, symbol, recent_start, end_date, "1m")
+    if gaps_1m and gaps_1m[0][0] <= recent_start + timedelta(days=1):
+        chunks.append({"label": "1m 7d", "period": "7d", "interval": "1m"})
+    elif gaps_1m:
+        start_str = gaps_1m[0][0].strftime("%Y-%m-%d")
+        end_str = gaps_1m[-1][1].strftime("%Y-%m-%d")
+        chunks.append({"label": f"1m {start_str}..{end_str}", "start": start_str, "end": end_str, "interval": "1m"})
+    return chunks
+
+def chunk_dates(chunk: dict):
+    """The [start, end) dates a chunk covers, for coverage bookkeeping."""
+    if chunk.get("period"):
+        end = datetime.utcnow().date() + timedelta(days=1)
+        return end - timedelta(days=int(chunk["period"].rstrip("d"))), end
+    return datetime.strptime(chunk["start"], "%Y-%m-%d").date(), datetime.strptime(chunk["end"], "%Y-%m-%d").date()
+
+def fetch_historical_chunk(symbol: str, chunk: dict):
+    """Download one chunk produced by `plan_historical_chunks` / `plan_missing_chunks`."""
+    print(f"[{datetime.now()}] Fetching historical chunk for {symbol}: {chunk['label']}")
+    kwargs = {k: v for k, v in chunk.items() if k != "label"}
+    return _download_data(symbol, priority="backfill", **kwargs)
+
+def store_historical_chunk(storage, symbol, interval, df):
+    """Write a downloaded chunk: 1m bars to stock_price, daily bars only to the 1d
+    rollup measurement. Stamped 00:00 UTC, a daily bar in stock_price falls inside
+    the trading day of Asian exchanges and would read as a 1m bar there.
+
+    Returns True only once the chunk is persisted, as coverage is recorded on
+    the strength of it: a batched write is flushed, and fails if any batch was
+    dropped meanwhile (a concurrent chunk's drop fails this one too, which
+    just means it is fetched again)."""
+    dropped = getattr(storage, "dropped_batches", 0)
+    if not store_timed(storage, symbol, df, "1d" if interval == "1d" else None):
+        return False
+    if not storage.flush(config.BACKFILL_FLUSH_TIMEOUT):
+        print(f"[{datetime.now()}] Timed out waiting for {symbol} {interval} chunk to reach storage")
+        return False
+    return getattr(storage, "dropped_batches", 0) == dropped
+
+def fetch_and_write_historical(symbol: str, years: int = 5, chunk_years: int = 1, storage=None, coverage=None):
     """Fetch up to `years` years of daily OHLCV data for `symbol` and write to InfluxDB.
     Data is fetched in `chunk_years`‑year batches to avoid long requests and timeouts.
-    If a fetch for the same `symbol` is already in progress, the call is ignored.
+    With a `coverage` index only the ranges missing from storage are fetched.
+    Chunks run one after another; `BackfillScheduler` runs them concurrently and
+    de-duplicates requests, so API-triggered backfills go through it instead.
     """
-    # Guard against concurrent fetches for the same symbol
-    with _historical_fetch_lock:
-        if symbol in _historical_fetch_in_progress:
-            print(f"[{datetime.now()}] Historical fetch for {symbol} already in progress – skipping.")
-            return
-        _historical_fetch_in_progress.add(symbol)
+    own_storage = storage is None
+    if own_storage:
+        storage = create_influx_storage(config, write_mode="sync", spool=False)
     try:
-        end_dt = datetime.utcnow()
-        start_dt = end_dt - timedelta(days=years * 365)
-        chunk_start = start_dt
-        while chunk_start < end_dt:
-            chunk_end = min(chunk_start + timedelta(days=chunk_years * 365), end_dt)
-            start_str = chunk_start.strftime("%Y-%m-%d")
-            end_str = chunk_end.strftime("%Y-%m-%d")
-            print(f"[{datetime.now()}] Fetching historical chunk for {symbol} from {start_str} to {end_str}")
-            df = _download_data(symbol, start=start_str, end=end_str, interval="1d")
-            if df is None or df.empty:
-                # No data for this chunk – move to next
-                chunk_start = chunk_end
+        if coverage is not None:
+            chunks = plan_missing_chunks(symbol, storage, coverage, years, chunk_years)
+        else:
+            chunks = plan_historical_chunks(years, chunk_years)
+        for chunk in chunks:
+            df = fetch_historical_chunk(symbol, chunk)
+            if df is None:
+                # Download failed – move to next, it stays missing
                 continue
-            # Write chunk to InfluxDB
-            client = InfluxDBClient(url=config.INFLUXDB_URL, token=config.INFLUXDB_TOKEN, org=config.INFLUXDB_ORG)
-            write_api = client.write_api()
-            points = []
-            # Fill NaN volumes before iterating
-            if 'Volume' in df.columns:
-                df['Volume'] = df['Volume'].fillna(0)
-                
-            for ts, row in df.iterrows():
-                # skip rows where required price data is NaN
-                if pd.isna(row['Close']):
-                    continue
-                point = (
-                    Point("stock_price")
-                    .tag("ticker", symbol)
-                    .field("open", float(row["Open"]))
-                    .field("high", float(row["High"]))
-                    .field("low", float(row["Low"]))
-                    .field("close", float(row["Close"]))
-                    .field("volume", int(row["Volume"]))
-                    .time(ts, WritePrecision.NS)
-                )
-                points.append(point)
-            if points:
-                write_api.write(bucket=config.INFLUXDB_BUCKET, record=points)
-                print(f"[{datetime.now()}] Written {len(points)} points for {symbol} ({start_str} to {end_str})")
-            client.close()
-            chunk_start = chunk_end
-            
-        # Also fetch the last 7 days of 1-minute interval data (yfinance max for 1m is 7 days)
-        print(f"[{datetime.now()}] Fetching recent 7 days of 1-minute data for {symbol}")
-        df_1m = _download_data(symbol, period="7d", interval="1m")
-        if df_1m is not None and not df_1m.empty:
-            client = InfluxDBClient(url=config.INFLUXDB_URL, token=config.INFLUXDB_TOKEN, org=config.INFLUXDB_ORG)
-            write_api = client.write_api()
-            points_1m = []
-            if 'Volume' in df_1m.columns:
-                df_1m['Volume'] = df_1m['Volume'].fillna(0)
-                
-            for ts, row in df_1m.iterrows():
-                if pd.isna(row['Close']):
-                    continue
-                point = (
-                    Point("stock_price")
-                    .tag("ticker", symbol)
-                    .field("open", float(row["Open"]))
-                    .field("high", float(row["High"]))
-                    .field("low", float(row["Low"]))
-                    .field("close", float(row["Close"]))
-                    .field("volume", int(row["Volume"]))
-                    .time(ts, WritePrecision.NS)
-                )
-                points_1m.append(point)
-            if points_1m:
-                write_api.write(bucket=config.INFLUXDB_BUCKET, record=points_1m)
-                print(f"[{datetime.now()}] Written {len(points_1m)} 1-minute points for {symbol}")
-            client.close()
-
+            # An empty chunk (nothing traded yet) is as covered as a stored one
+            if (df.empty or store_historical_chunk(storage, symbol, chunk["interval"], df)) and coverage is not None:
+                coverage.record_fetched(symbol, chunk["interval"], *chunk_dates(chunk))
     except Exception as e:
         print(f"Error in historical fetch for {symbol}: {e}")
     finally:
-        with _historical_fetch_lock:
-            _historical_fetch_in_progress.discard(symbol)
+        if own_storage:
+            storage.close()
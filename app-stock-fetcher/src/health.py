@@ -0,0 +1,128 @@
+import json
+import os
+import time
+from datetime import datetime
+
+from src.metrics import Gauge
+
+STARTUP_SECONDS = Gauge("stock_startup_seconds", "Cold-start timings by phase (imports, storage init, first cycle)")
+
+
+class HealthState:
+    """What the fetch pipeline reports through /healthz and /readyz.
+
+    The loop calls `heartbeat()` as it goes and `cycle_finished()` after
+    each cycle; `storage_ready()` once backends are initialized. Liveness is
+    measured from the last heartbeat or the end of the sleep announced with
+    it, so a quiet night with markets closed is not mistaken for a hang. `snapshot()`
+    is a plain dict so that, with `publish_path`, the pipeline process can
+    write it for the API process to read (see `load`).
+    """
+
+    def __init__(self, publish_path=None, publish_interval=5.0):
+        self.publish_path = publish_path
+        self.publish_interval = publish_interval
+        self.timings = {}
+        self.storage = "initializing"  # 'initializing', 'ready' or 'failed'
+        self.backends = []
+        self.fetcher = "starting"  # 'starting', 'idle', 'fetching' or 'failing'
+        self.last_heartbeat = None
+        self.idle_until = None  # end of a scheduled sleep, which doesn't count as stalling
+        self.last_cycle = None
+        self.last_error = None
+        self.cycles = 0
+        self._published_at = 0.0
+
+    def record_timing(self, phase, seconds):
+        self.timings[phase] = round(seconds, 3)
+        STARTUP_SECONDS.set(seconds, phase=phase)
+        print(f"[{datetime.now()}] Startup: {phase} took {seconds:.2f}s")
+        self.publish(force=True)
+
+    def storage_ready(self, backends):
+        self.backends = list(backends)
+        self.storage = "ready" if self.backends else "failed"
+        self.publish(force=True)
+
+    def heartbeat(self, state=None, sleep=0.0):
+        """The loop is making progress; `sleep` is how long it is about to wait on purpose."""
+        self.last_heartbeat = time.time()
+        self.idle_until = self.last_heartbeat + sleep
+        if state is not None:
+            self.fetcher = state
+        self.publish(force=sleep > 0)
+
+    def cycle_finished(self, error=None):
+        self.cycles += 1
+        self.last_cycle = time.time()
+        self.last_error = None if error is None else str(error)
+        self.heartbeat("failing" if error is not None else "idle")
+
+    def snapshot(self):
+        return {
+            "timings": dict(self.timings),
+            "storage": self.storage,
+            "backends": {
+                type(backend).__name__: {
+                    "available": backend.is_available(),
+                    # An unreachable InfluxDB with a spool still accepts writes
+                    "accepting_writes": backend.is_available() or getattr(backend, "spool", None) is not None,
+                }
+                for backend in self.backends
+            },
+            "fetcher": self.fetcher,
+            "cycles": self.cycles,
+            "last_heartbeat": self.last_heartbeat,
+            "idle_until": self.idle_until,
+            "last_cycle": self.last_cycle,
+            "last_error": self.last_error,
+        }
+
+    def publish(self, force=False):
+        if self.publish_path is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._published_at < self.publish_interval:
+            return
+        self._published_at = now
+        try:
+            os.makedirs(os.path.dirname(self.publish_path) or ".", exist_ok=True)
+            tmp_path = f"{self.publish_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, self.publish_path)
+        except OSError as e:
+            print(f"Health publish error: {e}")
+
+    @staticmethod
+    def load(path):
+        """A snapshot published by another process, or None if there is none yet."""
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+def liveness(snapshot, stale_after):
+    """(ok, reason). Fails once a started loop hasn't made progress for `stale_after`
+    seconds, e.g. a hung download or storage call; a loop that hasn't started passes."""
+    if snapshot is None or snapshot["last_heartbeat"] is None:
+        return True, "starting"
+    age = time.time() - max(snapshot["last_heartbeat"], snapshot["idle_until"] or 0)
+    if age > stale_after:
+        return False, f"fetch loop stalled: no progress for {age:.0f}s (limit {stale_after}s)"
+    return True, "ok"
+
+
+def readiness(snapshot):
+    """(ok, reason). Ready once storage is initialized, accepts writes, and the loop has started."""
+    if snapshot is None:
+        return False, "pipeline not started"
+    if snapshot["storage"] == "initializing":
+        return False, "storage initializing"
+    if not any(b["accepting_writes"] for b in snapshot["backends"].values()):
+        return False, "no storage backend accepting writes"
+    if snapshot["fetcher"] == "starting":
+        return False, "fetch loop not started"
+    return True, "ok"
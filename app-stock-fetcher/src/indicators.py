@@ -0,0 +1,328 @@
+import math
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from src.market_calendar import exchange_for
+
+
+class _Window:
+    """Last `n` values with their running sum and sum of squares.
+    `push` and `undo` (of the latest push) are O(1); the sums are recomputed
+    from the window every `n` pushes so rounding error can't accumulate."""
+
+    def __init__(self, n, values=()):
+        self.n = n
+        self.values = deque(values, maxlen=n)
+        self._resum()
+        self._evicted = None
+
+    def _resum(self):
+        self.sum = math.fsum(self.values)
+        self.sumsq = math.fsum(v * v for v in self.values)
+        self._pushes = 0
+
+    def push(self, x):
+        self._evicted = self.values[0] if len(self.values) == self.n else None
+        self.values.append(x)
+        self._pushes += 1
+        if self._pushes >= self.n:
+            self._resum()
+            return
+        self.sum += x
+        self.sumsq += x * x
+        if self._evicted is not None:
+            self.sum -= self._evicted
+            self.sumsq -= self._evicted * self._evicted
+
+    def undo(self):
+        x = self.values.pop()
+        self.sum -= x
+        self.sumsq -= x * x
+        if self._evicted is not None:
+            self.values.appendleft(self._evicted)
+            self.sum += self._evicted
+            self.sumsq += self._evicted * self._evicted
+
+    @property
+    def full(self):
+        return len(self.values) == self.n
+
+
+class SMA:
+    def __init__(self, n):
+        self.n = n
+        self.name = f"sma_{n}"
+
+    def rebuild(self, bars):
+        closes = bars["Close"]
+        self.window = _Window(self.n, closes.iloc[-self.n:])
+        return closes.rolling(self.n).mean()
+
+    def update(self, ts, high, low, close, volume):
+        self.window.push(close)
+        return self.window.sum / self.n if self.window.full else math.nan
+
+    def undo(self):
+        self.window.undo()
+
+
+class EMA:
+    def __init__(self, n):
+        self.n = n
+        self.name = f"ema_{n}"
+        self.alpha = 2.0 / (n + 1)
+
+    def rebuild(self, bars):
+        ema = bars["Close"].ewm(alpha=self.alpha, adjust=False).mean()
+        self.value = ema.iloc[-1] if len(ema) else None
+        self.seen = len(ema)
+        ema.iloc[:self.n - 1] = np.nan
+        return ema
+
+    def update(self, ts, high, low, close, volume):
+        self._prev = (self.value, self.seen)
+        self.value = close if self.value is None else self.value + self.alpha * (close - self.value)
+        self.seen += 1
+        return self.value if self.seen >= self.n else math.nan
+
+    def undo(self):
+        self.value, self.seen = self._prev
+
+
+class RSI:
+    """Wilder's RSI: gains and losses smoothed with alpha = 1/n."""
+
+    def __init__(self, n):
+        self.n = n
+        self.name = f"rsi_{n}"
+
+    @staticmethod
+    def _rsi(gain, loss):
+        if loss == 0:
+            return 100.0 if gain > 0 else 50.0
+        return 100.0 - 100.0 / (1.0 + gain / loss)
+
+    def rebuild(self, bars):
+        closes = bars["Close"]
+        change = closes.diff()
+        gain = change.clip(lower=0).ewm(alpha=1.0 / self.n, adjust=False).mean()
+        loss = (-change.clip(upper=0)).ewm(alpha=1.0 / self.n, adjust=False).mean()
+        self.prev_close = closes.iloc[-1] if len(closes) else None
+        self.gain = gain.iloc[-1] if len(closes) > 1 else None
+        self.loss = loss.iloc[-1] if len(closes) > 1 else None
+        self.changes = max(0, len(closes) - 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = 100.0 - 100.0 / (1.0 + gain / loss)
+        rsi = rsi.where(loss != 0, np.where(gain > 0, 100.0, 50.0))
+        rsi.iloc[:self.n] = np.nan
+        return rsi
+
+    def update(self, ts, high, low, close, volume):
+        self._prev = (self.prev_close, self.gain, self.loss, self.changes)
+        if self.prev_close is None:
+            self.prev_close = close
+            return math.nan
+        change = close - self.prev_close
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        if self.gain is None:
+            self.gain, self.loss = gain, loss
+        else:
+            self.gain += (gain - self.gain) / self.n
+            self.loss += (loss - self.loss) / self.n
+        self.prev_close = close
+        self.changes += 1
+        return self._rsi(self.gain, self.loss) if self.changes >= self.n else math.nan
+
+    def undo(self):
+        self.prev_close, self.gain, self.loss, self.changes = self._prev
+
+
+class VWAP:
+    """Volume-weighted typical price, reset at the start of each local trading day."""
+
+    name = "vwap"
+
+    def __init__(self, tz):
+        self.tz = tz
+
+    def rebuild(self, bars):
+        typical = (bars["High"] + bars["Low"] + bars["Close"]) / 3
+        volume = bars["Volume"].fillna(0)
+        day = bars.index.tz_convert(self.tz).date
+        cum_pv = (typical * volume).groupby(day).cumsum()
+        cum_v = volume.groupby(day).cumsum()
+        self.day = day[-1] if len(day) else None
+        self.cum_pv = cum_pv.iloc[-1] if len(day) else 0.0
+        self.cum_v = cum_v.iloc[-1] if len(day) else 0.0
+        return (cum_pv / cum_v.replace(0, np.nan)).astype("float64")
+
+    def update(self, ts, high, low, close, volume):
+        self._prev = (self.day, self.cum_pv, self.cum_v)
+        day = ts.tz_convert(self.tz).date()
+        if day != self.day:
+            self.day, self.cum_pv, self.cum_v = day, 0.0, 0.0
+        volume = 0.0 if math.isnan(volume) else volume
+        self.cum_pv += (high + low + close) / 3 * volume
+        self.cum_v += volume
+        return self.cum_pv / self.cum_v if self.cum_v else math.nan
+
+    def undo(self):
+        self.day, self.cum_pv, self.cum_v = self._prev
+
+
+class Volatility:
+    """Sample standard deviation of the last `n` one-bar log returns."""
+
+    def __init__(self, n):
+        self.n = n
+        self.name = f"volatility_{n}"
+
+    def rebuild(self, bars):
+        returns = np.log(bars["Close"]).diff()
+        self.prev_close = bars["Close"].iloc[-1] if len(bars) else None
+        self.window = _Window(self.n, returns.dropna().iloc[-self.n:])
+        return returns.rolling(self.n).std()
+
+    def update(self, ts, high, low, close, volume):
+        self._prev_close = self.prev_close
+        self._pushed = False
+        if self.prev_close is None or self.prev_close <= 0 or close <= 0:
+            self.prev_close = close
+            return math.nan
+        self.window.push(math.log(close / self.prev_close))
+        self._pushed = True
+        self.prev_close = close
+        if not self.window.full:
+            return math.nan
+        w = self.window
+        return math.sqrt(max(0.0, (w.sumsq - w.sum * w.sum / self.n) / (self.n - 1)))
+
+    def undo(self):
+        self.prev_close = self._prev_close
+        if self._pushed:
+            self.window.undo()
+
+
+def parse_indicators(specs, tz="UTC"):
+    """['sma_20', 'ema_20', 'rsi_14', 'vwap', 'volatility_20'] -> indicator objects."""
+    makers = {"sma": SMA, "ema": EMA, "rsi": RSI, "volatility": Volatility}
+    result = []
+    for spec in specs:
+        name, _, window = spec.strip().lower().partition("_")
+        if name == "vwap" and not window:
+            result.append(VWAP(tz))
+        elif name in makers and window.isdigit() and int(window) > 1:
+            result.append(makers[name](int(window)))
+        else:
+            raise ValueError(f"Unsupported indicator: {spec}")
+    return result
+
+
+class TickerIndicators:
+    """Indicator state for one ticker, advanced one 1m bar at a time.
+
+    A bar with the same timestamp as the last one (yfinance re-sends the
+    still-forming bar) first undoes the previous update, so it replaces
+    rather than double counts it. Bars older than that are ignored.
+    """
+
+    def __init__(self, specs, tz):
+        self.indicators = parse_indicators(specs, tz)
+        self.last_ts = None
+
+    def rebuild(self, bars):
+        """Reset the state from `bars` in one vectorized pass; returns their indicator values."""
+        values = pd.DataFrame({ind.name: ind.rebuild(bars) for ind in self.indicators}, index=bars.index)
+        self.last_ts = None
+        if len(bars):
+            # Rebuild up to the last bar and apply that one as an update, so it can
+            # still be undone when yfinance re-sends it
+            for ind in self.indicators:
+                ind.rebuild(bars.iloc[:-1])
+            self.update(bars.iloc[-1:])
+        return values
+
+    def update(self, bars):
+        """Apply bars in time order; returns the values of the bars that produced any."""
+        rows, index = [], []
+        columns = [bars[col].to_numpy(dtype="float64") for col in ("High", "Low", "Close", "Volume")]
+        for ts, high, low, close, volume in zip(bars.index, *columns):
+            if self.last_ts is not None and ts < self.last_ts:
+                continue
+            if ts == self.last_ts:
+                for ind in self.indicators:
+                    ind.undo()
+            row = [ind.update(ts, high, low, close, volume) for ind in self.indicators]
+            self.last_ts = ts
+            if any(v == v for v in row):  # skip rows that are all NaN (warming up)
+                rows.append(row)
+                index.append(ts)
+        return pd.DataFrame(rows, index=pd.DatetimeIndex(index), columns=[ind.name for ind in self.indicators])
+
+
+class IndicatorEngine:
+    """Per-ticker incremental indicators over the live 1m bars.
+
+    `loader(ticker, start)` may return stored 1m bars (including backfilled
+    ones) since `start`. The first time a ticker is seen, its state is built
+    in one vectorized pass over the last `lookback_days` of stored bars plus the
+    new ones, so indicators continue across restarts; after that every bar
+    is an O(1) update.
+    """
+
+    def __init__(self, specs, loader=None, lookback_days=3):
+        self.specs = list(specs)
+        parse_indicators(self.specs)  # fail fast on a bad INDICATORS setting
+        self.loader = loader
+        self.lookback = pd.Timedelta(days=lookback_days)
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def _history(self, ticker, before):
+        if self.loader is None:
+            return None
+        try:
+            stored = self.loader(ticker, before - self.lookback)
+            if stored is None or stored.empty:
+                return None
+            stored = stored[["Open", "High", "Low", "Close", "Volume"]].dropna(subset=["Close"])
+            stored.index = pd.DatetimeIndex(stored.index).tz_convert("UTC")
+        except Exception as e:
+            print(f"Indicator seed error for {ticker}: {e}")
+            return None
+        stored = stored[~stored.index.duplicated(keep="last")].sort_index()
+        return stored[stored.index < before]
+
+    def update(self, ticker, data):
+        """Advance `ticker`'s state with new 1m bars; returns their indicator values."""
+        if not self.specs:
+            return None
+        # Called for every ticker every cycle, so avoid pandas work when the input is already clean
+        valid = ~np.isnan(data[["Open", "High", "Low", "Close"]].to_numpy(dtype="float64")).any(axis=1)
+        if not valid.any():
+            return None
+        if not valid.all():
+            data = data[valid]
+        if "Volume" not in data.columns:
+            data = data.assign(Volume=0.0)
+        data = data.tz_localize("UTC") if data.index.tz is None else data.tz_convert("UTC")
+        if not (data.index.is_monotonic_increasing and data.index.is_unique):
+            data = data[~data.index.duplicated(keep="last")].sort_index()
+        with self._lock:
+            state = self._state.get(ticker)
+        if state is None:
+            state = TickerIndicators(self.specs, exchange_for(ticker).tz)
+            history = self._history(ticker, data.index.min())
+            bars = data if history is None else pd.concat([history, data])
+            values = state.rebuild(bars[["Open", "High", "Low", "Close", "Volume"]].astype("float64"))
+            with self._lock:
+                self._state[ticker] = state
+            return values.loc[data.index].dropna(how="all")
+        return state.update(data)
+
+    def forget(self, ticker):
+        with self._lock:
+            self._state.pop(ticker, None)
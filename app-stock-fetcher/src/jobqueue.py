@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import time
+
+
+def _write_json(path, data):
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+class JobQueue:
+    """Backfill requests passed between processes through a directory.
+
+    Each pending request is one `<symbol>.json` file, so a symbol is queued
+    at most once. `put(replace=False)` leaves an already pending request
+    alone; `replace=True` overwrites it (e.g. with an explicit `years`).
+    A worker claims a request by renaming it, which only one process can
+    win. The worker also publishes its job status to `status.json`.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, symbol):
+        return os.path.join(self.directory, f"{symbol.replace(os.sep, '_')}.json")
+
+    def put(self, symbol, years=5, replace=True):
+        path = self._path(symbol)
+        if not replace and os.path.exists(path):
+            return False
+        _write_json(path, {"symbol": symbol, "years": years, "queued_at": time.time()})
+        return True
+
+    def pending(self):
+        return sorted(
+            (os.path.join(self.directory, name) for name in os.listdir(self.directory)
+             if name.endswith(".json") and name != "status.json" and not name.startswith(".")),
+            key=os.path.getmtime,
+        )
+
+    def claim(self):
+        """Take the oldest pending request, or return None."""
+        for path in self.pending():
+            claimed = f"{path}.claimed-{os.getpid()}"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue  # another worker got it, or it is being replaced
+            try:
+                with open(claimed) as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Discarding unreadable backfill request {path}: {e}")
+            finally:
+                os.unlink(claimed)
+        return None
+
+    def write_status(self, status):
+        _write_json(os.path.join(self.directory, "status.json"), status)
+
+    def read_status(self):
+        try:
+            with open(os.path.join(self.directory, "status.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
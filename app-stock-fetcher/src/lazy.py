@@ -0,0 +1,33 @@
+import threading
+
+
+class Lazy:
+    """Stands in for an object that is slow to import or build.
+
+    `factory()` runs once, on the first attribute access (thread-safe), and
+    every attribute is then read from its result. Lets module-level objects
+    such as `backfill_scheduler` keep their names while pandas, yfinance and
+    friends are only imported by the process (and at the moment) that needs
+    them.
+    """
+
+    __slots__ = ("_factory", "_value", "_lock")
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+        return self._value
+
+    @property
+    def loaded(self):
+        return self._value is not None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
@@ -0,0 +1,191 @@
+from datetime import datetime, time as dtime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+
+class Exchange:
+    """Regular trading sessions of one exchange in its local time zone.
+    Weekends are closed; exchange holidays are not modelled."""
+
+    def __init__(self, name, tz, sessions, weekdays=(0, 1, 2, 3, 4)):
+        self.name = name
+        self.tz = ZoneInfo(tz)
+        self.sessions = [(dtime.fromisoformat(a), dtime.fromisoformat(b)) for a, b in sessions]
+        self.weekdays = set(weekdays)
+
+    def __repr__(self):
+        return f"Exchange({self.name})"
+
+    def _session_bounds(self, day):
+        """[(open, close)] as aware datetimes for a local date, empty on non-trading days."""
+        if day.weekday() not in self.weekdays:
+            return []
+        return [
+            (datetime.combine(day, a, self.tz), datetime.combine(day, b, self.tz))
+            for a, b in self.sessions
+        ]
+
+    def is_open(self, now):
+        local = now.astimezone(self.tz)
+        return any(a <= local < b for a, b in self._session_bounds(local.date()))
+
+    def last_close(self, now):
+        """The most recent session close at or before `now`."""
+        local = now.astimezone(self.tz)
+        for offset in range(0, 8):
+            day = local.date() - timedelta(days=offset)
+            closes = [b for _, b in self._session_bounds(day) if b <= local]
+            if closes:
+                return max(closes)
+        return None
+
+    def next_open(self, now):
+        """The next session open after `now`."""
+        local = now.astimezone(self.tz)
+        for offset in range(0, 8):
+            day = local.date() + timedelta(days=offset)
+            opens = [a for a, _ in self._session_bounds(day) if a > local]
+            if opens:
+                return min(opens)
+        return None
+
+
+class AlwaysOpen(Exchange):
+    """Crypto and FX quotes trade around the clock."""
+
+    def __init__(self, name):
+        super().__init__(name, "UTC", [])
+
+    def is_open(self, now):
+        return True
+
+    def last_close(self, now):
+        return None
+
+    def next_open(self, now):
+        return now
+
+
+EXCHANGES = {
+    "KRX": Exchange("KRX", "Asia/Seoul", [("09:00", "15:30")]),
+    "US": Exchange("US", "America/New_York", [("09:30", "16:00")]),
+    "TSE": Exchange("TSE", "Asia/Tokyo", [("09:00", "11:30"), ("12:30", "15:30")]),
+    "HKEX": Exchange("HKEX", "Asia/Hong_Kong", [("09:30", "12:00"), ("13:00", "16:00")]),
+    "SSE": Exchange("SSE", "Asia/Shanghai", [("09:30", "11:30"), ("13:00", "15:00")]),
+    "LSE": Exchange("LSE", "Europe/London", [("08:00", "16:30")]),
+    "XETRA": Exchange("XETRA", "Europe/Berlin", [("09:00", "17:30")]),
+    "TSX": Exchange("TSX", "America/Toronto", [("09:30", "16:00")]),
+    "24x7": AlwaysOpen("24x7"),
+}
+
+# Yahoo symbol suffix -> exchange; symbols without a known suffix are US listings
+SUFFIXES = {
+    ".KS": "KRX",
+    ".KQ": "KRX",
+    ".T": "TSE",
+    ".HK": "HKEX",
+    ".SS": "SSE",
+    ".SZ": "SSE",
+    ".L": "LSE",
+    ".DE": "XETRA",
+    ".F": "XETRA",
+    ".TO": "TSX",
+    ".V": "TSX",
+}
+
+
+def exchange_for(symbol):
+    symbol = symbol.upper()
+    if symbol.endswith("=X") or symbol.endswith("-USD"):
+        return EXCHANGES["24x7"]
+    if "." in symbol:
+        suffix = symbol[symbol.rindex("."):]
+        if suffix in SUFFIXES:
+            return EXCHANGES[SUFFIXES[suffix]]
+    return EXCHANGES["US"]
+
+
+class FetchScheduler:
+    """Decides which tickers are due for a fetch, exchange by exchange.
+
+    Tickers of an open market are due every `interval` seconds. Once a
+    market closes, its tickers get one final fetch `post_close_delay`
+    seconds after the close to capture the last bars; after that they are
+    only polled every `closed_interval` seconds (never, if 0). A ticker
+    that has never been fetched is due immediately.
+    """
+
+    def __init__(self, interval, closed_interval=0, post_close_delay=120):
+        self.interval = interval
+        self.closed_interval = closed_interval
+        self.post_close_delay = post_close_delay
+        self._next_due = {}
+        self._final_fetched = {}
+        self._was_open = {}
+
+    def due(self, tickers, now=None):
+        """Return the tickers to fetch now and schedule their next fetch."""
+        now = now or datetime.now(timezone.utc)
+        groups = {}
+        for ticker in tickers:
+            groups.setdefault(exchange_for(ticker), []).append(ticker)
+
+        result = []
+        for exchange, members in groups.items():
+            is_open = exchange.is_open(now)
+            if is_open and not self._was_open.get(exchange.name):
+                # Market just opened: drop the slow closed-market schedule
+                for t in members:
+                    self._next_due.pop(t, None)
+            self._was_open[exchange.name] = is_open
+            if is_open:
+                result.extend(t for t in members if self._take(t, now, self.interval))
+                continue
+
+            last_close = exchange.last_close(now)
+            final_at = last_close + timedelta(seconds=self.post_close_delay) if last_close else None
+            if final_at and now >= final_at and self._final_fetched.get(exchange.name) != last_close:
+                self._final_fetched[exchange.name] = last_close
+                result.extend(members)
+                for t in members:
+                    self._next_due[t] = now + timedelta(seconds=self.closed_interval or self.interval)
+                continue
+
+            for t in members:
+                if t not in self._next_due:
+                    result.append(t)
+                    self._next_due[t] = now + timedelta(seconds=self.closed_interval or self.interval)
+                elif self.closed_interval:
+                    if self._take(t, now, self.closed_interval):
+                        result.append(t)
+        return result
+
+    def _take(self, ticker, now, interval):
+        due_at = self._next_due.get(ticker)
+        if due_at is not None and now < due_at:
+            return False
+        self._next_due[ticker] = now + timedelta(seconds=interval)
+        return True
+
+    def seconds_until_next(self, tickers, now=None, cap=None):
+        """Seconds until some ticker becomes due (market open, post-close fetch or poll), at most `cap`."""
+        now = now or datetime.now(timezone.utc)
+        candidates = [cap] if cap is not None else []
+        for ticker in tickers:
+            exchange = exchange_for(ticker)
+            if exchange.is_open(now):
+                due_at = self._next_due.get(ticker, now) if self._was_open.get(exchange.name) else now
+            else:
+                last_close = exchange.last_close(now)
+                final_at = last_close + timedelta(seconds=self.post_close_delay) if last_close else None
+                if final_at and self._final_fetched.get(exchange.name) != last_close:
+                    due_at = final_at
+                elif self.closed_interval:
+                    due_at = self._next_due.get(ticker, now)
+                else:
+                    due_at = exchange.next_open(now)
+            if due_at is not None:
+                candidates.append(max(0.0, (due_at - now).total_seconds()))
+        return min(candidates) if candidates else self.interval
+
+    def forget(self, ticker):
+        self._next_due.pop(ticker, None)
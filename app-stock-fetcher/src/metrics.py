@@ -0,0 +1,244 @@
+"""Minimal Prometheus-style metrics: counters, gauges and histograms.
+
+Metrics register themselves in a module-level registry and `render()`
+produces the text exposition format served by GET /metrics. Labels are
+passed as keyword arguments, e.g. `STORE_SECONDS.observe(0.4, backend="CSVStorage")`.
+`timed(histogram, **labels)` works as a context manager or decorator.
+"""
+import bisect
+from abc import ABC, abstractmethod
+import functools
+import json
+import os
+import threading
+import time
+
+_registry = []
+_collectors = []
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=None):
+    items = list(key) + (extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_value(v)}"' for k, v in items) + "}"
+
+
+class _Metric(ABC):
+    type = None
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    @abstractmethod
+    def samples(self, const=()):
+        """Sample lines, with `const` ((name, value) pairs) added to every label set."""
+        pass
+
+    def render(self, extra_samples=()):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            *self.samples(),
+            *extra_samples,
+        ]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation):
+        super().__init__(name, documentation)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self, const=()):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(k + const)} {v}" for k, v in values.items()]
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def __init__(self, name, documentation):
+        super().__init__(name, documentation)
+        self._values = {}
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def remove(self, **labels):
+        with self._lock:
+            self._values.pop(_label_key(labels), None)
+
+    def samples(self, const=()):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(k + const)} {float(v)}" for k, v in values.items()]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def totals(self):
+        """{label dict as string: (count, sum)}, e.g. for benchmark reports."""
+        with self._lock:
+            return {_format_labels(k) or "{}": (v[-1], v[-2]) for k, v in self._values.items()}
+
+    def samples(self, const=()):
+        with self._lock:
+            values = {k: list(v) for k, v in self._values.items()}
+        lines = []
+        for key, state in values.items():
+            key = key + const
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {state[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {state[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {state[-1]}")
+        return lines
+
+
+class timed:
+    """Observe the elapsed wall time of a block or function into `histogram`."""
+
+    __slots__ = ("histogram", "labels", "_start")
+
+    def __init__(self, histogram, **labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self._start, **self.labels)
+        return False
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.histogram.observe(time.perf_counter() - start, **self.labels)
+        return wrapper
+
+
+def register_collector(fn):
+    """Call `fn()` before every render, e.g. to copy queue depths into gauges."""
+    _collectors.append(fn)
+    return fn
+
+
+def _collect():
+    for fn in list(_collectors):
+        try:
+            fn()
+        except Exception as e:
+            print(f"Metrics collector error: {e}")
+
+
+def render(export_dir=None):
+    """Text exposition of every metric. With `export_dir`, samples exported by
+    other processes (see `start_exporter`) are merged in under their own
+    `process` label."""
+    _collect()
+    exported = {}
+    if export_dir and os.path.isdir(export_dir):
+        for name in sorted(os.listdir(export_dir)):
+            if not name.endswith(".metrics.json"):
+                continue
+            try:
+                with open(os.path.join(export_dir, name)) as f:
+                    for metric, lines in json.load(f).items():
+                        exported.setdefault(metric, []).extend(lines)
+            except (OSError, ValueError):
+                continue  # being replaced or from a crashed process
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render(exported.get(metric.name, ())))
+    return "\n".join(lines) + "\n"
+
+
+def export(path, process):
+    """Write this process's samples, labelled process=`process`, for `render(export_dir)`."""
+    _collect()
+    const = (("process", process),)
+    data = {metric.name: metric.samples(const) for metric in _registry}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def start_exporter(export_dir, process, interval=5.0):
+    """Export this process's metrics to `export_dir` every `interval` seconds."""
+    os.makedirs(export_dir, exist_ok=True)
+    path = os.path.join(export_dir, f"{process}.metrics.json")
+
+    def loop():
+        while True:
+            try:
+                export(path, process)
+            except Exception as e:
+                print(f"Metrics export error: {e}")
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name="metrics-export", daemon=True).start()
+
+
+# ---------------------------------------------------------------------------
+# Pipeline metrics
+# ---------------------------------------------------------------------------
+DOWNLOAD_SECONDS = Histogram("stock_download_seconds", "Yahoo download time per ticker; batch requests are divided by their size")
+DOWNLOAD_FAILURES = Counter("stock_download_failures_total", "Tickers whose download raised or returned no data")
+ENCODE_SECONDS = Histogram("stock_encode_seconds", "DataFrame to line protocol encode time")
+STORE_SECONDS = Histogram("stock_store_seconds", "store() time per backend")
+POINTS_WRITTEN = Counter("stock_points_written_total", "Bars accepted by a storage backend")
+BARS_SKIPPED = Counter("stock_bars_skipped_total", "Fetched bars not written because they were already stored, by reason")
+CYCLE_SECONDS = Histogram("stock_cycle_seconds", "Duration of one fetch cycle")
+CYCLE_LAG_SECONDS = Gauge("stock_cycle_lag_seconds", "How far the last cycle overran FETCH_INTERVAL (0 if it didn't)")
+BACKFILL_CHUNKS = Counter("stock_backfill_chunks_total", "Backfill chunks finished, by state")
+BACKEND_AVAILABLE = Gauge("stock_backend_available", "1 if the storage backend is available")
+QUEUE_DEPTH = Gauge("stock_queue_depth", "Items waiting in internal queues")
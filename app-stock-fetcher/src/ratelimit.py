@@ -0,0 +1,224 @@
+import fcntl
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import config
+from src.metrics import Counter, Gauge, Histogram
+
+# Lower value = served first when several callers are waiting for a token
+PRIORITIES = {"live": 0, "search": 1, "backfill": 2}
+_PRIORITY_NAMES = {rank: name for name, rank in PRIORITIES.items()}
+
+WAIT_SECONDS = Histogram(
+    "stock_yahoo_wait_seconds", "Time a Yahoo request waited for the rate limiter, by priority",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+THROTTLE_EVENTS = Counter("stock_yahoo_throttle_total", "Yahoo responses that made the rate limiter back off, by reason")
+EFFECTIVE_RATE = Gauge("stock_yahoo_rate", "Yahoo requests per second currently allowed by the rate limiter")
+WAITING = Gauge("stock_yahoo_waiting", "Yahoo requests waiting for the rate limiter, by priority")
+
+
+def is_rate_limit_error(error):
+    """True for HTTP 429 / yfinance YFRateLimitError style failures."""
+    text = f"{type(error).__name__} {error}"
+    return "RateLimit" in text or "Too Many Requests" in text or "429" in text
+
+
+class RateLimiter:
+    """Token bucket shared by every Yahoo caller in the process, with priorities.
+
+    Tokens refill at `rate` per second up to `burst`. Callers wait in a heap
+    ordered by priority class (live, search, backfill) and then arrival, so
+    a queue of backfill chunks never delays a live poll by more than one
+    token. The rate adapts to what Yahoo reports through `report()`: a 429
+    halves it and pauses all calls for a backoff that doubles up to
+    `max_backoff`, an empty response cuts it by a quarter, and each success
+    wins back a tenth of `rate` (additive increase, multiplicative decrease).
+
+    With `state_path`, the bucket lives in that file instead and every
+    process using it draws from one budget (the supervisor's api, pipeline
+    and backfill roles). It is read and rewritten under an flock for each
+    token and report. Only the front waiter of each process polls it, and a
+    process waiting with a higher priority holds a short-lived claim there
+    that keeps the others from taking tokens.
+    """
+
+    # Longest a waiter sleeps between polls of the shared state, and how long its
+    # claim outlives that; bounds how long a dead process's claim can block others
+    SHARED_POLL = 1.0
+
+    def __init__(self, rate, burst=5, max_backoff=300.0, min_rate=None, initial_backoff=5.0, state_path=None):
+        self.rate = rate
+        self.burst = max(1.0, float(burst))
+        self.max_backoff = max_backoff
+        self.min_rate = min_rate or rate / 20
+        self.initial_backoff = initial_backoff
+        self.state_path = state_path
+        # Shared state needs timestamps every process agrees on
+        self._clock = time.time if state_path else time.monotonic
+        self.current_rate = rate
+        self._tokens = self.burst
+        self._refilled_at = self._clock()
+        self._paused_until = 0.0
+        self._backoff = initial_backoff
+        self._claims = {}  # shared mode: {pid: [priority rank, expiry]} of waiting processes
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        EFFECTIVE_RATE.set(rate)
+
+    @contextmanager
+    def _shared(self):
+        """With `state_path`, load the bucket from the file, and write it back
+        on exit, while holding an flock on it. Call with `_cond` held."""
+        if self.state_path is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        with open(self.state_path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read())
+                    self._tokens = state["tokens"]
+                    self._refilled_at = state["refilled_at"]
+                    self.current_rate = state["current_rate"]
+                    self._paused_until = state["paused_until"]
+                    self._backoff = state["backoff"]
+                    self._claims = state["claims"]
+                except (ValueError, KeyError):
+                    pass  # first process to use it: start from this one's state
+                yield
+                f.seek(0)
+                f.truncate()
+                json.dump({
+                    "tokens": self._tokens,
+                    "refilled_at": self._refilled_at,
+                    "current_rate": self.current_rate,
+                    "paused_until": self._paused_until,
+                    "backoff": self._backoff,
+                    "claims": self._claims,
+                }, f)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _outranked(self, rank, now):
+        """Whether another process is waiting with a higher priority (shared mode)."""
+        me = str(os.getpid())
+        self._claims = {pid: claim for pid, claim in self._claims.items() if claim[1] > now}
+        return any(claim[0] < rank for pid, claim in self._claims.items() if pid != me)
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.current_rate)
+        self._refilled_at = now
+
+    def _set_waiting(self):
+        counts = dict.fromkeys(PRIORITIES, 0)
+        for rank, _ in self._waiters:
+            counts[_PRIORITY_NAMES[rank]] += 1
+        for name, count in counts.items():
+            WAITING.set(count, priority=name)
+
+    def acquire(self, priority="live", timeout=None):
+        """Block until a request of class `priority` may go out; False if `timeout` passed first."""
+        if self.rate <= 0:
+            return True  # limiting disabled
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        entry = (PRIORITIES[priority], next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            self._set_waiting()
+            try:
+                while True:
+                    if self._waiters[0] == entry and self._take(entry[0]):
+                        break
+                    now = time.monotonic()
+                    if deadline is not None and now >= deadline:
+                        return False
+                    wait = self._next_token_in()
+                    if deadline is not None:
+                        wait = min(wait, deadline - now)
+                    self._cond.wait(wait)
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._set_waiting()
+                # The next caller in line may be able to go now
+                self._cond.notify_all()
+        WAIT_SECONDS.observe(time.monotonic() - started, priority=priority)
+        return True
+
+    def _take(self, rank):
+        """Take a token for the front waiter if one is available; call with `_cond` held."""
+        with self._shared():
+            now = self._clock()
+            self._refill(now)
+            if self.state_path is not None:
+                if self._outranked(rank, now):
+                    return False
+                claim_expiry = now + self.SHARED_POLL * 2
+            if now >= self._paused_until and self._tokens >= 1:
+                self._tokens -= 1
+                self._claims.pop(str(os.getpid()), None)
+                return True
+            if self.state_path is not None:
+                self._claims[str(os.getpid())] = [rank, claim_expiry]
+            return False
+
+    def _next_token_in(self):
+        """Seconds until the bucket (as last seen) allows the next request."""
+        now = self._clock()
+        if now < self._paused_until:
+            wait = self._paused_until - now
+        else:
+            wait = max(0.001, (1 - self._tokens) / self.current_rate)
+        # Another process may take or return tokens meanwhile
+        return wait if self.state_path is None else min(wait, self.SHARED_POLL)
+
+    def report(self, outcome):
+        """Feed back the result of a request: 'ok', 'empty' or 'throttled' (HTTP 429)."""
+        with self._cond, self._shared():
+            self._refill(self._clock())  # tokens earned so far accrue at the old rate
+            if outcome == "ok":
+                self._backoff = self.initial_backoff
+                self.current_rate = min(self.rate, self.current_rate + self.rate / 10)
+            else:
+                THROTTLE_EVENTS.inc(reason=outcome)
+                if outcome == "throttled":
+                    self.current_rate = max(self.min_rate, self.current_rate / 2)
+                    self._paused_until = max(self._paused_until, self._clock() + self._backoff)
+                    print(f"[{datetime.now()}] Yahoo throttled us; pausing requests for {self._backoff:.0f}s "
+                          f"and slowing to {self.current_rate:.2f}/s")
+                    self._backoff = min(self._backoff * 2, self.max_backoff)
+                else:
+                    self.current_rate = max(self.min_rate, self.current_rate * 0.75)
+            EFFECTIVE_RATE.set(self.current_rate)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond, self._shared():
+            self._refill(self._clock())
+            return {
+                "rate": self.rate,
+                "current_rate": round(self.current_rate, 3),
+                "tokens": round(self._tokens, 2),
+                "paused_for": round(max(0.0, self._paused_until - self._clock()), 1),
+                "waiting": len(self._waiters),
+            }
+
+
+# Every outbound Yahoo call in this process (downloads and search) goes through this;
+# in supervisor mode the roles' processes share its budget through RUN_DIR
+yahoo_limiter = RateLimiter(
+    config.YAHOO_RATE, burst=config.YAHOO_BURST, max_backoff=config.YAHOO_MAX_BACKOFF,
+    state_path=None if config.PROCESS_ROLE == "all" else os.path.join(config.RUN_DIR, "yahoo-ratelimit.json"),
+)
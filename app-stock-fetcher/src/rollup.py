@@ -0,0 +1,115 @@
+import threading
+
+import pandas as pd
+
+# Resolution name -> pandas offset alias
+RESOLUTIONS = {"5m": "5min", "15m": "15min", "1h": "1h", "1d": "1D"}
+
+OHLCV_AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+
+
+def resample_ohlcv(data, resolution):
+    """Aggregate OHLCV bars to `resolution`, labelled by bucket start.
+    Buckets follow the index's time zone, so daily bars start at local midnight."""
+    if data.empty:
+        return data
+    columns = {col: fn for col, fn in OHLCV_AGG.items() if col in data.columns}
+    bars = data.resample(RESOLUTIONS[resolution], label="left", closed="left").agg(columns)
+    bars = bars.dropna(subset=["Close"])
+    if resolution == "1d" and bars.index.tz is not None:
+        # Match yfinance daily bars (and the backfill), which are stamped with the
+        # naive local date, so both sources land on the same point
+        bars.index = bars.index.tz_localize(None)
+    return bars
+
+
+def _bucket_start(ts, resolution):
+    if resolution == "1d":
+        return ts.normalize()
+    return ts.floor(RESOLUTIONS[resolution])
+
+
+class RollupEngine:
+    """Incrementally builds coarser OHLCV bars from the live 1m bars.
+
+    For each ticker it keeps the 1m bars of the current (coarsest) bucket.
+    Every update merges the new bars in (a re-sent bar replaces the old
+    one, so the still-forming bar is never double counted) and re-aggregates
+    only the buckets those bars fall into: first open, max high, min low,
+    last close and summed volume.
+
+    `loader(ticker, start)` may return stored bars since `start`; it is used
+    the first time a ticker is seen so that a restart mid-session doesn't
+    publish a daily bar built from the last few minutes only.
+    """
+
+    def __init__(self, resolutions=("5m", "1h", "1d"), loader=None):
+        unknown = [r for r in resolutions if r not in RESOLUTIONS]
+        if unknown:
+            raise ValueError(f"Unsupported rollup resolutions: {unknown}")
+        self.resolutions = list(resolutions)
+        self.loader = loader
+        self._coarsest = max(self.resolutions, key=lambda r: pd.Timedelta(RESOLUTIONS[r]))
+        self._recent = {}
+        self._lock = threading.Lock()
+
+    def _seed(self, ticker, tz, since):
+        if self.loader is None:
+            return None
+        try:
+            stored = self.loader(ticker, since)
+            if stored is None or stored.empty:
+                return None
+            stored = stored[list(OHLCV_AGG)].copy()
+            stored.index = pd.DatetimeIndex(stored.index).tz_convert(tz)
+        except Exception as e:
+            # Start from the live bars alone rather than fail the cycle
+            print(f"Rollup seed error for {ticker}: {e}")
+            return None
+        return stored[stored.index >= since]
+
+    def update(self, ticker, data):
+        """Merge new 1m bars and return {resolution: re-aggregated bars} for the touched buckets."""
+        data = data.dropna(subset=["Open", "High", "Low", "Close"])
+        if data.empty:
+            return {}
+        data = data[[col for col in OHLCV_AGG if col in data.columns]]
+        if "Volume" in data.columns:
+            data = data.assign(Volume=data["Volume"].fillna(0))
+        if data.index.tz is None:
+            data = data.tz_localize("UTC")
+
+        with self._lock:
+            recent = self._recent.get(ticker)
+        if recent is None:
+            recent = self._seed(ticker, data.index.tz, _bucket_start(data.index.max(), self._coarsest))
+        elif recent.index.tz != data.index.tz:
+            recent = recent.tz_convert(data.index.tz)
+
+        if recent is not None and not recent.empty:
+            # Bars from before the retained bucket were already rolled up; a late
+            # correction there would re-aggregate that bucket from partial data
+            data = data[data.index >= recent.index.min()]
+            if data.empty:
+                return {}
+            merged = pd.concat([recent, data])
+            merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+        else:
+            merged = data.sort_index()
+
+        first_new = data.index.min()
+        result = {}
+        for resolution in self.resolutions:
+            window = merged[merged.index >= _bucket_start(first_new, resolution)]
+            bars = resample_ohlcv(window, resolution)
+            if not bars.empty:
+                result[resolution] = bars
+
+        keep_from = _bucket_start(merged.index.max(), self._coarsest)
+        with self._lock:
+            self._recent[ticker] = merged[merged.index >= keep_from]
+        return result
+
+    def forget(self, ticker):
+        with self._lock:
+            self._recent.pop(ticker, None)
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+import httpx
+
+
+class TickerSearch:
+    """Yahoo Finance symbol search with an LRU+TTL cache.
+
+    Results are cached per normalized query for `ttl` seconds, up to
+    `cache_size` queries. Concurrent requests for a query that is already
+    being fetched wait on the same upstream request instead of sending
+    their own. Upstream calls share one pooled async HTTP client and, with
+    a `limiter`, take a 'search' slot in the shared Yahoo rate limiter.
+    """
+
+    def __init__(self, url, cache_size=1024, ttl=300, timeout=5.0, max_connections=20, limiter=None):
+        self.url = url
+        self.limiter = limiter
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._client = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_errors = 0
+
+    @staticmethod
+    def normalize(query):
+        return " ".join(query.lower().split())
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={'User-Agent': 'Mozilla/5.0'},
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    def _cached(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, results = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return results
+
+    async def search(self, query):
+        """Return [{'symbol', 'name', 'exchDisp'}] for `query`."""
+        key = self.normalize(query)
+        if not key:
+            return []
+        results = self._cached(key)
+        if results is not None:
+            self.hits += 1
+            return results
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # A task of its own, so a caller that disconnects (is cancelled) doesn't
+            # take the request down with it for everyone coalesced onto it
+            pending = asyncio.ensure_future(self._fetch_and_cache(key))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda task: self._fetch_done(key, task))
+        return await asyncio.shield(pending)
+
+    async def _fetch_and_cache(self, key):
+        try:
+            results = await self._fetch(key)
+        except Exception:
+            self.upstream_errors += 1
+            raise
+        self._cache[key] = (time.monotonic() + self.ttl, results)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return results
+
+    def _fetch_done(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            # Mark retrieved so a failure nobody awaited doesn't log "exception was never retrieved"
+            task.exception()
+
+    async def _fetch(self, query):
+        if self.limiter is not None:
+            # The limiter blocks, so wait for it off the event loop; a search is
+            # interactive, so give up rather than queue behind a long backoff
+            if not await asyncio.to_thread(self.limiter.acquire, "search", self.timeout):
+                raise RuntimeError("Yahoo request budget exhausted, try again shortly")
+        response = await self._get_client().get(self.url, params={"q": query})
+        if self.limiter is not None:
+            self.limiter.report("throttled" if response.status_code == 429 else "ok")
+        response.raise_for_status()
+        data = response.json()
+        results = []
+        for quote in data.get('quotes', []):
+            if 'symbol' in quote and 'shortname' in quote:
+                results.append({
+                    'symbol': quote['symbol'],
+                    'name': quote['shortname'],
+                    'exchDisp': quote.get('exchDisp', 'Unknown')
+                })
+        return results
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "upstream_errors": self.upstream_errors,
+            "cached_queries": len(self._cache),
+            "inflight": len(self._inflight),
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
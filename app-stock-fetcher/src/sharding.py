@@ -0,0 +1,108 @@
+import hashlib
+import re
+import socket
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+
+@lru_cache(maxsize=65536)
+def shard_for(symbol, count):
+    """Owner shard of `symbol` by rendezvous (highest random weight) hashing.
+    Going from N to N+1 shards moves only the ~1/(N+1) of symbols the new
+    shard wins; every other symbol keeps its owner."""
+    if count <= 1:
+        return 0
+    return max(
+        range(count),
+        key=lambda shard: hashlib.blake2b(f"{shard}:{symbol}".encode(), digest_size=8).digest(),
+    )
+
+
+def _hostname_ordinal():
+    """The StatefulSet ordinal at the end of the pod name (stock-fetcher-2 -> 2), or None."""
+    match = re.search(r"-(\d+)$", socket.gethostname())
+    return int(match.group(1)) if match else None
+
+
+class ShardAssignment:
+    """Which part of the watchlist this instance fetches, backfills and rolls up.
+    Shard 0 is the primary: it owns tickers.json and the /tickers writes."""
+
+    def __init__(self, index=0, count=1):
+        if not 0 <= index < count:
+            raise ValueError(f"Shard index {index} out of range for {count} shards")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def from_config(cls, config):
+        count = max(1, config.SHARD_COUNT)
+        if config.SHARD_INDEX != "":
+            index = int(config.SHARD_INDEX)
+        elif count > 1:
+            index = _hostname_ordinal()
+            if index is None:
+                raise ValueError("SHARD_COUNT > 1 needs SHARD_INDEX or a StatefulSet-style hostname")
+        else:
+            index = 0
+        return cls(index, count)
+
+    def __repr__(self):
+        return f"ShardAssignment({self.index}/{self.count})"
+
+    @property
+    def is_primary(self):
+        return self.index == 0
+
+    def owns(self, symbol):
+        return shard_for(symbol, self.count) == self.index
+
+    def filter(self, symbols):
+        return [s for s in symbols if self.owns(s)]
+
+
+class TickerSync:
+    """Keeps a secondary shard's TickerManager in step with the primary's GET /tickers.
+
+    Polls every `interval` seconds, or right away after `wake()` (e.g. when
+    this instance has just forwarded a write). Changes reach the local
+    subscribers as ordinary add/remove notifications.
+    """
+
+    def __init__(self, manager, primary_url, interval=30, timeout=10.0):
+        self.manager = manager
+        self.primary_url = primary_url.rstrip("/")
+        self.interval = interval
+        self.timeout = timeout
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="ticker-sync", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def sync(self):
+        import httpx  # only secondary shards sync; keeps it off the startup path
+
+        response = httpx.get(f"{self.primary_url}/tickers", timeout=self.timeout)
+        response.raise_for_status()
+        if self.manager.replace(response.json()):
+            print(f"[{datetime.now()}] Ticker list synced from {self.primary_url}")
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Ticker sync from {self.primary_url} failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
@@ -1,5 +1,47 @@
 from .influx import InfluxDBStorage
 from .csv import CSVStorage
+from .parquet import ParquetStorage
+from .spool import WriteSpool
+from src.metrics import POINTS_WRITTEN, STORE_SECONDS, timed
+
+def create_influx_storage(config, write_mode=None, spool=True):
+    """Build an InfluxDBStorage from configuration (`write_mode` overrides INFLUX_WRITE_MODE).
+    Unless `spool` is False or INFLUX_SPOOL_MAX_BYTES is 0, failed writes go to the on-disk spool."""
+    write_spool = None
+    if spool and config.INFLUX_SPOOL_MAX_BYTES > 0:
+        write_spool = WriteSpool(
+            config.INFLUX_SPOOL_DIR,
+            max_bytes=config.INFLUX_SPOOL_MAX_BYTES,
+            segment_bytes=config.INFLUX_SPOOL_SEGMENT_BYTES,
+        )
+    return InfluxDBStorage(
+        url=config.INFLUXDB_URL,
+        token=config.INFLUXDB_TOKEN,
+        org=config.INFLUXDB_ORG,
+        bucket=config.INFLUXDB_BUCKET,
+        write_mode=write_mode or config.INFLUX_WRITE_MODE,
+        batch_options={
+            "batch_size": config.INFLUX_BATCH_SIZE,
+            "flush_interval": config.INFLUX_FLUSH_INTERVAL,
+            "max_queue": config.INFLUX_QUEUE_SIZE,
+            "max_retries": config.INFLUX_MAX_RETRIES,
+        },
+        spool=write_spool,
+        recheck_interval=config.INFLUX_RECHECK_INTERVAL,
+    )
+
+def create_parquet_storage(config):
+    return ParquetStorage(
+        config.DATA_DIR,
+        compact_interval=config.PARQUET_COMPACT_INTERVAL,
+        compact_min_segments=config.PARQUET_COMPACT_MIN_SEGMENTS,
+    )
+
+def create_local_storage(config):
+    """The on-disk backend selected by LOCAL_BACKEND ('csv' or 'parquet')"""
+    if config.LOCAL_BACKEND == 'parquet':
+        return create_parquet_storage(config)
+    return CSVStorage(config.DATA_DIR)
 
 def get_storage_backend(config):
     """Factory to get the appropriate storage backend based on configuration"""
@@ -7,21 +49,62 @@ def get_storage_backend(config):
     
     # Try InfluxDB first if mode allows
     if config.STORAGE_MODE in ['influxdb', 'auto']:
-        influx = InfluxDBStorage(
-            url=config.INFLUXDB_URL,
-            token=config.INFLUXDB_TOKEN,
-            org=config.INFLUXDB_ORG,
-            bucket=config.INFLUXDB_BUCKET
-        )
-        if influx.is_available():
+        influx = create_influx_storage(config)
+        if influx.is_available() or influx.spool is not None:
+            # With a spool, an unreachable InfluxDB still accepts writes and replays them later
             backends.append(influx)
         elif config.STORAGE_MODE == 'influxdb':
             print("CRITICAL: InfluxDB mode required but connection failed.")
             return []
 
-    # Fallback to CSV if auto or explicitly requested
-    if config.STORAGE_MODE in ['csv', 'auto']:
-        # If mode is 'csv', or if 'auto', always add CSVStorage as a reliable fallback
+    # Fallback to local files if auto or explicitly requested
+    if config.STORAGE_MODE == 'csv':
         backends.append(CSVStorage(config.DATA_DIR))
+    elif config.STORAGE_MODE == 'parquet':
+        backends.append(create_parquet_storage(config))
+    elif config.STORAGE_MODE == 'auto':
+        # In 'auto' mode always add the local backend as a reliable fallback
+        backends.append(create_local_storage(config))
 
     return backends
+
+def read_recent(backends, ticker, start, end=None):
+    """Stored bars for `ticker` from the first backend that can return any"""
+    for backend in backends:
+        data = backend.read_range(ticker, start, end)
+        if data is not None and not data.empty:
+            return data
+    return None
+
+def store_timed(backend, ticker, data, resolution=None):
+    """`backend.store` (or `store_rollup` for a `resolution`), recorded in the store metrics"""
+    name = type(backend).__name__
+    measurement = f"stock_price_{resolution}" if resolution else "stock_price"
+    with timed(STORE_SECONDS, backend=name, measurement=measurement):
+        if resolution:
+            stored = backend.store_rollup(ticker, resolution, data)
+        else:
+            stored = backend.store(ticker, data)
+    if stored:
+        POINTS_WRITTEN.inc(len(data), backend=name, measurement=measurement)
+    return stored
+
+def store_rollups(backends, ticker, rollups):
+    """Write {resolution: bars} to the first backend that accepts each resolution"""
+    for resolution, bars in rollups.items():
+        for backend in backends:
+            if store_timed(backend, ticker, bars, resolution):
+                break
+
+def store_indicators(backends, ticker, values):
+    """Write indicator values to the first backend that accepts them"""
+    if values is None or values.empty:
+        return False
+    for backend in backends:
+        name = type(backend).__name__
+        with timed(STORE_SECONDS, backend=name, measurement="stock_indicators"):
+            stored = backend.store_indicators(ticker, values)
+        if stored:
+            POINTS_WRITTEN.inc(len(values), backend=name, measurement="stock_indicators")
+            return True
+    return False
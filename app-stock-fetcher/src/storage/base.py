@@ -10,3 +10,43 @@ class StorageBackend(ABC):
     def is_available(self):
         """Check if the backend is available"""
         pass
+
+    def store_rollup(self, ticker, resolution, data):
+        """Store OHLCV bars aggregated to `resolution` (e.g. '5m', '1h', '1d').
+        Backends without a place for rollups return False"""
+        return False
+
+    def store_indicators(self, ticker, data):
+        """Store technical indicator values (one column per indicator, NaN = not yet defined).
+        Backends without a place for them return False"""
+        return False
+
+    def read_range(self, ticker, start=None, end=None):
+        """Return stored 1m OHLCV bars with start <= time < end (UTC index), or None if unsupported"""
+        return None
+
+    def flush(self, timeout=None):
+        """Block until pending writes are persisted; returns False on timeout"""
+        return True
+
+    def close(self, timeout=None):
+        """Flush pending writes and release resources"""
+        pass
+
+    def last_timestamp(self, ticker):
+        """Return the timestamp of the newest stored bar for `ticker`, or None"""
+        return None
+
+    def last_timestamps(self, tickers):
+        """Return {ticker: newest stored bar timestamp} for the tickers that have data"""
+        result = {}
+        for ticker in tickers:
+            ts = self.last_timestamp(ticker)
+            if ts is not None:
+                result[ticker] = ts
+        return result
+
+    def covered_dates(self, ticker, start, end, interval="1d"):
+        """Return the set of dates in [start, end) holding bars of `interval` for `ticker`.
+        Backends that cannot answer return an empty set, which makes every day look missing."""
+        return set()
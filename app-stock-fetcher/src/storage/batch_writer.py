@@ -0,0 +1,207 @@
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+
+from influxdb_client import WritePrecision
+from influxdb_client.rest import ApiException
+
+
+class BatchWriter:
+    """Background line-protocol writer for InfluxDB.
+
+    Producers `submit()` encoded lines into a bounded queue; a worker thread
+    groups them into batches of up to `batch_size` lines (or whatever arrived
+    within `flush_interval` seconds) and writes each batch in one request.
+    A full queue blocks the producer, so a slow or unreachable InfluxDB
+    throttles the fetch loop instead of growing memory without bound.
+    Failed writes are retried with exponential backoff and full jitter; a
+    batch that still can't be written is handed to `on_failure` (if given).
+    """
+
+    def __init__(self, write_api, bucket, org, batch_size=5000, flush_interval=1.0,
+                 max_queue=1000, max_retries=5, retry_base_delay=0.5, retry_max_delay=30.0,
+                 on_failure=None):
+        self.write_api = write_api
+        self.bucket = bucket
+        self.org = org
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.on_failure = on_failure
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._flush_requested = threading.Event()
+        self._stop = threading.Event()  # set when close() can't wait for the queue to drain
+        self._closed = False
+        self._failing = False  # the last batch was given up on
+        self.points_written = 0
+        self.batches_written = 0
+        self.batches_failed = 0
+
+        self._thread = threading.Thread(target=self._run, name="influx-batch-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, lines, timeout=None):
+        """Enqueue a list of line-protocol strings.
+
+        Blocks while the queue is full (up to `timeout` seconds when given).
+        Returns False if the writer is closed or the timeout expired.
+        """
+        if self._closed:
+            return False
+        if not lines:
+            return True
+        try:
+            self._queue.put(lines, timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def depth(self):
+        """Number of submitted frames not yet written."""
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            "queue_depth": self.depth(),
+            "points_written": self.points_written,
+            "batches_written": self.batches_written,
+            "batches_failed": self.batches_failed,
+        }
+
+    def flush(self, timeout=None):
+        """Write everything submitted so far; returns False if `timeout` expired first."""
+        self._flush_requested.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Drain the queue and stop the worker thread.
+
+        If the flush times out (InfluxDB stalled), the worker is told to stop
+        after its current write attempt instead; whatever is still queued then
+        goes to `on_failure`, so shutdown takes at most about twice `timeout`.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if not self.flush(timeout):
+            self._stop.set()
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            if self._stop.is_set():
+                self._abandon()
+                return
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            batch = list(item)
+            taken = 1
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size and not self._flush_requested.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                taken += 1
+                if item is None:
+                    stop = True
+                    break
+                batch.extend(item)
+            # Pick up whatever is already queued without waiting further
+            while len(batch) < self.batch_size and not stop:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                taken += 1
+                if item is None:
+                    stop = True
+                    break
+                batch.extend(item)
+
+            self._write(batch)
+            if self._queue.empty():
+                self._flush_requested.clear()
+            for _ in range(taken):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _abandon(self):
+        """Hand everything still queued to `on_failure` without writing it."""
+        lines = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                lines.extend(item)
+            self._queue.task_done()
+        if not lines:
+            return
+        if self.on_failure is not None:
+            self.on_failure(lines)
+        else:
+            print(f"[{datetime.now()}] Dropped {len(lines)} queued points on shutdown")
+
+    def _write(self, lines):
+        if self._stop.is_set():
+            return self._give_up(lines)
+        payload = "\n".join(lines)
+        # While InfluxDB is failing, each queued batch gets a single attempt, so
+        # a backlog is handed to `on_failure` instead of retried batch by batch
+        retries = 0 if self._failing else self.max_retries
+        for attempt in range(retries + 1):
+            try:
+                self.write_api.write(bucket=self.bucket, org=self.org, record=payload, write_precision=WritePrecision.NS)
+                self.points_written += len(lines)
+                self.batches_written += 1
+                self._failing = False
+                return True
+            except ApiException as e:
+                # Malformed data or auth problems won't succeed on retry
+                if e.status is not None and 400 <= e.status < 500 and e.status != 429:
+                    print(f"[{datetime.now()}] InfluxDB rejected batch of {len(lines)} points: {e.status} {e.reason}")
+                    self.batches_failed += 1
+                    return False
+                error = e
+            except Exception as e:
+                error = e
+            if attempt < retries:
+                delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+                print(f"[{datetime.now()}] InfluxDB batch write failed ({error}); retrying in {delay:.1f}s")
+                if self._stop.wait(delay):
+                    break  # shutting down; don't keep retrying
+        self._failing = True
+        return self._give_up(lines)
+
+    def _give_up(self, lines):
+        self.batches_failed += 1
+        if self.on_failure is not None:
+            self.on_failure(lines)
+        else:
+            print(f"[{datetime.now()}] Dropped batch of {len(lines)} points")
+        return False
@@ -37,3 +37,54 @@ class CSVStorage(StorageBackend):
         except Exception as e:
             print(f"CSV storage error for {ticker}: {e}")
             return False
+
+    def last_timestamp(self, ticker):
+        file_path = os.path.join(self.data_dir, f"{ticker}_history.csv")
+        if not os.path.exists(file_path):
+            return None
+        try:
+            # Only the final line is needed, so read the tail instead of the whole history
+            with open(file_path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                f.seek(max(0, size - 4096))
+                lines = f.read().decode("utf-8", errors="ignore").strip().splitlines()
+            if len(lines) < 2 and size <= 4096:
+                return None  # header only
+            return pd.Timestamp(lines[-1].split(",", 1)[0])
+        except Exception as e:
+            print(f"CSV watermark read error for {ticker}: {e}")
+            return None
+
+    def covered_dates(self, ticker, start, end, interval="1d"):
+        file_path = os.path.join(self.data_dir, f"{ticker}_history.csv")
+        if not os.path.exists(file_path):
+            return set()
+        try:
+            index = pd.to_datetime(pd.read_csv(file_path, usecols=[0]).iloc[:, 0], utc=True)
+            days = index.dt.date
+            days = days[(days >= start) & (days < end)]
+            counts = days.value_counts()
+            # A daily bar is one row per day; intraday coverage needs more than that
+            if interval != "1d":
+                counts = counts[counts > 1]
+            return set(counts.index)
+        except Exception as e:
+            print(f"CSV coverage read error for {ticker}: {e}")
+            return set()
+
+    def read_range(self, ticker, start=None, end=None):
+        file_path = os.path.join(self.data_dir, f"{ticker}_history.csv")
+        if not os.path.exists(file_path):
+            return None
+        try:
+            df = pd.read_csv(file_path, index_col=0)
+            df.index = pd.to_datetime(df.index, utc=True)
+            if start is not None:
+                df = df[df.index >= pd.Timestamp(start)]
+            if end is not None:
+                df = df[df.index < pd.Timestamp(end)]
+            return df
+        except Exception as e:
+            print(f"CSV read error for {ticker}: {e}")
+            return None
@@ -1,22 +1,64 @@
-from influxdb_client import InfluxDBClient, Point, WritePrecision
+import threading
+from datetime import datetime
+
+import pandas as pd
+from influxdb_client import InfluxDBClient, WritePrecision
 from influxdb_client.client.write_api import SYNCHRONOUS
 from .base import StorageBackend
+from .batch_writer import BatchWriter
+from .line_protocol import encode_indicators, encode_ohlcv
+from src.metrics import ENCODE_SECONDS, timed
+from src.timeutil import to_utc
+
+def _flux_time(ts):
+    """RFC3339 UTC literal for a Flux range() bound (naive timestamps are UTC)."""
+    return to_utc(ts).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
 
 class InfluxDBStorage(StorageBackend):
-    def __init__(self, url, token, org, bucket):
+    def __init__(self, url, token, org, bucket, write_mode="sync", batch_options=None,
+                 spool=None, recheck_interval=30, replay_batch_size=20000):
+        """`write_mode` is 'sync' (store() writes before returning) or 'batch'
+        (store() enqueues into a BatchWriter; see `batch_options` for its settings).
+
+        A background thread re-checks availability every `recheck_interval`
+        seconds after a failure. With a `spool`, writes made while InfluxDB is
+        unreachable (or that fail) are appended to it instead of being lost, and
+        the same thread replays the spool in batches of `replay_batch_size`
+        lines once InfluxDB is back.
+        """
         self.url = url
         self.token = token
         self.org = org
         self.bucket = bucket
+        self.write_mode = write_mode
+        self.batch_options = batch_options or {}
+        self.spool = spool
+        self.recheck_interval = recheck_interval
+        self.replay_batch_size = replay_batch_size
         self.client = None
+        self.writer = None
         self.available = False
+        self.dropped_batches = 0  # batches the writer gave up on that the spool couldn't take
+        self._stop = threading.Event()
+        self._monitor = None
         self._initialize()
+        # Without the monitor nothing would set `available` back after one failed batch
+        if self.recheck_interval:
+            self._monitor = threading.Thread(target=self._monitor_loop, name="influx-monitor", daemon=True)
+            self._monitor.start()
 
     def _initialize(self):
         try:
-            self.client = InfluxDBClient(url=self.url, token=self.token, org=self.org, timeout=5000)
-            self.client.ping()
+            # Batched payloads are large, so compress them on the wire
+            self.client = InfluxDBClient(url=self.url, token=self.token, org=self.org, timeout=5000,
+                                         enable_gzip=self.write_mode == "batch")
             self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
+            if self.write_mode == "batch":
+                self.writer = BatchWriter(self.write_api, self.bucket, self.org,
+                                          on_failure=self._write_failed, **self.batch_options)
+            # ping() reports failure through its return value rather than raising
+            if not self.client.ping():
+                raise ConnectionError(f"no response from {self.url}/ping")
             self.available = True
             print(f"Connected to InfluxDB at {self.url}")
         except Exception as e:
@@ -26,30 +68,194 @@ class InfluxDBStorage(StorageBackend):
     def is_available(self):
         return self.available
 
+    def stats(self):
+        result = {"available": self.available, "dropped_batches": self.dropped_batches}
+        if self.writer is not None:
+            result["writer"] = self.writer.stats()
+        if self.spool is not None:
+            result["spool"] = self.spool.stats()
+        return result
+
+    def _spool_lines(self, ticker, lines):
+        if self.spool is not None and self.spool.append(lines):
+            print(f"✓ Spooled {len(lines)} records for {ticker} for InfluxDB replay")
+            return True
+        return False
+
+    def _write_failed(self, lines):
+        """BatchWriter gave up on a batch: keep it for replay and stop sending until InfluxDB is back."""
+        self.available = False
+        if not self._spool_lines("batch", lines):
+            self.dropped_batches += 1
+            print(f"[{datetime.now()}] Dropped batch of {len(lines)} points (spool unavailable or full)")
+
     def store(self, ticker, data):
-        if not self.available:
+        # yfinance occasionally returns rows with NaN values; the encoder drops them
+        # and fills NaN volumes with 0, as some non-US tickers don't report it consistently
+        return self._write_frame(ticker, data, "stock_price")
+
+    def store_rollup(self, ticker, resolution, data):
+        return self._write_frame(ticker, data, f"stock_price_{resolution}")
+
+    def store_indicators(self, ticker, data):
+        return self._write_frame(ticker, data, "stock_indicators", encode=encode_indicators)
+
+    def _write_frame(self, ticker, data, measurement, encode=encode_ohlcv):
+        if self.client is None:
             return False
-        
+
+        lines = None
         try:
-            # yfinance occasionally returns rows with NaN values
-            data = data.dropna(subset=['Open', 'High', 'Low', 'Close'])
-            # Fill NaN volumes with 0, as some non-US tickers might not report it consistently
-            data['Volume'] = data['Volume'].fillna(0)
-            
-            for index, row in data.iterrows():
-                point = (
-                    Point("stock_price")
-                    .tag("ticker", ticker)
-                    .field("open", float(row['Open']))
-                    .field("high", float(row['High']))
-                    .field("low", float(row['Low']))
-                    .field("close", float(row['Close']))
-                    .field("volume", int(row['Volume']))
-                    .time(index, WritePrecision.NS)
-                )
-                self.write_api.write(bucket=self.bucket, org=self.org, record=point)
-            print(f"✓ Stored {len(data)} records for {ticker} in InfluxDB")
-            return True
+            with timed(ENCODE_SECONDS, measurement=measurement):
+                lines = encode(data, ticker, measurement=measurement, as_bytes=False)
+            if not lines:
+                return True
+            return self._write_lines(ticker, lines, measurement)
         except Exception as e:
             print(f"InfluxDB write error for {ticker}: {e}")
+            if self.spool is not None and lines:
+                self.available = False
+                return self._spool_lines(ticker, lines)
             return False
+
+    def _write_lines(self, ticker, lines, measurement):
+        # While anything is spooled, keep appending behind it so a stale spooled
+        # bar can never overwrite a newer live write during replay
+        if not self.available or (self.spool is not None and self.spool.pending()):
+            return self._spool_lines(ticker, lines)
+        if self.writer is not None:
+            if not self.writer.submit(lines):
+                return False
+            print(f"✓ Queued {len(lines)} {measurement} records for {ticker} for InfluxDB")
+            return True
+        self.write_api.write(bucket=self.bucket, org=self.org, record=lines, write_precision=WritePrecision.NS)
+        print(f"✓ Stored {len(lines)} {measurement} records for {ticker} in InfluxDB")
+        return True
+
+    def _monitor_loop(self):
+        while not self._stop.wait(self.recheck_interval):
+            try:
+                if not self.available:
+                    if not self.client.ping():
+                        continue
+                    self.available = True
+                    print(f"[{datetime.now()}] InfluxDB at {self.url} is reachable again")
+                self.replay()
+            except Exception as e:
+                print(f"InfluxDB monitor error: {e}")
+
+    def replay(self):
+        """Write spooled segments to InfluxDB, oldest first. Stops at the first failure."""
+        replayed = 0
+        while self.spool is not None and self.available and not self._stop.is_set():
+            segment = self.spool.oldest()
+            if segment is None:
+                break
+            path, lines = segment
+            try:
+                for i in range(0, len(lines), self.replay_batch_size):
+                    self.write_api.write(bucket=self.bucket, org=self.org,
+                                         record="\n".join(lines[i:i + self.replay_batch_size]),
+                                         write_precision=WritePrecision.NS)
+            except Exception as e:
+                print(f"[{datetime.now()}] Spool replay failed, will retry: {e}")
+                self.available = False
+                break
+            self.spool.ack(path, len(lines))
+            replayed += len(lines)
+        if replayed:
+            print(f"[{datetime.now()}] Replayed {replayed} spooled points to InfluxDB")
+        return replayed
+
+    def flush(self, timeout=None):
+        if self.writer is not None:
+            return self.writer.flush(timeout)
+        return True
+
+    def close(self, timeout=None):
+        self._stop.set()
+        if self._monitor is not None:
+            self._monitor.join(timeout)
+        if self.writer is not None:
+            self.writer.close(timeout)
+        if self.spool is not None:
+            self.spool.close()
+        if self.client is not None:
+            self.client.close()
+
+    def last_timestamp(self, ticker):
+        return self.last_timestamps([ticker]).get(ticker)
+
+    def last_timestamps(self, tickers, lookback="-30d"):
+        if not self.available or not tickers:
+            return {}
+        ticker_set = ", ".join(f'"{t}"' for t in tickers)
+        query = f'''
+from(bucket: "{self.bucket}")
+  |> range(start: {lookback})
+  |> filter(fn: (r) => r["_measurement"] == "stock_price" and r["_field"] == "close")
+  |> filter(fn: (r) => contains(value: r["ticker"], set: [{ticker_set}]))
+  |> group(columns: ["ticker"])
+  |> last()
+'''
+        try:
+            tables = self.client.query_api().query(query, org=self.org)
+            return {
+                record.values["ticker"]: record.get_time()
+                for table in tables
+                for record in table.records
+            }
+        except Exception as e:
+            print(f"InfluxDB watermark query error: {e}")
+            return {}
+
+    def covered_dates(self, ticker, start, end, interval="1d"):
+        if not self.available:
+            return set()
+        # Daily bars live only in the 1d rollup measurement, so live 1m bars in
+        # stock_price never make a day look covered at daily resolution
+        measurement = "stock_price_1d" if interval == "1d" else "stock_price"
+        query = f'''
+from(bucket: "{self.bucket}")
+  |> range(start: {start.isoformat()}T00:00:00Z, stop: {end.isoformat()}T00:00:00Z)
+  |> filter(fn: (r) => r["_measurement"] == "{measurement}" and r["_field"] == "close" and r["ticker"] == "{ticker}")
+  |> aggregateWindow(every: 1d, fn: count, createEmpty: false, timeSrc: "_start")
+'''
+        # Intraday coverage needs more than a stray bar or two
+        min_count = 1 if interval == "1d" else 2
+        try:
+            tables = self.client.query_api().query(query, org=self.org)
+            return {
+                record.get_time().date()
+                for table in tables
+                for record in table.records
+                if record.get_value() >= min_count
+            }
+        except Exception as e:
+            print(f"InfluxDB coverage query error for {ticker}: {e}")
+            return set()
+
+    def read_range(self, ticker, start=None, end=None):
+        if not self.available:
+            return None
+        start = "0" if start is None else _flux_time(start)
+        stop = "now()" if end is None else _flux_time(end)
+        query = f'''
+from(bucket: "{self.bucket}")
+  |> range(start: {start}, stop: {stop})
+  |> filter(fn: (r) => r["_measurement"] == "stock_price" and r["ticker"] == "{ticker}")
+  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> keep(columns: ["_time", "open", "high", "low", "close", "volume"])
+'''
+        try:
+            df = self.client.query_api().query_data_frame(query, org=self.org)
+            if isinstance(df, list):
+                df = pd.concat(df) if df else pd.DataFrame()
+            if df.empty:
+                return df
+            df = df.set_index("_time").sort_index()
+            df.index = pd.to_datetime(df.index, utc=True).rename("Datetime")
+            return df.rename(columns=str.capitalize)[["Open", "High", "Low", "Close", "Volume"]]
+        except Exception as e:
+            print(f"InfluxDB read error for {ticker}: {e}")
+            return None
@@ -0,0 +1,107 @@
+"""Vectorized DataFrame -> InfluxDB line protocol encoding.
+
+All Influx write paths (live `InfluxDBStorage.store`, the historical
+backfill) go through here instead of building one `Point` per row.
+"""
+import numpy as np
+import pandas as pd
+
+# DataFrame column -> Influx field name
+OHLC_FIELDS = {"Open": "open", "High": "high", "Low": "low", "Close": "close"}
+VOLUME_FIELDS = {"Volume": "volume"}
+
+
+def _escape_key(value):
+    """Escape a measurement, tag key or tag value for line protocol."""
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace(",", "\\,")
+        .replace("=", "\\=")
+        .replace(" ", "\\ ")
+    )
+
+
+def timestamps_ns(index):
+    """Return a DatetimeIndex as int64 nanoseconds since the epoch (naive = UTC)."""
+    index = pd.DatetimeIndex(index)
+    if index.tz is None:
+        index = index.tz_localize("UTC")
+    return index.as_unit("ns").asi8
+
+
+def to_line_protocol(data, measurement, tags=None, float_fields=None, int_fields=None, as_bytes=True,
+                     skip_nan=False):
+    """Encode `data` as line protocol in one vectorized pass.
+
+    `float_fields` / `int_fields` map DataFrame columns to field names. Rows
+    with NaN in any float field are dropped and NaN integers become 0; with
+    `skip_nan` a NaN float field is left out of its line instead, and only
+    rows without any field are dropped.
+    Returns newline-joined bytes, or a list of lines when `as_bytes` is False.
+    """
+    float_fields = float_fields or {}
+    int_fields = int_fields or {}
+    if data.empty:
+        return b"" if as_bytes else []
+
+    if skip_nan and not int_fields:
+        data = data.dropna(subset=list(float_fields), how="all")
+    elif not skip_nan:
+        data = data.dropna(subset=list(float_fields))
+    if data.empty:
+        return b"" if as_bytes else []
+
+    prefix = _escape_key(measurement)
+    for key, value in sorted((tags or {}).items()):
+        prefix += f",{_escape_key(key)}={_escape_key(value)}"
+    prefix += " "
+
+    parts = []
+    for column, field in float_fields.items():
+        values = data[column].to_numpy(dtype=np.float64)
+        part = f"{_escape_key(field)}=" + pd.Series(values.astype(str), dtype=object)
+        if skip_nan:
+            part[np.isnan(values)] = ""
+        parts.append(part)
+    for column, field in int_fields.items():
+        values = data[column].fillna(0).to_numpy().astype(np.int64).astype(str)
+        parts.append(f"{_escape_key(field)}=" + pd.Series(values, dtype=object) + "i")
+
+    lines = parts[0]
+    for part in parts[1:]:
+        if skip_nan:
+            # Only join with a comma where both sides have a field
+            lines = lines + np.where((lines != "") & (part != ""), ",", "") + part
+        else:
+            lines = lines + "," + part
+    ts = pd.Series(timestamps_ns(data.index).astype(str), dtype=object)
+    lines = (prefix + lines + " " + ts).tolist()
+
+    if as_bytes:
+        return "\n".join(lines).encode("utf-8")
+    return lines
+
+
+def encode_ohlcv(data, ticker, measurement="stock_price", as_bytes=True):
+    """Encode a yfinance OHLCV frame for `ticker` (volume zero-filled, NaN prices dropped)."""
+    return to_line_protocol(
+        data,
+        measurement,
+        tags={"ticker": ticker},
+        float_fields=OHLC_FIELDS,
+        int_fields=VOLUME_FIELDS if "Volume" in data.columns else None,
+        as_bytes=as_bytes,
+    )
+
+
+def encode_indicators(data, ticker, measurement="stock_indicators", as_bytes=True):
+    """Encode indicator values (one column per indicator) for `ticker`; NaN values are left out."""
+    return to_line_protocol(
+        data,
+        measurement,
+        tags={"ticker": ticker},
+        float_fields={column: column for column in data.columns},
+        as_bytes=as_bytes,
+        skip_nan=True,
+    )
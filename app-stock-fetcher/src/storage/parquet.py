@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .base import StorageBackend
+from src.timeutil import to_utc
+
+COMPACTED_FILE = "part.parquet"
+
+
+class ParquetStorage(StorageBackend):
+    """Append-only columnar storage partitioned by ticker and UTC date.
+
+    Layout: <data_dir>/parquet/ticker=<T>/date=<YYYY-MM-DD>/
+        part.parquet            compacted, de-duplicated bars
+        seg-<ns>.parquet        small segments appended by store()
+
+    store() only ever writes new segment files (temp file + rename), so a
+    crash can't corrupt existing data and the per-cycle cost doesn't grow
+    with history. A background compaction merges segments into part.parquet
+    and drops duplicate timestamps (the newest segment wins).
+    """
+
+    def __init__(self, data_dir, compact_interval=300, compact_min_segments=8):
+        self.root = os.path.join(data_dir, "parquet")
+        self.compact_min_segments = compact_min_segments
+        self._lock = threading.Lock()
+        self._seq = 0
+        os.makedirs(self.root, exist_ok=True)
+        self._stop = threading.Event()
+        self._compactor = None
+        if compact_interval:
+            self._compactor = threading.Thread(
+                target=self._compact_loop, args=(compact_interval,), name="parquet-compactor", daemon=True
+            )
+            self._compactor.start()
+
+    def is_available(self):
+        return True  # Local files are always "available" if the disk is writable
+
+    def _ticker_dir(self, ticker):
+        return os.path.join(self.root, f"ticker={ticker}")
+
+    def _partitions(self, ticker):
+        """Sorted [(date, path)] for a ticker."""
+        ticker_dir = self._ticker_dir(ticker)
+        if not os.path.isdir(ticker_dir):
+            return []
+        result = []
+        for name in os.listdir(ticker_dir):
+            if name.startswith("date="):
+                result.append((datetime.strptime(name[5:], "%Y-%m-%d").date(), os.path.join(ticker_dir, name)))
+        return sorted(result)
+
+    @staticmethod
+    def _files(partition_dir):
+        """Parquet files of a partition, oldest data first (compacted file, then segments)."""
+        names = sorted(n for n in os.listdir(partition_dir) if n.startswith("seg-") and n.endswith(".parquet"))
+        if os.path.exists(os.path.join(partition_dir, COMPACTED_FILE)):
+            names.insert(0, COMPACTED_FILE)
+        return [os.path.join(partition_dir, n) for n in names]
+
+    @staticmethod
+    def _write_atomic(table, path):
+        tmp_path = f"{path}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+    def store(self, ticker, data):
+        try:
+            data = data.dropna(subset=['Open', 'High', 'Low', 'Close'])
+            if data.empty:
+                return True  # Nothing to store, but not an error
+
+            index = pd.DatetimeIndex(data.index)
+            index = index.tz_localize("UTC") if index.tz is None else index.tz_convert("UTC")
+            frame = pd.DataFrame(
+                {col: data[col].to_numpy() for col in ['Open', 'High', 'Low', 'Close', 'Volume'] if col in data.columns},
+                index=index.rename("Datetime"),
+            )
+            if 'Volume' in frame.columns:
+                frame['Volume'] = frame['Volume'].fillna(0)
+
+            ticker_dir = self._ticker_dir(ticker)
+            with self._lock:
+                for day, part in frame.groupby(frame.index.date):
+                    partition_dir = os.path.join(ticker_dir, f"date={day.isoformat()}")
+                    os.makedirs(partition_dir, exist_ok=True)
+                    self._seq += 1
+                    path = os.path.join(partition_dir, f"seg-{time.time_ns():020d}-{self._seq:06d}.parquet")
+                    self._write_atomic(pa.Table.from_pandas(part, preserve_index=True), path)
+
+            print(f"✓ Stored {len(frame)} records for {ticker} in Parquet")
+            return True
+        except Exception as e:
+            print(f"Parquet storage error for {ticker}: {e}")
+            return False
+
+    def _read_partition(self, partition_dir):
+        frames = []
+        for path in self._files(partition_dir):
+            try:
+                frames.append(pq.read_table(path).to_pandas())
+            except FileNotFoundError:
+                # Merged away by a concurrent compaction; its rows are in part.parquet
+                return self._read_partition(partition_dir)
+        if not frames:
+            return None
+        df = pd.concat(frames)
+        return df[~df.index.duplicated(keep='last')].sort_index()
+
+    def read_range(self, ticker, start=None, end=None):
+        """Return the bars for `ticker` with start <= time < end (UTC index), or an empty DataFrame."""
+        start = to_utc(start) if start is not None else None
+        end = to_utc(end) if end is not None else None
+        frames = []
+        for day, partition_dir in self._partitions(ticker):
+            if start is not None and day < start.date():
+                continue
+            if end is not None and day > end.date():
+                break
+            df = self._read_partition(partition_dir)
+            if df is not None:
+                frames.append(df)
+        if not frames:
+            return pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+        df = pd.concat(frames)
+        if start is not None:
+            df = df[df.index >= start]
+        if end is not None:
+            df = df[df.index < end]
+        return df
+
+    def compact(self, ticker=None, min_segments=None):
+        """Merge the segments of each partition into part.parquet, dropping duplicates."""
+        min_segments = min_segments or self.compact_min_segments
+        if ticker is None:
+            tickers = [n[7:] for n in os.listdir(self.root) if n.startswith("ticker=")]
+        else:
+            tickers = [ticker]
+        merged = 0
+        for t in tickers:
+            for _, partition_dir in self._partitions(t):
+                with self._lock:
+                    files = self._files(partition_dir)
+                    segments = [p for p in files if os.path.basename(p) != COMPACTED_FILE]
+                    if len(segments) < min_segments:
+                        continue
+                    df = self._read_partition(partition_dir)
+                    self._write_atomic(
+                        pa.Table.from_pandas(df, preserve_index=True),
+                        os.path.join(partition_dir, COMPACTED_FILE),
+                    )
+                    for path in segments:
+                        os.remove(path)
+                    merged += len(segments)
+        return merged
+
+    def _compact_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                merged = self.compact()
+                if merged:
+                    print(f"[{datetime.now()}] Compacted {merged} Parquet segments")
+            except Exception as e:
+                print(f"Parquet compaction error: {e}")
+
+    def close(self, timeout=None):
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join(timeout)
+
+    def last_timestamp(self, ticker):
+        for _, partition_dir in reversed(self._partitions(ticker)):
+            df = self._read_partition(partition_dir)
+            if df is not None and not df.empty:
+                return df.index.max()
+        return None
+
+    def covered_dates(self, ticker, start, end, interval="1d"):
+        dates = set()
+        for day, partition_dir in self._partitions(ticker):
+            if day < start or day >= end:
+                continue
+            # A daily bar is one row per day; intraday coverage needs more than that
+            if interval == "1d" or sum(pq.read_metadata(p).num_rows for p in self._files(partition_dir)) > 1:
+                dates.add(day)
+        return dates
@@ -0,0 +1,110 @@
+import os
+import threading
+from datetime import datetime
+
+
+class WriteSpool:
+    """Disk-backed, segmented append log of line protocol.
+
+    Writes that couldn't reach InfluxDB are appended to the active segment
+    file (`spool-<seq>.lp`) and fsynced, so they survive a restart. Segments
+    roll over at `segment_bytes`; the replayer consumes whole segments,
+    oldest first, and deletes each one once InfluxDB has accepted it.
+    `max_bytes` caps the total size on disk — appends beyond it are refused
+    so the caller can fall back to another backend.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, segment_bytes=8 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._active = None
+        self._active_path = None
+        self.lines_spooled = 0
+        self.lines_replayed = 0
+        self.lines_rejected = 0
+        os.makedirs(directory, exist_ok=True)
+        segments = self._segments()
+        self._seq = int(os.path.basename(segments[-1])[6:-3]) if segments else 0
+        if segments:
+            print(f"[{datetime.now()}] Found {len(segments)} spooled InfluxDB segments ({self.size_bytes()} bytes) to replay")
+
+    def _segments(self):
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith("spool-") and n.endswith(".lp"))
+        return [os.path.join(self.directory, n) for n in names]
+
+    def size_bytes(self):
+        total = 0
+        for path in self._segments():
+            try:
+                total += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        return total
+
+    def pending(self):
+        """True if there is anything left to replay."""
+        return any(os.path.getsize(p) for p in self._segments())
+
+    def stats(self):
+        return {
+            "segments": len(self._segments()),
+            "bytes": self.size_bytes(),
+            "lines_spooled": self.lines_spooled,
+            "lines_replayed": self.lines_replayed,
+            "lines_rejected": self.lines_rejected,
+        }
+
+    def _roll(self):
+        if self._active is not None:
+            self._active.close()
+        self._seq += 1
+        self._active_path = os.path.join(self.directory, f"spool-{self._seq:012d}.lp")
+        self._active = open(self._active_path, "ab")
+
+    def append(self, lines):
+        """Durably append line-protocol strings; returns False if the size cap is reached."""
+        payload = ("\n".join(lines) + "\n").encode("utf-8")
+        with self._lock:
+            if self.size_bytes() + len(payload) > self.max_bytes:
+                self.lines_rejected += len(lines)
+                return False
+            if self._active is None or self._active.tell() >= self.segment_bytes:
+                self._roll()
+            self._active.write(payload)
+            self._active.flush()
+            os.fsync(self._active.fileno())
+            self.lines_spooled += len(lines)
+            return True
+
+    def oldest(self):
+        """Return (path, lines) of the oldest segment, or None when the spool is empty.
+        The active segment is sealed first so it can be replayed too."""
+        with self._lock:
+            segments = self._segments()
+            if not segments:
+                return None
+            path = segments[0]
+            if path == self._active_path:
+                if self._active.tell() == 0:
+                    return None
+                self._active.close()
+                self._active = None
+                self._active_path = None
+        with open(path, "rb") as f:
+            lines = f.read().decode("utf-8").splitlines()
+        return path, [line for line in lines if line]
+
+    def ack(self, path, lines):
+        """Drop a segment returned by `oldest()` after it was written to InfluxDB."""
+        with self._lock:
+            os.remove(path)
+            self.lines_replayed += lines
+
+    def close(self):
+        with self._lock:
+            if self._active is not None:
+                self._active.close()
+                self._active = None
+                self._active_path = None
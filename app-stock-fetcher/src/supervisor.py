@@ -0,0 +1,86 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+
+class Supervisor:
+    """Runs each role of the app as a child process and restarts any that exit.
+
+    `children` maps a role name to its command line; every child gets
+    PROCESS_ROLE=<name> in its environment. A child that dies is restarted
+    after `restart_delay` seconds, doubling up to `max_delay` while it keeps
+    crashing soon after starting. SIGTERM/SIGINT are forwarded to the
+    children, which get `stop_timeout` seconds to exit before being killed.
+    """
+
+    def __init__(self, children, restart_delay=1.0, max_delay=60.0, stable_after=60.0, stop_timeout=30.0):
+        self.children = children
+        self.restart_delay = restart_delay
+        self.max_delay = max_delay
+        self.stable_after = stable_after
+        self.stop_timeout = stop_timeout
+        self._procs = {}
+        self._started_at = {}
+        self._delay = {name: restart_delay for name in children}
+        self._restart_at = {}
+        self._stopping = False
+
+    def _spawn(self, name):
+        env = dict(os.environ, PROCESS_ROLE=name)
+        self._procs[name] = subprocess.Popen(self.children[name], env=env)
+        self._started_at[name] = time.monotonic()
+        print(f"[{datetime.now()}] Started {name} (pid {self._procs[name].pid})")
+
+    def _handle_signal(self, signum, frame):
+        self._stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        for name in self.children:
+            self._spawn(name)
+        try:
+            while not self._stopping:
+                self._check()
+                time.sleep(0.5)
+        finally:
+            self.stop()
+
+    def _check(self):
+        now = time.monotonic()
+        for name, proc in list(self._procs.items()):
+            if proc is None:
+                if now >= self._restart_at[name]:
+                    self._spawn(name)
+                continue
+            code = proc.poll()
+            if code is None:
+                continue
+            uptime = now - self._started_at[name]
+            if uptime >= self.stable_after:
+                self._delay[name] = self.restart_delay
+            delay = self._delay[name]
+            print(f"[{datetime.now()}] {name} exited with code {code} after {uptime:.0f}s; restarting in {delay:.0f}s")
+            self._procs[name] = None
+            self._restart_at[name] = now + delay
+            self._delay[name] = min(delay * 2, self.max_delay)
+
+    def stop(self):
+        running = [p for p in self._procs.values() if p is not None and p.poll() is None]
+        for proc in running:
+            proc.send_signal(signal.SIGTERM)
+        deadline = time.monotonic() + self.stop_timeout
+        for proc in running:
+            try:
+                proc.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        print(f"[{datetime.now()}] Supervisor stopped")
+
+
+def child_command():
+    """Command line that re-runs this app's entry point (the role comes from PROCESS_ROLE)."""
+    return [sys.executable, "-u", os.path.abspath(sys.argv[0])]
@@ -1,52 +1,183 @@
 import os
 import json
+import fcntl
+import tempfile
+import threading
+from contextlib import contextmanager
 from config import config
 
 class TickerManager:
-    def __init__(self):
-        self.file_path = os.path.join(config.DATA_DIR, "tickers.json")
+    """Watchlist held in memory, indexed by symbol, and persisted to tickers.json.
+
+    The file is re-read only when its mtime changes (e.g. edited by hand or
+    by another process) and written with write-temp-then-rename, so readers
+    never see a truncated file. Changes re-read the file and write it while
+    holding an flock on tickers.json.lock, so two processes adding at the
+    same time don't drop each other's ticker. Subscribers are called as
+    `callback(event, ticker, **context)` with event 'add' or 'remove' for
+    every change, whether made through this object or found on reload.
+    """
+
+    def __init__(self, file_path=None):
+        self.file_path = file_path or os.path.join(config.DATA_DIR, "tickers.json")
+        self._lock = threading.RLock()
+        self._tickers = {}
+        self._mtime = None
+        self._subscribers = []
         self._ensure_file_exists()
+        self._mtime = None  # force the initial load
+        self.refresh()
 
     def _ensure_file_exists(self):
         os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
-        if not os.path.exists(self.file_path):
-            with open(self.file_path, "w") as f:
-                json.dump([{"symbol": t, "name": t} for t in config.DEFAULT_STOCK_TICKERS], f)
+        with self._exclusive():
+            if not os.path.exists(self.file_path):
+                self._write_file([{"symbol": t, "name": t} for t in config.DEFAULT_STOCK_TICKERS])
 
-    def get_tickers(self):
+    def _write_file(self, tickers):
+        directory = os.path.dirname(self.file_path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tickers-", suffix=".tmp")
         try:
-            with open(self.file_path, "r") as f:
-                data = json.load(f)
-                result = []
-                for item in data:
-                    if isinstance(item, str):
-                        result.append({"symbol": item, "name": item})
-                    else:
-                        result.append(item)
-                return result
+            with os.fdopen(fd, "w") as f:
+                json.dump(tickers, f)
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp creates the file 0600; keep the mode the file had (or 0644)
+            try:
+                mode = os.stat(self.file_path).st_mode & 0o7777
+            except FileNotFoundError:
+                mode = 0o644
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, self.file_path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        self._mtime = self._signature()
+
+    def _signature(self):
+        # Size as well as mtime, in case two writes land within the filesystem's mtime granularity
+        st = os.stat(self.file_path)
+        return st.st_mtime_ns, st.st_size
+
+    def _read_file(self):
+        with open(self.file_path, "r") as f:
+            data = json.load(f)
+        result = {}
+        for item in data:
+            if isinstance(item, str):
+                item = {"symbol": item, "name": item}
+            result[item["symbol"]] = item
+        return result
+
+    def subscribe(self, callback):
+        """Register `callback(event, ticker, **context)` for adds and removes."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def _notify(self, changes):
+        for event, ticker, context in changes:
+            for callback in list(self._subscribers):
+                try:
+                    callback(event, dict(ticker), **context)
+                except Exception as e:
+                    print(f"Error in ticker {event} subscriber for {ticker['symbol']}: {e}")
+
+    @contextmanager
+    def _exclusive(self):
+        """Hold the instance lock and the cross-process lock file for a read-modify-write."""
+        with self._lock, open(f"{self.file_path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def refresh(self):
+        """Reload tickers.json if its mtime changed since it was last read or written."""
+        with self._lock:
+            changes = self._reload()
+        self._notify(changes)
+
+    def _reload(self):
+        """`refresh()` without notifying; returns the changes found. Call with `_lock` held."""
+        try:
+            mtime = self._signature()
+            if mtime == self._mtime:
+                return []
+            loaded = self._read_file()
         except Exception as e:
             print(f"Error reading tickers: {e}")
-            return [{"symbol": t, "name": t} for t in config.DEFAULT_STOCK_TICKERS]
+            if not self._tickers and self._mtime is None:
+                self._tickers = {t: {"symbol": t, "name": t} for t in config.DEFAULT_STOCK_TICKERS}
+            return []
+        first_load = self._mtime is None
+        self._mtime = mtime
+        changes = [] if first_load else self._diff(loaded)
+        self._tickers = loaded
+        return changes
+
+    def _diff(self, new):
+        changes = [("add", t, {}) for s, t in new.items() if s not in self._tickers]
+        changes += [("remove", t, {}) for s, t in self._tickers.items() if s not in new]
+        return changes
+
+    def replace(self, tickers):
+        """Make the watchlist exactly `tickers` (e.g. a copy of another instance's list).
+        Returns True if anything changed."""
+        loaded = {}
+        for item in tickers:
+            if isinstance(item, str):
+                item = {"symbol": item, "name": item}
+            loaded[item["symbol"]] = {"symbol": item["symbol"], "name": item.get("name") or item["symbol"]}
+            if "years" in item:
+                loaded[item["symbol"]]["years"] = item["years"]
+        with self._exclusive():
+            changes = self._reload()
+            changed = loaded != self._tickers
+            if changed:
+                self._write_file(list(loaded.values()))
+                changes += self._diff(loaded)
+                self._tickers = loaded
+        self._notify(changes)
+        return changed
+
+    def get_tickers(self):
+        self.refresh()
+        with self._lock:
+            return [dict(t) for t in self._tickers.values()]
 
     def get_ticker_symbols(self):
-        return [t["symbol"] for t in self.get_tickers()]
+        self.refresh()
+        with self._lock:
+            return list(self._tickers)
 
-    def add_ticker(self, symbol, name=""):
-        tickers = self.get_tickers()
+    def add_ticker(self, symbol, name="", years=None, **context):
+        """Add a ticker; `years` (backfill depth) is kept in its record so processes
+        that only see the add through tickers.json get it too. `context` is passed
+        through to subscribers."""
         symbol = symbol.strip().upper()
-        if symbol and symbol not in [t["symbol"] for t in tickers]:
-            tickers.append({"symbol": symbol, "name": name or symbol})
-            with open(self.file_path, "w") as f:
-                json.dump(tickers, f)
-            return True
-        return False
+        with self._exclusive():
+            changes = self._reload()
+            added = bool(symbol) and symbol not in self._tickers
+            if added:
+                ticker = {"symbol": symbol, "name": name or symbol}
+                if years is not None:
+                    ticker["years"] = years
+                self._write_file(list(self._tickers.values()) + [ticker])
+                self._tickers[symbol] = ticker
+                changes.append(("add", ticker, context))
+        self._notify(changes)
+        return added
 
     def remove_ticker(self, symbol):
-        tickers = self.get_tickers()
         symbol = symbol.strip().upper()
-        filtered = [t for t in tickers if t["symbol"] != symbol]
-        if len(filtered) < len(tickers):
-            with open(self.file_path, "w") as f:
-                json.dump(filtered, f)
-            return True
-        return False
+        with self._exclusive():
+            changes = self._reload()
+            removed = symbol in self._tickers
+            if removed:
+                ticker = self._tickers[symbol]
+                self._write_file([t for s, t in self._tickers.items() if s != symbol])
+                del self._tickers[symbol]
+                changes.append(("remove", ticker, {}))
+        self._notify(changes)
+        return removed
@@ -0,0 +1,7 @@
+import pandas as pd
+
+
+def to_utc(ts):
+    """`ts` as a UTC pandas Timestamp; naive timestamps are taken to be UTC."""
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
@@ -0,0 +1,174 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from src.metrics import BARS_SKIPPED
+from src.timeutil import to_utc
+
+OHLCV = ("Open", "High", "Low", "Close", "Volume")
+
+
+class WatermarkTracker:
+    """Per-ticker "last stored bar" watermark.
+
+    Marks are seeded lazily from the storage backends the first time a ticker
+    is seen and advanced after every successful store. Downloads start from
+    the mark, and `BarHashIndex.changed()` drops rows before it that it
+    hasn't seen; the bar *at* the mark is kept because the newest 1m bar is
+    still forming and its values change between cycles.
+    """
+
+    def __init__(self, backends):
+        self.backends = backends
+        self._marks = {}
+        self._seeded = set()
+        self._lock = threading.Lock()
+
+    def seed(self, tickers):
+        """Load marks from the backends for tickers not seen before."""
+        with self._lock:
+            pending = [t for t in tickers if t not in self._seeded]
+        if not pending:
+            return
+        found = {}
+        for backend in self.backends:
+            for ticker, ts in backend.last_timestamps(pending).items():
+                ts = to_utc(ts)
+                if ticker not in found or ts > found[ticker]:
+                    found[ticker] = ts
+        with self._lock:
+            self._seeded.update(pending)
+            for ticker, ts in found.items():
+                current = self._marks.get(ticker)
+                if current is None or ts > current:
+                    self._marks[ticker] = ts
+        if found:
+            print(f"[{datetime.now()}] Seeded watermarks for {len(found)}/{len(pending)} tickers")
+
+    def get(self, ticker):
+        with self._lock:
+            return self._marks.get(ticker)
+
+    def marks(self):
+        with self._lock:
+            return dict(self._marks)
+
+    def forget(self, ticker):
+        with self._lock:
+            self._marks.pop(ticker, None)
+            self._seeded.discard(ticker)
+
+    def advance(self, ticker, data):
+        """Move the watermark to the newest bar of a successfully stored frame."""
+        if data.empty:
+            return
+        newest = to_utc(data.index.max())
+        with self._lock:
+            current = self._marks.get(ticker)
+            if current is None or newest > current:
+                self._marks[ticker] = newest
+
+
+class BarHashIndex:
+    """Per-ticker map of recently stored bar timestamps to a hash of their OHLCV values.
+
+    Most bars of a 1m download are identical to what the previous cycle
+    stored; only the forming bar and the occasional late correction from
+    Yahoo differ. `changed()` compares a frame against the index in one
+    vectorized pass and keeps just the new or modified rows; `remember()`
+    records what was stored. Each ticker keeps only bars within `max_age` of
+    its newest one, so memory stays bounded and a closed market's last bars
+    stay known until it reopens.
+    """
+
+    def __init__(self, max_age=timedelta(minutes=30)):
+        self.max_age = pd.Timedelta(max_age)
+        self._index = {}  # ticker -> (sorted int64 ns timestamps, uint64 hashes)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(data):
+        index = data.index
+        index = index.tz_localize("UTC") if index.tz is None else index.tz_convert("UTC")
+        return index.asi8
+
+    @staticmethod
+    def _hashes(data):
+        columns = [col for col in OHLCV if col in data.columns]
+        # As float64: Volume is int64 or float64 depending on NaNs in the batch download
+        return pd.util.hash_pandas_object(data[columns].astype("float64"), index=False).to_numpy()
+
+    def changed(self, ticker, data, since=None):
+        """Rows of `data` that are new or differ from the stored version.
+
+        Rows before `since` (the watermark) that the index doesn't cover were
+        stored before it started tracking them and are dropped as well, so
+        after a restart nothing older than the watermark is rewritten.
+        """
+        if data.empty:
+            return data
+        keys = self._keys(data)
+        hashes = self._hashes(data)
+        with self._lock:
+            stored_keys, stored_hashes = self._index.get(ticker, (keys[:0], hashes[:0]))
+        if len(stored_keys):
+            pos = np.searchsorted(stored_keys, keys).clip(max=len(stored_keys) - 1)
+            known = stored_keys[pos] == keys
+            unchanged = known & (stored_hashes[pos] == hashes)
+        else:
+            known = unchanged = np.zeros(len(keys), dtype=bool)
+        keep = ~unchanged
+        if since is not None:
+            keep &= known | (keys >= to_utc(since).value)
+        skipped = len(keys) - int(keep.sum())
+        if skipped:
+            BARS_SKIPPED.inc(int(unchanged.sum()), reason="unchanged")
+            BARS_SKIPPED.inc(skipped - int(unchanged.sum()), reason="before_watermark")
+        return data[keep]
+
+    def remember(self, ticker, data):
+        """Record the bars of a successfully stored frame."""
+        if data.empty:
+            return
+        keys = self._keys(data)
+        hashes = self._hashes(data)
+        with self._lock:
+            stored_keys, stored_hashes = self._index.get(ticker, (keys[:0], hashes[:0]))
+            keys = np.concatenate([stored_keys, keys])
+            hashes = np.concatenate([stored_hashes, hashes])
+            # Stable sort keeps the later (new) hash last among equal timestamps
+            order = np.argsort(keys, kind="stable")
+            keys, hashes = keys[order], hashes[order]
+            last = np.append(keys[1:] != keys[:-1], True)
+            keys, hashes = keys[last], hashes[last]
+            recent = keys >= keys[-1] - self.max_age.value
+            self._index[ticker] = (keys[recent], hashes[recent])
+
+    def forget(self, ticker):
+        with self._lock:
+            self._index.pop(ticker, None)
+
+    def size(self):
+        with self._lock:
+            return sum(len(keys) for keys, _ in self._index.values())
+
+
+def window_start(marks, tickers, max_age=timedelta(days=1), lookback=timedelta(0)):
+    """Earliest watermark across `tickers`, less `lookback`, usable as a download `start`.
+
+    Returns None (fall back to the default period) when any ticker has no
+    mark yet or the oldest mark is older than `max_age`. A `lookback`
+    re-requests recently stored bars so that late corrections are seen.
+    """
+    oldest = None
+    for ticker in tickers:
+        mark = marks.get(ticker)
+        if mark is None:
+            return None
+        if oldest is None or mark < oldest:
+            oldest = mark
+    if oldest is None or oldest < datetime.now(timezone.utc) - max_age:
+        return None
+    return (oldest - lookback).to_pydatetime()
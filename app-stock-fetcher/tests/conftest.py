@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# config.py reads the environment at import time; keep tests away from ./data
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="stock-fetcher-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
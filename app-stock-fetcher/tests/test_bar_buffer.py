@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from src.bar_buffer import BAR_DTYPE, BarBuffer, BarRing
+
+
+def records(minutes, close=None):
+    """BAR_DTYPE records at the given minutes past 2024-01-02 00:00 UTC."""
+    bars = np.zeros(len(minutes), dtype=BAR_DTYPE)
+    bars["ts"] = pd.Timestamp("2024-01-02", tz="UTC").value + np.asarray(minutes, dtype="int64") * 60_000_000_000
+    bars["close"] = minutes if close is None else close
+    return bars
+
+
+def minutes(bars):
+    return list((bars["ts"] - pd.Timestamp("2024-01-02", tz="UTC").value) // 60_000_000_000)
+
+
+def test_appends_in_time_order():
+    ring = BarRing.in_memory(10)
+    ring.append(records([0, 1, 2]))
+    ring.append(records([3, 4]))
+    assert minutes(ring.read()) == [0, 1, 2, 3, 4]
+
+
+def test_keeps_only_the_newest_bars_when_full():
+    ring = BarRing.in_memory(4)
+    ring.append(records([0, 1, 2]))
+    ring.append(records([3, 4, 5]))
+    assert minutes(ring.read()) == [2, 3, 4, 5]
+    ring.append(records(range(6, 20)))
+    assert minutes(ring.read()) == [16, 17, 18, 19]
+
+
+def test_new_version_of_the_last_bar_overwrites_it():
+    ring = BarRing.in_memory(4)
+    ring.append(records([0, 1, 2, 3]))
+    ring.append(records([3, 4], close=[30.5, 4.0]))
+    bars = ring.read()
+    assert minutes(bars) == [1, 2, 3, 4]
+    assert list(bars["close"]) == [1.0, 2.0, 30.5, 4.0]
+
+
+def test_older_bars_are_merged_and_replace_stored_copies():
+    ring = BarRing.in_memory(10)
+    ring.append(records([0, 2, 4]))
+    ring.append(records([1, 2], close=[1.0, 20.0]))
+    bars = ring.read()
+    assert minutes(bars) == [0, 1, 2, 4]
+    assert list(bars["close"]) == [0.0, 1.0, 20.0, 4.0]
+
+
+def test_read_since():
+    ring = BarRing.in_memory(10)
+    ring.append(records([0, 1, 2, 3]))
+    since = pd.Timestamp("2024-01-02 00:02", tz="UTC").value
+    assert minutes(ring.read(since)) == [2, 3]
+
+
+def test_sequence_is_even_after_each_write():
+    ring = BarRing.in_memory(4)
+    ring.append(records([0]))
+    ring.append(records([0, 1]))
+    assert ring.header[0] % 2 == 0
+
+
+def test_file_ring_is_visible_to_a_readonly_reader(tmp_path):
+    path = str(tmp_path / "AAPL.bars")
+    writer = BarRing.open_file(path, capacity=8)
+    reader = BarRing.open_file(path, readonly=True)
+    assert reader.capacity == 8
+    writer.append(records([0, 1]))
+    assert minutes(reader.read()) == [0, 1]
+
+
+def test_bar_buffer_round_trips_a_frame(tmp_path):
+    index = pd.date_range("2024-01-02 09:30", periods=3, freq="1min", tz="America/New_York")
+    frame = pd.DataFrame(
+        {"Open": [1.0, 2.0, np.nan], "High": 1.0, "Low": 1.0, "Close": [1.0, 2.0, 3.0], "Volume": [10, 20, 30]},
+        index=index,
+    )
+    writer = BarBuffer(capacity=8, directory=str(tmp_path))
+    writer.append("AAPL", frame)
+    read = BarBuffer(capacity=8, directory=str(tmp_path), readonly=True).read("AAPL")
+    # The row without an open price is dropped
+    assert list(read.index) == list(index[:2].tz_convert("UTC"))
+    assert list(read["Volume"]) == [10.0, 20.0]
+    assert BarBuffer(capacity=8, directory=str(tmp_path), readonly=True).read("MSFT") is None
@@ -0,0 +1,120 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from src.coverage import CoverageIndex, missing_ranges
+from src.fetcher import plan_missing_chunks
+
+
+def weekdays(start, end):
+    days = set()
+    day = start
+    while day < end:
+        if day.weekday() < 5:
+            days.add(day)
+        day += timedelta(days=1)
+    return days
+
+
+# 2024-01-01 is a Monday
+JAN = date(2024, 1, 1)
+FEB = date(2024, 2, 1)
+
+
+def test_fully_covered_window_has_no_gaps():
+    assert missing_ranges(weekdays(JAN, FEB), JAN, FEB) == []
+
+
+def test_weekends_are_never_gaps():
+    covered = weekdays(JAN, FEB)
+    assert all(day.weekday() < 5 for day in covered)
+    assert missing_ranges(covered, JAN, FEB) == []
+
+
+def test_nothing_covered_is_one_gap():
+    assert missing_ranges(set(), JAN, FEB) == [(JAN, FEB)]
+
+
+def test_short_run_inside_the_window_is_a_holiday():
+    covered = weekdays(JAN, FEB) - {date(2024, 1, 15)}
+    assert missing_ranges(covered, JAN, FEB, holiday_tolerance=3) == []
+
+
+def test_long_run_inside_the_window_is_a_gap():
+    covered = weekdays(JAN, FEB) - weekdays(date(2024, 1, 8), date(2024, 1, 13))
+    assert missing_ranges(covered, JAN, FEB, holiday_tolerance=3) == [(date(2024, 1, 8), date(2024, 1, 13))]
+
+
+def test_missing_days_at_the_end_are_always_a_gap():
+    covered = weekdays(JAN, FEB) - {date(2024, 1, 31)}
+    assert missing_ranges(covered, JAN, FEB, holiday_tolerance=3) == [(date(2024, 1, 31), FEB)]
+
+
+def test_close_gaps_are_merged():
+    # Only Friday the 5th is covered between the two gaps
+    covered = weekdays(JAN, FEB) - weekdays(date(2024, 1, 2), date(2024, 1, 5)) - weekdays(date(2024, 1, 8), date(2024, 1, 12))
+    assert missing_ranges(covered, JAN, FEB, holiday_tolerance=2, merge_days=5) == [(date(2024, 1, 2), date(2024, 1, 12))]
+
+
+def test_distant_gaps_stay_separate():
+    covered = weekdays(JAN, FEB) - weekdays(date(2024, 1, 2), date(2024, 1, 6)) - weekdays(date(2024, 1, 22), date(2024, 1, 26))
+    assert missing_ranges(covered, JAN, FEB, holiday_tolerance=2, merge_days=5) == [
+        (date(2024, 1, 2), date(2024, 1, 6)),
+        (date(2024, 1, 22), date(2024, 1, 26)),
+    ]
+
+
+class FakeStorage:
+    def __init__(self, covered=None):
+        self.covered = covered or {}
+
+    def covered_dates(self, ticker, start, end, interval="1d"):
+        return {d for d in self.covered.get(interval, set()) if start <= d < end}
+
+
+@pytest.fixture
+def coverage(tmp_path):
+    return CoverageIndex(str(tmp_path / "coverage.json"))
+
+
+def test_record_fetched_merges_ranges_and_persists(coverage):
+    coverage.record_fetched("AAPL", "1d", date(2020, 1, 1), date(2020, 2, 1))
+    coverage.record_fetched("AAPL", "1d", date(2020, 1, 15), date(2020, 3, 1))
+    assert coverage._fetched["AAPL"]["1d"] == [["2020-01-01", "2020-03-01"]]
+    reloaded = CoverageIndex(coverage.path)
+    assert reloaded.fetched_dates("AAPL", "1d", date(2020, 2, 28), date(2020, 3, 5)) == {date(2020, 2, 28), date(2020, 2, 29)}
+
+
+def test_record_fetched_never_covers_today(coverage):
+    today = datetime.utcnow().date()
+    coverage.record_fetched("AAPL", "1m", today, today + timedelta(days=1))
+    assert coverage.fetched_dates("AAPL", "1m", today, today + timedelta(days=1)) == set()
+
+
+def test_plan_missing_chunks_for_an_empty_store(coverage):
+    end = datetime(2024, 6, 12)
+    chunks = plan_missing_chunks("AAPL", FakeStorage(), coverage, years=2, chunk_years=1, end_dt=end)
+    daily = [c for c in chunks if c["interval"] == "1d"]
+    assert [(c["start"], c["end"]) for c in daily] == [
+        ("2022-06-14", "2023-06-14"),
+        ("2023-06-14", "2024-06-13"),
+    ]
+    assert chunks[-1] == {"label": "1m 7d", "period": "7d", "interval": "1m"}
+
+
+def test_plan_missing_chunks_skips_stored_and_fetched_days(coverage):
+    end = datetime(2024, 6, 14)
+    start = date(2022, 6, 15)
+    stored = {"1d": weekdays(date(2023, 1, 1), date(2024, 6, 15)), "1m": weekdays(date(2024, 6, 7), date(2024, 6, 15))}
+    coverage.record_fetched("AAPL", "1d", start, date(2023, 1, 1))
+    assert plan_missing_chunks("AAPL", FakeStorage(stored), coverage, years=2, end_dt=end) == []
+
+
+def test_plan_missing_chunks_requests_only_the_recent_1m_gap(coverage):
+    end = datetime(2024, 6, 14)
+    stored = {
+        "1d": weekdays(date(2022, 1, 1), date(2024, 6, 15)),
+        "1m": weekdays(date(2024, 6, 7), date(2024, 6, 12)),
+    }
+    chunks = plan_missing_chunks("AAPL", FakeStorage(stored), coverage, years=2, end_dt=end)
+    assert chunks == [{"label": "1m 2024-06-12..2024-06-15", "start": "2024-06-12", "end": "2024-06-15", "interval": "1m"}]
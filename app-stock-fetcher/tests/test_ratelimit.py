@@ -0,0 +1,94 @@
+import threading
+import time
+
+from src.ratelimit import RateLimiter, is_rate_limit_error
+
+
+def test_disabled_limiter_never_waits():
+    limiter = RateLimiter(0)
+    started = time.monotonic()
+    for _ in range(100):
+        assert limiter.acquire()
+    assert time.monotonic() - started < 0.1
+
+
+def test_burst_then_rate():
+    limiter = RateLimiter(20, burst=3)
+    started = time.monotonic()
+    for _ in range(3):
+        limiter.acquire()
+    assert time.monotonic() - started < 0.05
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.04
+
+
+def test_acquire_times_out():
+    limiter = RateLimiter(1, burst=1)
+    assert limiter.acquire()
+    assert not limiter.acquire(timeout=0.05)
+
+
+def test_live_requests_go_before_queued_backfill():
+    limiter = RateLimiter(20, burst=1)
+    limiter.acquire()
+    order = []
+
+    def request(priority):
+        limiter.acquire(priority)
+        order.append(priority)
+
+    threads = [threading.Thread(target=request, args=("backfill",)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.01)  # all backfill requests are queued before the live one
+    live = threading.Thread(target=request, args=("live",))
+    live.start()
+    for thread in threads + [live]:
+        thread.join()
+    assert order.index("live") <= 1
+
+
+def test_throttling_halves_the_rate_and_pauses():
+    limiter = RateLimiter(10, burst=5, initial_backoff=0.2)
+    limiter.report("throttled")
+    stats = limiter.stats()
+    assert stats["current_rate"] == 5
+    assert stats["paused_for"] > 0
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.15
+
+
+def test_empty_responses_slow_down_and_successes_recover():
+    limiter = RateLimiter(10)
+    limiter.report("empty")
+    assert limiter.stats()["current_rate"] == 7.5
+    limiter.report("ok")
+    limiter.report("ok")
+    limiter.report("ok")
+    assert limiter.stats()["current_rate"] == 10
+
+
+def test_rate_never_drops_below_the_minimum():
+    limiter = RateLimiter(10, min_rate=1, initial_backoff=0)
+    for _ in range(10):
+        limiter.report("throttled")
+    assert limiter.stats()["current_rate"] == 1
+
+
+def test_limiters_with_a_state_file_share_one_budget(tmp_path):
+    path = str(tmp_path / "yahoo-ratelimit.json")
+    first = RateLimiter(10, burst=2, state_path=path)
+    second = RateLimiter(10, burst=2, state_path=path)
+    assert first.acquire(timeout=0)
+    assert second.acquire(timeout=0)
+    assert not first.acquire(timeout=0)
+    assert not second.acquire(timeout=0)
+    # A 429 seen by one process slows down the other
+    first.report("throttled")
+    assert second.stats()["current_rate"] == 5
+
+
+def test_is_rate_limit_error():
+    assert is_rate_limit_error(Exception("429 Client Error: Too Many Requests"))
+    assert not is_rate_limit_error(ConnectionError("name resolution failed"))
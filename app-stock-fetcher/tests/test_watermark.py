@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from src.watermark import BarHashIndex, window_start
+
+
+def bars(start, count, close=100.0, volume=10):
+    index = pd.date_range(start, periods=count, freq="1min", tz="UTC", name="Datetime")
+    close = np.full(count, close, dtype=float) if np.isscalar(close) else np.asarray(close, dtype=float)
+    return pd.DataFrame(
+        {"Open": close, "High": close + 1, "Low": close - 1, "Close": close, "Volume": volume},
+        index=index,
+    )
+
+
+def test_everything_is_new_to_an_empty_index():
+    index = BarHashIndex()
+    data = bars("2024-01-02 14:30", 5)
+    assert len(index.changed("AAPL", data)) == 5
+
+
+def test_unchanged_bars_are_skipped():
+    index = BarHashIndex()
+    data = bars("2024-01-02 14:30", 5)
+    index.remember("AAPL", data)
+    assert index.changed("AAPL", data).empty
+
+
+def test_new_and_corrected_bars_are_kept():
+    index = BarHashIndex()
+    index.remember("AAPL", bars("2024-01-02 14:30", 5))
+    again = bars("2024-01-02 14:30", 6, close=[100, 100, 100, 100, 101.5, 100])
+    changed = index.changed("AAPL", again)
+    assert list(changed.index) == list(again.index[4:])
+
+
+def test_integer_and_float_volume_hash_the_same():
+    index = BarHashIndex()
+    index.remember("AAPL", bars("2024-01-02 14:30", 3, volume=10))
+    as_float = bars("2024-01-02 14:30", 3, volume=10.0)
+    assert index.changed("AAPL", as_float).empty
+
+
+def test_tickers_are_tracked_separately():
+    index = BarHashIndex()
+    data = bars("2024-01-02 14:30", 3)
+    index.remember("AAPL", data)
+    assert len(index.changed("MSFT", data)) == 3
+
+
+def test_untracked_bars_before_the_watermark_are_dropped():
+    index = BarHashIndex()
+    data = bars("2024-01-02 14:30", 5)
+    since = pd.Timestamp("2024-01-02 14:33", tz="UTC")
+    assert list(index.changed("AAPL", data, since=since).index) == list(data.index[3:])
+
+
+def test_only_bars_within_max_age_of_the_newest_are_kept():
+    index = BarHashIndex(max_age=timedelta(minutes=10))
+    index.remember("AAPL", bars("2024-01-02 14:00", 30))
+    assert index.size() == 11
+    # Bars that fell out of the index count as new again
+    assert len(index.changed("AAPL", bars("2024-01-02 14:00", 30))) == 19
+
+
+def test_forget():
+    index = BarHashIndex()
+    data = bars("2024-01-02 14:30", 3)
+    index.remember("AAPL", data)
+    index.forget("AAPL")
+    assert len(index.changed("AAPL", data)) == 3
+
+
+def test_window_start_is_the_oldest_mark_less_the_lookback():
+    now = pd.Timestamp(datetime.now(timezone.utc))
+    marks = {"AAPL": now - pd.Timedelta(minutes=5), "MSFT": now - pd.Timedelta(minutes=2)}
+    start = window_start(marks, ["AAPL", "MSFT"], lookback=timedelta(minutes=30))
+    assert start == (now - pd.Timedelta(minutes=35)).to_pydatetime()
+
+
+def test_window_start_falls_back_without_a_recent_mark_for_every_ticker():
+    now = pd.Timestamp(datetime.now(timezone.utc))
+    assert window_start({"AAPL": now}, ["AAPL", "MSFT"]) is None
+    assert window_start({"AAPL": now - pd.Timedelta(days=2)}, ["AAPL"]) is None